@@ -44,6 +44,9 @@ class CoordinatorAgent:
             "duration": parsed_data.get("duration"),
             "passengers": parsed_data.get("passengers", 1),
             "cabin_class": parsed_data.get("cabin_class"),
-            "additional_info": parsed_data.get("additional_info")
+            "additional_info": parsed_data.get("additional_info"),
+            "max_budget": parsed_data.get("max_budget"),
+            "min_rating": parsed_data.get("min_rating"),
+            "max_stops": parsed_data.get("max_stops"),
         }
 
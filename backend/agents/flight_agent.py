@@ -1,17 +1,43 @@
 import asyncio
+import logging
 from typing import Optional
+from deadline import Deadline, timeout_for
+from observability.tracing import span
 from services.amadeus_flights import search_flights as amadeus_search_flights
 
+logger = logging.getLogger(__name__)
+
+AMADEUS_TIMEOUT_S = 15
+MIN_PROVIDER_CALL_S = 1.0
+
+
+def format_flight(flight: dict) -> str:
+    """One-line display string for a structured offer."""
+    return (
+        f"{flight['flight_number']} | "
+        f"{flight['departure']['airport']} {flight['departure']['time']} → "
+        f"{flight['arrival']['airport']} {flight['arrival']['time']} | "
+        f"Duration: {flight['duration']} | "
+        f"Stops: {flight['stops']} | "
+        f"Price: {flight['price']['currency']} {flight['price']['amount']} | "
+        f"Cabin: {flight['cabin']}"
+    )
+
 
 class FlightAgent:
-    async def search_flights(
+    async def search_flights(self, *args, **kwargs) -> list[str]:
+        """Like search_flight_offers, formatted as display strings."""
+        return [format_flight(flight) for flight in await self.search_flight_offers(*args, **kwargs)]
+
+    async def search_flight_offers(
         self,
         source: Optional[str] = None,
         destination: Optional[str] = None,
         start_date: Optional[str] = None,
         passengers: int = 1,
-        cabin_class: Optional[str] = None
-    ) -> list[str]:
+        cabin_class: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> list[dict]:
         """
         Search for one-way flights using Amadeus API.
         
@@ -21,52 +47,48 @@ class FlightAgent:
             start_date: Departure date (YYYY-MM-DD format)
             passengers: Number of passengers (default: 1)
             cabin_class: Cabin class - ECONOMY, PREMIUM_ECONOMY, BUSINESS, or FIRST (default: ECONOMY)
+            deadline: Request deadline; the Amadeus call gets only the remaining budget
             
         Returns:
-            List of formatted flight strings for display
+            List of structured offers (see services.amadeus_flights.format_flight_offers)
         """
         # Validate required inputs
         if not source or not destination or not start_date:
-            print(f"⚠️ [FLIGHT_AGENT] Missing required inputs: source={source}, destination={destination}, start_date={start_date}")
+            logger.warning("Missing required inputs: source=%s, destination=%s, start_date=%s", source, destination, start_date)
+            return []
+        
+        if deadline is not None and not deadline.allows(MIN_PROVIDER_CALL_S):
+            logger.info("Only %.1fs left, skipping Amadeus call", deadline.remaining())
             return []
         
         # Normalize cabin class
         if not cabin_class:
             cabin_class = "ECONOMY"
         
-        print(f"🔍 [FLIGHT_AGENT] Received - Source: '{source}', Destination: '{destination}', Date: '{start_date}', Passengers: {passengers}, Cabin: {cabin_class}")
         
         try:
-            print(f"🔍 [FLIGHT_AGENT] Searching flights: {source} → {destination} on {start_date}")
-            
-            # Call Amadeus API synchronously in a thread pool to avoid blocking
-            flight_data = await asyncio.to_thread(
-                amadeus_search_flights,
-                origin=source,
-                destination=destination,
-                departure_date=start_date,
-                adults=passengers,
-                max_results=5,
-                travel_class=cabin_class
+            logger.info(
+                "Searching flights %s → %s on %s",
+                source, destination, start_date,
+                extra={"passengers": passengers, "cabin_class": cabin_class},
             )
             
-            # Format the flight data into strings for display
-            formatted_flights = []
-            for flight in flight_data:
-                flight_str = (
-                    f"{flight['flight_number']} | "
-                    f"{flight['departure']['airport']} {flight['departure']['time']} → "
-                    f"{flight['arrival']['airport']} {flight['arrival']['time']} | "
-                    f"Duration: {flight['duration']} | "
-                    f"Stops: {flight['stops']} | "
-                    f"Price: {flight['price']['currency']} {flight['price']['amount']} | "
-                    f"Cabin: {flight['cabin']}"
+            # Call Amadeus API synchronously in a thread pool to avoid blocking
+            with span("agent.flight.search", origin=source, destination=destination, date=start_date):
+                flight_data = await asyncio.to_thread(
+                    amadeus_search_flights,
+                    origin=source,
+                    destination=destination,
+                    departure_date=start_date,
+                    adults=passengers,
+                    max_results=5,
+                    travel_class=cabin_class,
+                    timeout=timeout_for(deadline, AMADEUS_TIMEOUT_S)
                 )
-                formatted_flights.append(flight_str)
             
-            print(f"✅ [FLIGHT_AGENT] Found {len(formatted_flights)} flights from Amadeus")
-            return formatted_flights
+            logger.info("Found %d flights from Amadeus", len(flight_data))
+            return flight_data
             
         except Exception as e:
-            print(f"❌ [FLIGHT_AGENT] Amadeus API failed: {e}")
+            logger.error("Amadeus API failed: %s", e)
             return []  # Return empty list on error to fail gracefully
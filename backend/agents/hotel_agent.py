@@ -1,6 +1,15 @@
+import asyncio
+import logging
 from typing import Optional
+from deadline import Deadline, timeout_for
+from observability.tracing import span
 from services.serp_hotels import search_hotels
 
+logger = logging.getLogger(__name__)
+
+SERP_TIMEOUT_S = 20
+MIN_PROVIDER_CALL_S = 1.0
+
 
 class HotelAgent:
     async def search_hotels(
@@ -9,7 +18,8 @@ class HotelAgent:
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
         duration: Optional[int] = None,
-        additional_info: Optional[str] = None
+        additional_info: Optional[str] = None,
+        deadline: Optional[Deadline] = None
     ) -> list[dict]:
         """
         Search for hotels using SERP API Google Hotels.
@@ -20,31 +30,36 @@ class HotelAgent:
             end_date: Check-out date
             duration: Length of stay in days (unused)
             additional_info: Any additional requirements (unused)
+            deadline: Request deadline; the SERP call gets only the remaining budget
             
         Returns:
             List of hotel dictionaries with real data from Google Hotels
         """
-        print(f"🔍 [HOTEL_AGENT] Searching hotels:")
-        print(f"  - destination: {destination}")
-        print(f"  - start_date: {start_date}")
-        print(f"  - end_date: {end_date}")
+        logger.info("Searching hotels in %s from %s to %s", destination, start_date, end_date)
         
         # Gracefully handle missing inputs
         if not destination or not start_date or not end_date:
-            print(f"⚠️ [HOTEL_AGENT] Missing required inputs, returning empty list")
+            logger.warning("Missing required inputs, returning empty list")
+            return []
+        
+        if deadline is not None and not deadline.allows(MIN_PROVIDER_CALL_S):
+            logger.info("Only %.1fs left, skipping SERP call", deadline.remaining())
             return []
         
         try:
-            # Call SERP API hotel search
-            hotels = search_hotels(
-                city=destination,
-                check_in_date=start_date,
-                check_out_date=end_date
-            )
+            # Call SERP API in a thread pool so the event loop isn't blocked
+            with span("agent.hotel.search", destination=destination, check_in=start_date):
+                hotels = await asyncio.to_thread(
+                    search_hotels,
+                    city=destination,
+                    check_in_date=start_date,
+                    check_out_date=end_date,
+                    timeout=timeout_for(deadline, SERP_TIMEOUT_S)
+                )
             
-            print(f"✅ [HOTEL_AGENT] Found {len(hotels)} hotels from SERP API")
+            logger.info("Found %d hotels from SERP API", len(hotels))
             return hotels
             
         except Exception as e:
-            print(f"❌ [HOTEL_AGENT] SERP API failed: {e}")
+            logger.error("SERP API failed: %s", e)
             return []  # Gracefully return empty list on error
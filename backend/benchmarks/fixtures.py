@@ -0,0 +1,109 @@
+"""
+Deterministic inputs for the benchmark suite.
+
+Payloads follow the shape of real Amadeus flight-offers and SERP
+google_hotels responses, generated from a fixed seed so runs are comparable.
+"""
+
+import random
+from typing import Any, Dict, List
+
+_AIRPORTS = ["DEL", "BOM", "BLR", "MAA", "HYD", "CCU", "GOI", "COK", "DXB", "SIN", "LHR", "JFK"]
+_CARRIERS = ["AI", "6E", "UK", "SG", "EK", "SQ", "BA"]
+_CABINS = ["ECONOMY", "PREMIUM_ECONOMY", "BUSINESS", "FIRST"]
+_AMENITIES = [
+    "Free Wi-Fi", "Pool", "Spa", "Fitness centre", "Free breakfast", "Airport shuttle",
+    "Restaurant", "Bar", "Room service", "Parking", "Air conditioning", "Beach access",
+]
+
+QUERY_CORPUS: List[str] = [
+    "Find flights from Delhi to Mumbai on 2026-12-25",
+    "search flights from BLR to GOI departing 2026-11-02 returning 2026-11-09 for 2 passengers",
+    "Find hotels in Goa from 2026-12-20 to 2026-12-27",
+    "hotels in Paris for 3 nights check in 2026-05-01",
+    "Plan a trip to Tokyo for 5 days",
+    "I want to travel from London to New York in business class on 2026-09-14",
+    "find cheap hotels in Bangkok near the river",
+    "flights from Chennai to Singapore on 14 Feb for 3 adults",
+    "Plan a relaxing vacation to Bali",
+    "what's the weather like",
+    "search hotels in Dubai from 2026-03-10 to 2026-03-15 with pool",
+    "Find flights from HYD to DXB on 2026-08-01 premium economy",
+    # Package constraints, and stop / length / rating phrases that are not budgets
+    "flight and hotel from Delhi to Goa with max 1 stop",
+    "flights from Mumbai to Goa with hotels within 2 days, under 4 star",
+    "flights from DEL to BOM with hotels on 2026-12-25, non-stop, 4 star, under 20000",
+    "flight and hotel to Jaipur on a budget of ₹40,000, at most 1 stop",
+]
+
+
+def amadeus_offers_payload(count: int = 250, destination: str = "BOM", seed: int = 7) -> Dict[str, Any]:
+    """Flight-offers response; roughly one offer in ten lands at another airport."""
+    rng = random.Random(seed)
+    offers = []
+    for i in range(count):
+        arrival = destination if rng.random() > 0.1 else rng.choice(_AIRPORTS)
+        carrier = rng.choice(_CARRIERS)
+        hours, minutes = rng.randint(1, 14), rng.choice([0, 5, 15, 30, 45, 55])
+        checked = {"weight": rng.choice([15, 20, 25]), "weightUnit": "KG"} if rng.random() > 0.3 else {}
+        offers.append({
+            "type": "flight-offer",
+            "id": str(i + 1),
+            "itineraries": [{
+                "duration": f"PT{hours}H{minutes}M" if minutes else f"PT{hours}H",
+                "segments": [{
+                    "departure": {"iataCode": "DEL", "at": f"2026-12-25T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"},
+                    "arrival": {"iataCode": arrival, "at": f"2026-12-25T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"},
+                    "carrierCode": carrier,
+                    "number": str(rng.randint(100, 9999)),
+                    "numberOfStops": rng.choice([0, 0, 0, 1, 2]),
+                }],
+            }],
+            "price": {"currency": "INR", "total": f"{rng.uniform(2500, 90000):.2f}"},
+            "travelerPricings": [{
+                "travelerId": "1",
+                "fareDetailsBySegment": [{
+                    "segmentId": "1",
+                    "cabin": rng.choice(_CABINS),
+                    "includedCheckedBags": checked,
+                    "includedCabinBags": {"weight": 7, "weightUnit": "KG"},
+                }],
+            }],
+        })
+    return {"meta": {"count": count}, "data": offers}
+
+
+def serp_hotels_payload(count: int = 200, seed: int = 11) -> Dict[str, Any]:
+    """google_hotels response with a mix of priced and unpriced properties."""
+    rng = random.Random(seed)
+    properties = []
+    for i in range(count):
+        price = f"₹{rng.randint(1500, 45000):,}"
+        prop = {
+            "type": "hotel",
+            "name": f"Hotel {i + 1}",
+            "link": f"https://example.com/hotel/{i + 1}",
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "reviews": rng.randint(0, 12000),
+            "amenities": rng.sample(_AMENITIES, rng.randint(0, 8)),
+            "images": [{"thumbnail": f"https://example.com/img/{i + 1}.jpg"}] if rng.random() > 0.2 else [],
+        }
+        roll = rng.random()
+        if roll < 0.7:
+            prop["rate_per_night"] = {"lowest": price}
+        elif roll < 0.9:
+            prop["total_rate"] = {"lowest": price}
+        properties.append(prop)
+    return {"properties": properties}
+
+
+def parsed_queries() -> List[Dict[str, Any]]:
+    """Parser outputs covering every CoordinatorAgent routing branch."""
+    return [
+        {"intent": ["flight"], "original_query": "find flights"},
+        {"intent": ["hotel"], "original_query": "find hotels"},
+        {"intent": ["flight", "hotel"], "original_query": "plan everything"},
+        {"intent": ["hotel"], "original_query": "Plan a trip to Goa"},
+        {"intent": [], "original_query": "hello"},
+        {"intent": ["other"], "original_query": "weather"},
+    ]
@@ -0,0 +1,299 @@
+"""
+Open-loop load generator for POST /chat.
+
+Scenarios arrive at --rate per second (Poisson) for --duration seconds, drawn
+from --mix. Each scenario runs on one of --sessions session ids; a session
+runs one scenario at a time, like a real user.
+
+    flight     "find flights from DEL to BOM on <date>"
+    hotel      "find hotels in Goa check in <date> check out <date>"
+    both       a flight search that also asks for hotels
+    itinerary  the five-turn itinerary conversation (days, destination,
+               style, budget, "yes"); the last turn is reported as
+               "itinerary", the others as "itinerary_turn"
+
+By default the app runs in-process with providers in stub mode: synthetic
+Amadeus/SERP/Gemini responses with simulated latency (--amadeus-ms,
+--serp-ms, --gemini-ms) and no network access. Client-side pacing and
+concurrency limits behave as in production. --url sends the traffic to a
+running server instead, with whatever providers it is configured for.
+
+    python -m benchmarks.loadgen --rate 10 --duration 30
+    python -m benchmarks.loadgen --mix flight=1,itinerary=1 --gemini-ms 4000
+    python -m benchmarks.loadgen --url http://localhost:8000 --rate 2
+
+Prints throughput, error rate and p50/p95/p99 latency per intent as JSON.
+Errors include degraded answers: a 200 that carries none of the results the
+scenario asked for (no flights, no hotels, no itinerary), which is how a
+failing provider surfaces once the agents have swallowed the exception.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.fixtures import amadeus_offers_payload, serp_hotels_payload
+
+ROUTES = [("DEL", "BOM"), ("DEL", "BLR"), ("BOM", "GOI"), ("BLR", "DEL"), ("DEL", "DXB"), ("MAA", "SIN"), ("HYD", "CCU")]
+CITIES = ["Goa", "Jaipur", "Paris", "Tokyo", "Bali", "Dubai", "London", "Bangkok"]
+STYLES = ["relaxed", "balanced", "packed"]
+BUDGETS = ["low", "medium", "high"]
+
+DEFAULT_MIX = "flight=4,hotel=3,both=1,itinerary=2"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in ("flight", "hotel", "both", "itinerary"):
+            raise ValueError(f"Unknown scenario in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _degraded(intent: str, body: Dict[str, Any]) -> bool:
+    """A successful response without the results its scenario asked for."""
+    if intent == "flight":
+        return not body.get("flight_results")
+    if intent == "hotel":
+        return not body.get("hotel_results")
+    if intent == "both":
+        return not (body.get("flight_results") and body.get("hotel_results"))
+    if intent == "itinerary":
+        return not body.get("itinerary")
+    return False
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# --- Stub providers (in-process mode) ---
+
+def _lognormal_s(rng: random.Random, median_ms: float) -> float:
+    return median_ms / 1000.0 * math.exp(rng.gauss(0, 0.35))
+
+
+def install_stubs(amadeus_ms: float, serp_ms: float, gemini_ms: float, seed: int = 0) -> None:
+    from services import provider_replay
+
+    rng = random.Random(seed)
+
+    def amadeus(request: Dict[str, Any]) -> Dict[str, Any]:
+        if "oauth2" in request["url"]:
+            return {"body": json.dumps({"access_token": "stub", "expires_in": 1799}), "latency_s": _lognormal_s(rng, amadeus_ms / 5)}
+        params = request["params"]
+        payload = amadeus_offers_payload(
+            int(params.get("max", 5)) * 4,
+            destination=params.get("destinationLocationCode", "BOM"),
+            seed=hash((params.get("originLocationCode"), params.get("departureDate"))) & 0xFFFF,
+        )
+        return {"body": json.dumps(payload), "latency_s": _lognormal_s(rng, amadeus_ms)}
+
+    def serp(request: Dict[str, Any]) -> Dict[str, Any]:
+        params = request["params"]
+        payload = serp_hotels_payload(20, seed=hash((params.get("q"), params.get("check_in_date"))) & 0xFFFF)
+        return {"body": json.dumps(payload), "latency_s": _lognormal_s(rng, serp_ms)}
+
+    def gemini(request: Dict[str, Any]) -> Dict[str, Any]:
+        max_tokens = (request.get("generation_config") or {}).get("max_output_tokens", 1024)
+        # Longer generations take longer
+        latency = _lognormal_s(rng, gemini_ms * (0.3 + max_tokens / 4096))
+        return {"text": "This is a stubbed response from the load generator. " * 8, "latency_s": latency}
+
+    provider_replay.register_stub("amadeus", amadeus)
+    provider_replay.register_stub("serp", serp)
+    provider_replay.register_stub("gemini", gemini)
+    provider_replay.set_mode(provider_replay.STUB)
+
+
+# --- Scenarios ---
+
+class LoadGenerator:
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.mix = parse_mix(args.mix)
+        self.session_locks = [asyncio.Lock() for _ in range(args.sessions)]
+        self.samples: List[Tuple[str, float, str]] = []  # (intent, latency_s, "ok" | "error" | "degraded")
+        self.in_flight = 0
+        self.dropped = 0
+        self.today = date.today()
+
+    def _date(self, earliest: int = 7, latest: int = 90) -> date:
+        return self.today + timedelta(days=self.rng.randint(earliest, latest))
+
+    def _messages(self, scenario: str) -> List[Tuple[str, str]]:
+        if scenario == "flight":
+            src, dst = self.rng.choice(ROUTES)
+            return [("flight", f"find flights from {src} to {dst} on {self._date()}")]
+        if scenario == "hotel":
+            check_in = self._date()
+            check_out = check_in + timedelta(days=self.rng.randint(1, 6))
+            city = self.rng.choice(CITIES)
+            return [("hotel", f"find hotels in {city} check in {check_in} check out {check_out}")]
+        if scenario == "both":
+            src, dst = self.rng.choice(ROUTES)
+            depart = self._date()
+            back = depart + timedelta(days=self.rng.randint(2, 7))
+            return [("both", f"find flights from {src} to {dst} departing {depart} returning {back} with hotels")]
+        turns = [str(self.rng.randint(1, 10)), self.rng.choice(CITIES), self.rng.choice(STYLES), self.rng.choice(BUDGETS)]
+        return [("itinerary_turn", t) for t in turns] + [("itinerary", "yes")]
+
+    async def _send(self, intent: str, message: str, session_id: str) -> None:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.client.post(
+                "/chat", json={"message": message, "session_id": session_id}, timeout=self.args.timeout,
+            )
+            if response.status_code < 400:
+                outcome = "degraded" if _degraded(intent, response.json()) else "ok"
+        except Exception:
+            outcome = "error"
+        self.samples.append((intent, time.perf_counter() - started, outcome))
+
+    async def _scenario(self, scenario: str, session_index: int) -> None:
+        session_id = f"loadgen-{self.args.seed}-{session_index}"
+        async with self.session_locks[session_index]:
+            for intent, message in self._messages(scenario):
+                await self._send(intent, message, session_id)
+                if self.args.think_ms:
+                    await asyncio.sleep(self.args.think_ms / 1000.0)
+
+    async def _run_one(self, scenario: str, session_index: int) -> None:
+        self.in_flight += 1
+        try:
+            await self._scenario(scenario, session_index)
+        finally:
+            self.in_flight -= 1
+
+    async def run(self) -> Dict[str, Any]:
+        names = list(self.mix)
+        weights = [self.mix[n] for n in names]
+        tasks = []
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < self.args.duration:
+            now = time.perf_counter()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            if self.in_flight >= self.args.max_in_flight:
+                self.dropped += 1
+            else:
+                scenario = self.rng.choices(names, weights)[0]
+                tasks.append(asyncio.create_task(self._run_one(scenario, self.rng.randrange(self.args.sessions))))
+            next_at += self.rng.expovariate(self.args.rate)
+        await asyncio.gather(*tasks)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, wall_s: float) -> Dict[str, Any]:
+        by_intent: Dict[str, List[Tuple[float, str]]] = {}
+        for intent, latency, outcome in self.samples:
+            by_intent.setdefault(intent, []).append((latency, outcome))
+        by_intent["all"] = [(latency, outcome) for _, latency, outcome in self.samples]
+
+        intents = {}
+        for intent, samples in by_intent.items():
+            latencies = sorted(s[0] for s in samples)
+            degraded = sum(1 for s in samples if s[1] == "degraded")
+            errors = sum(1 for s in samples if s[1] != "ok")
+            intents[intent] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / wall_s, 2) if wall_s else 0.0,
+                "errors": errors,
+                "degraded": degraded,
+                "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+                "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+                "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            }
+        return {
+            "config": {
+                "rate": self.args.rate,
+                "duration_s": self.args.duration,
+                "mix": self.mix,
+                "sessions": self.args.sessions,
+                "target": self.args.url or "in-process (stub providers)",
+            },
+            "wall_s": round(wall_s, 2),
+            "dropped_scenarios": self.dropped,
+            "intents": intents,
+        }
+
+
+def _print_table(report: Dict[str, Any]) -> None:
+    print(f"{'intent':<16}{'reqs':>7}{'rps':>8}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}", file=sys.stderr)
+    for intent, r in sorted(report["intents"].items()):
+        print(
+            f"{intent:<16}{r['requests']:>7}{r['throughput_rps']:>8.2f}{r['error_rate'] * 100:>7.1f}%"
+            f"{r['p50_ms']:>9.0f}ms{r['p95_ms']:>8.0f}ms{r['p99_ms']:>8.0f}ms",
+            file=sys.stderr,
+        )
+
+
+async def _main(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url) as client:
+            return await LoadGenerator(client, args).run()
+
+    if args.gemini_interval is not None:
+        os.environ["GEMINI_MIN_REQUEST_INTERVAL"] = str(args.gemini_interval)
+    install_stubs(args.amadeus_ms, args.serp_ms, args.gemini_ms, seed=args.seed)
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    import main
+
+    # ASGITransport doesn't send lifespan events; run the app's lifespan so
+    # warm-up happens and the session checkpointer is closed afterwards
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://loadgen") as client:
+        return await LoadGenerator(client, args).run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=5.0, help="scenario arrivals per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate arrivals")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--sessions", type=int, default=200, help="distinct session ids")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="drop arrivals beyond this many running scenarios")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between turns of a conversation")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request client timeout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--amadeus-ms", type=float, default=600.0, help="stub Amadeus median latency")
+    parser.add_argument("--serp-ms", type=float, default=1500.0, help="stub SERP median latency")
+    parser.add_argument("--gemini-ms", type=float, default=2500.0, help="stub Gemini median latency for a 4k-token call")
+    parser.add_argument("--gemini-interval", type=float, help="override GEMINI_MIN_REQUEST_INTERVAL (in-process only)")
+    parser.add_argument("--output", help="write the report JSON here")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_main(args))
+    _print_table(report)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Offline microbenchmarks for the CPU-side hot paths.
+
+Run from backend/:
+
+    python -m benchmarks.run                      # run all, compare with baseline.json
+    python -m benchmarks.run -k planner           # only benchmarks whose name contains "planner"
+    python -m benchmarks.run --output out.json    # also write results as JSON
+    python -m benchmarks.run --update-baseline    # record the current numbers as the baseline
+
+Each benchmark is calibrated so one repeat takes at least --min-time seconds;
+the median per-call time across repeats is compared with the baseline and
+anything slower by more than --threshold is reported as a regression (exit
+status 1). Baselines are machine-specific: refresh them on the machine that
+runs the comparison.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fixtures import (
+    QUERY_CORPUS,
+    amadeus_offers_payload,
+    parsed_queries,
+    serp_hotels_payload,
+)
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+PLANNER_DAYS = (1, 7, 30, 60)
+PLANNER_STYLES = ("relaxed", "balanced", "packed")
+
+Benchmark = Tuple[str, Callable[[], Any]]
+
+
+def _parser_benchmarks() -> List[Benchmark]:
+    from nlp.parser import _heuristic_parse
+
+    def parse_corpus():
+        for query in QUERY_CORPUS:
+            _heuristic_parse(query)
+
+    return [(f"parser.heuristic_parse[{len(QUERY_CORPUS)} queries]", parse_corpus)]
+
+
+def _formatter_benchmarks() -> List[Benchmark]:
+    from services.amadeus_flights import format_flight_offers
+    from services.serp_hotels import format_hotels
+
+    offers = amadeus_offers_payload(250)
+    hotels = serp_hotels_payload(200)
+    return [
+        ("format.flight_offers[250]", lambda: format_flight_offers(offers, "BOM")),
+        ("format.hotels[200]", lambda: format_hotels(hotels, max_results=200)),
+    ]
+
+
+def _planner_benchmarks() -> List[Benchmark]:
+    from graph.itinerary_planning_graph import get_app
+
+    itinerary_planning_app = get_app()
+    cases = []
+    for days in PLANNER_DAYS:
+        for style in PLANNER_STYLES:
+            state = {"number_of_days": days, "destination": "Goa", "travel_style": style, "budget_level": "medium", "seed": 0}
+            cases.append((f"planner.{style}[{days}d]", lambda state=state: itinerary_planning_app.invoke(dict(state))))
+    return cases
+
+
+def _narrator_benchmarks() -> List[Benchmark]:
+    from graph.itinerary_planning_graph import get_app
+    from nlp.itinerary_narrator import readable_itinerary
+
+    itinerary_planning_app = get_app()
+    cases = []
+    for days in (7, 60):
+        itinerary = itinerary_planning_app.invoke({
+            "number_of_days": days, "destination": "Goa", "travel_style": "balanced", "budget_level": "medium", "seed": 0,
+        })["final_itinerary"]
+        cases.append((
+            f"narrator.readable_itinerary[{days}d]",
+            lambda itinerary=itinerary: readable_itinerary(itinerary, "balanced", "medium", "Goa"),
+        ))
+    return cases
+
+
+def _coordinator_benchmarks() -> List[Benchmark]:
+    from agents.coordinator_agent import CoordinatorAgent
+
+    coordinator = CoordinatorAgent()
+    queries = parsed_queries()
+
+    def route_all():
+        for parsed in queries:
+            coordinator.process_intent(parsed)
+            coordinator.get_entities(parsed)
+
+    return [(f"coordinator.route[{len(queries)} intents]", route_all)]
+
+
+def collect() -> List[Benchmark]:
+    return (
+        _parser_benchmarks()
+        + _formatter_benchmarks()
+        + _planner_benchmarks()
+        + _narrator_benchmarks()
+        + _coordinator_benchmarks()
+    )
+
+
+def measure(fn: Callable[[], Any], repeats: int, min_time: float) -> Dict[str, float]:
+    """Per-call timings in microseconds over `repeats` calibrated runs."""
+    fn()  # warm caches and lazy imports
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed * 1.2))
+
+    samples = [elapsed / loops]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+
+    return {
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "min_us": round(min(samples) * 1e6, 3),
+        "max_us": round(max(samples) * 1e6, 3),
+        "loops": loops,
+        "repeats": repeats,
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Benchmarks whose median is more than `threshold` slower than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = result["median_us"] / base["median_us"] if base["median_us"] else 1.0
+        result["baseline_median_us"] = base["median_us"]
+        result["change"] = round(ratio - 1.0, 3)
+        if ratio > 1.0 + threshold:
+            regressions.append({"name": name, "baseline_us": base["median_us"], "current_us": result["median_us"], "change": result["change"]})
+    return regressions
+
+
+def _load_baseline(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per repeat (default 0.05)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (default 0.25)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, fn in collect():
+        if args.pattern and args.pattern not in name:
+            continue
+        results[name] = measure(fn, args.repeats, args.min_time)
+        print(f"{name:<40} {results[name]['median_us']:>12.1f} us", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    regressions: List[Dict[str, Any]] = []
+    if args.update_baseline:
+        baseline = _load_baseline(args.baseline)
+        merged = {**baseline.get("results", {}), **results}
+        args.baseline.write_text(json.dumps({"meta": report["meta"], "results": merged}, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+    else:
+        regressions = compare(results, _load_baseline(args.baseline), args.threshold)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['name']}: {r['baseline_us']:.1f} -> {r['current_us']:.1f} us ({r['change']:+.0%})", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Request-scoped deadlines.
+
+A Deadline is created once per request at the endpoint and passed down to
+the parser, graph nodes, agents, services and the Gemini client. Each stage
+asks for the remaining budget (capped by its own default timeout) instead of
+using a fixed timeout, and optional work is skipped when too little is left.
+"""
+
+import os
+import time
+from typing import Optional
+
+# Total budget for one /chat request; keep below the load balancer cutoff
+CHAT_DEADLINE_S = float(os.getenv("CHAT_DEADLINE_S", "25"))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage cannot start because the request budget is spent."""
+
+
+class Deadline:
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, min_s: float) -> bool:
+        """True if at least min_s seconds remain."""
+        return self.remaining() >= min_s
+
+    def timeout(self, cap: float) -> float:
+        """The stage timeout: its own default cap, bounded by the remaining budget."""
+        return min(cap, self.remaining())
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s of {self.budget_s}s)"
+
+
+def timeout_for(deadline: Optional[Deadline], cap: float) -> float:
+    """Stage timeout for an optional deadline."""
+    return cap if deadline is None else deadline.timeout(cap)
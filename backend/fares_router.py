@@ -0,0 +1,32 @@
+import asyncio
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from services.fare_history import cheapest_days
+
+router = APIRouter()
+
+
+# Fare calendar from the local fare history: the cheapest fare observed for each
+# departure day over the next `days` days. Never calls a provider; days nobody
+# searched have price null. max_age_days ignores observations older than that.
+@router.get("/fares/cheapest")
+async def cheapest_fares(
+    origin: str,
+    destination: str,
+    days: int = Query(30, ge=1, le=366),
+    cabin: str = "ECONOMY",
+    start: Optional[date] = None,
+    max_age_days: Optional[int] = Query(None, ge=0),
+):
+    if len(origin) != 3 or len(destination) != 3:
+        raise HTTPException(status_code=422, detail="origin and destination must be IATA codes")
+    calendar = await asyncio.to_thread(cheapest_days, origin, destination, days, cabin, start, max_age_days)
+    priced = [day for day in calendar if day["price"] is not None]
+    return {
+        "origin": origin.upper(),
+        "destination": destination.upper(),
+        "cabin": cabin.upper(),
+        "days": calendar,
+        "cheapest": min(priced, key=lambda day: day["price"]) if priced else None,
+    }
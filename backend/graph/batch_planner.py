@@ -0,0 +1,181 @@
+"""
+Batch itinerary planning over a process pool.
+
+The planning graph is pure CPU work, so large batches are spread across
+worker processes and results are streamed back as they complete.
+Plans already in the plan cache are served without touching the pool.
+Narration is an optional later stage that runs on the event loop and never
+holds up the planning stream; at most BATCH_NARRATION_CONCURRENCY narrations
+per batch wait on Gemini at a time, at bulk priority.
+
+A pool whose worker died (BrokenProcessPool) is replaced, and the plan that
+hit it is retried once on the new pool.
+
+Environment:
+    BATCH_PLANNER_WORKERS        worker processes (default: CPU count)
+    BATCH_NARRATION_CONCURRENCY  narrations in flight per batch (default 4)
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Dict, List, Optional
+from graph.plan_cache import get_plan, normalize_plan_inputs, plan_cache_key, store_plan
+
+BATCH_PLANNER_WORKERS = int(os.getenv("BATCH_PLANNER_WORKERS", str(os.cpu_count() or 2)))
+BATCH_NARRATION_CONCURRENCY = int(os.getenv("BATCH_NARRATION_CONCURRENCY", "4"))
+REQUIRED_FIELDS = ("number_of_days", "destination", "travel_style", "budget_level")
+
+_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=BATCH_PLANNER_WORKERS)
+    return _POOL
+
+
+def _replace_pool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """A working pool after `broken` failed; concurrent callers share one replacement."""
+    global _POOL
+    if _POOL is broken:
+        broken.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+    return _get_pool()
+
+
+def shutdown_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def plan_in_worker(state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run the planning graph synchronously inside a worker process."""
+    from graph.itinerary_planning_graph import get_app
+    result = get_app().invoke(state)
+    return result.get("final_itinerary")
+
+
+def _missing_fields(state: Dict[str, Any]) -> List[str]:
+    return [f for f in REQUIRED_FIELDS if state.get(f) in (None, "")]
+
+
+async def plan_batch(states: List[Dict[str, Any]], narrate: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Plan many itineraries and yield events as they finish.
+
+    Events (in completion order):
+        {"type": "plan", "index", "plan_id", "itinerary", "elapsed_ms"}
+        {"type": "error", "index", "error"}
+        {"type": "narration", "index", "narration"}   (only if narrate=True)
+        {"type": "error", "index", "stage": "narration", "error"}   (narration failed; the plan still counts)
+        {"type": "summary", "total", "planned", "failed", "planning_s", "elapsed_s", "plans_per_sec"}
+    """
+    loop = asyncio.get_running_loop()
+    narration_slots = asyncio.Semaphore(BATCH_NARRATION_CONCURRENCY)
+    events: asyncio.Queue = asyncio.Queue()
+    started = time.perf_counter()
+    planned = 0
+    failed = 0
+    planning_elapsed = 0.0
+
+    async def plan_one(index: int, state: Dict[str, Any]) -> None:
+        missing = _missing_fields(state)
+        if missing:
+            await events.put({"type": "error", "index": index, "error": f"Missing fields: {', '.join(missing)}"})
+            return
+        t0 = time.perf_counter()
+        try:
+            state = normalize_plan_inputs(state)
+            entry = get_plan(plan_cache_key(state))
+            if entry is None:
+                pool = _get_pool()
+                try:
+                    itinerary = await loop.run_in_executor(pool, plan_in_worker, state)
+                except BrokenProcessPool:
+                    itinerary = await loop.run_in_executor(_replace_pool(pool), plan_in_worker, state)
+                entry = store_plan(state, itinerary)
+        except Exception as e:
+            await events.put({"type": "error", "index": index, "error": str(e)})
+            return
+        itinerary = entry["final_itinerary"]
+        await events.put({
+            "type": "plan",
+            "index": index,
+            "plan_id": entry["plan_id"],
+            "itinerary": itinerary,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+        })
+        if narrate:
+            narration_tasks[asyncio.create_task(narrate_one(index, state, itinerary))] = index
+
+    async def narrate_one(index: int, state: Dict[str, Any], itinerary: List[Dict[str, Any]]) -> None:
+        from nlp.itinerary_narrator import narrate_itinerary
+        async with narration_slots:
+            narration = await narrate_itinerary(
+                itinerary,
+                state["travel_style"],
+                state["budget_level"],
+                state["destination"],
+                priority="bulk",
+            )
+        await events.put({"type": "narration", "index": index, "narration": narration})
+
+    narration_tasks: Dict[asyncio.Task, int] = {}
+    plan_tasks = {asyncio.create_task(plan_one(i, s)): i for i, s in enumerate(states)}
+
+    async def report_failures(tasks: Dict[asyncio.Task, int], stage: str) -> None:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for index, result in zip(tasks.values(), results):
+            if isinstance(result, Exception):
+                event = {"type": "error", "index": index, "error": str(result) or type(result).__name__}
+                if stage != "plan":
+                    event["stage"] = stage
+                await events.put(event)
+
+    async def drain() -> None:
+        try:
+            await report_failures(plan_tasks, "plan")
+            # Narrations are scheduled while plans complete, so wait for them last
+            while narration_tasks:
+                pending = dict(narration_tasks)
+                narration_tasks.clear()
+                await report_failures(pending, "narration")
+        finally:
+            # Always end the stream, even if a task failed in an unexpected way
+            events.put_nowait(None)
+
+    drainer = asyncio.create_task(drain())
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            if event["type"] == "plan":
+                planned += 1
+            elif event["type"] == "error" and "stage" not in event:
+                failed += 1
+            if event["type"] in ("plan", "error") and "stage" not in event:
+                planning_elapsed = time.perf_counter() - started
+            yield event
+    finally:
+        if not drainer.done():
+            drainer.cancel()
+            for task in [*plan_tasks, *narration_tasks]:
+                task.cancel()
+
+    elapsed = time.perf_counter() - started
+    yield {
+        "type": "summary",
+        "total": len(states),
+        "planned": planned,
+        "failed": failed,
+        "planning_s": round(planning_elapsed, 3),
+        "elapsed_s": round(elapsed, 3),
+        "plans_per_sec": round(planned / planning_elapsed, 2) if planning_elapsed > 0 else None,
+    }
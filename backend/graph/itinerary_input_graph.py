@@ -1,5 +1,50 @@
-from typing import TypedDict, Literal, Any
-from langgraph.graph import StateGraph, END
+"""
+Itinerary input conversation, one graph run per chat turn.
+
+Each session is a LangGraph thread (thread_id = session_id) whose state is
+kept by a checkpointer. A turn loads the latest checkpoint, enters the graph
+directly at the validator for the stored current_step (no replay of earlier
+turns) and stops after answering: the next question when the answer was
+valid, the same question again when it was not. Planning can start as soon as
+a turn returns confirmed=True.
+
+The checkpointer is SQLite (ITINERARY_CHECKPOINT_DB) when
+langgraph-checkpoint-sqlite is installed, so conversations survive restarts
+and are visible to every worker; otherwise it is kept in memory. The
+implicit DEFAULT_SESSION (requests without a session_id) is always kept in
+memory: it is shared by every such client, so it must not outlive the process.
+
+A session is deleted once its itinerary is planned. Conversations abandoned
+before that are deleted after ITINERARY_SESSION_TTL_S without a turn; turns
+record their time in a session_activity table next to the checkpoints, and
+a sweep runs in the background at most every _SWEEP_EVERY_S.
+
+The app lifespan closes the database with close_checkpointer(); scripts that
+run turns outside it should await it too. A process that exits without doing
+so is not held up by the connection, which is also stopped at exit.
+
+Environment:
+    ITINERARY_CHECKPOINT_DB  SQLite checkpoint database (default backend/.data/itinerary_sessions.db)
+    ITINERARY_SESSION_TTL_S  idle conversations are deleted after this (default 86400)
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import time
+from pathlib import Path
+from typing import TypedDict, Literal, Any, Dict, Optional
+from paths import data_dir
+from startup import lazy
+
+logger = logging.getLogger(__name__)
+
+ITINERARY_CHECKPOINT_DB = Path(os.getenv("ITINERARY_CHECKPOINT_DB", data_dir() / "itinerary_sessions.db"))
+ITINERARY_SESSION_TTL_S = float(os.getenv("ITINERARY_SESSION_TTL_S", "86400"))
+_SWEEP_EVERY_S = 300.0
+# Session used when the client doesn't send one; never written to SQLite
+DEFAULT_SESSION = "default"
 
 # State for itinerary input collection
 class ItineraryInputState(TypedDict, total=False):
@@ -9,51 +54,61 @@ class ItineraryInputState(TypedDict, total=False):
     budget_level: Literal["low", "medium", "high"] | None
     confirmed: bool | None
     current_step: str | None
+    # Set while changing one field after the summary; validation then returns to the summary
+    editing: bool | None
     user_input: str | None
     response: str | None
 
-# Node: Ask for number_of_days
-async def ask_number_of_days(state: ItineraryInputState) -> dict[str, Any]:
-    return {
-        "current_step": "number_of_days",
-        "response": "How many days will your trip be? (Please enter a number)"
-    }
+FIELDS = ["number_of_days", "destination", "travel_style", "budget_level"]
+
+QUESTIONS = {
+    "number_of_days": "How many days will your trip be? (Please enter a number)",
+    "destination": "What is your destination? (Please enter a city or country)",
+    "travel_style": "What is your travel style? (relaxed, balanced, packed)",
+    "budget_level": "What is your budget level? (low, medium, high)",
+}
+
+def _answer(state: ItineraryInputState) -> str:
+    return (state.get("user_input") or "").strip()
 
 # Node: Validate number_of_days
 async def validate_number_of_days(state: ItineraryInputState) -> dict[str, Any]:
-    user_input = state.get("user_input", "")
+    user_input = _answer(state)
     try:
         days = int(user_input)
         if days < 1 or days > 60:
             raise ValueError
         return {"number_of_days": days, "current_step": None}
     except Exception:
+        # A new conversation that didn't open with a number gets the question itself
+        if state.get("current_step") is None:
+            return {"response": QUESTIONS["number_of_days"], "current_step": "number_of_days"}
         return {"response": "Please enter a valid number of days (1-60).", "current_step": "number_of_days"}
 
 # Node: Ask for destination
 async def ask_destination(state: ItineraryInputState) -> dict[str, Any]:
     return {
         "current_step": "destination",
-        "response": "What is your destination? (Please enter a city or country)"
+        "response": QUESTIONS["destination"]
     }
 
 # Node: Validate destination
 async def validate_destination(state: ItineraryInputState) -> dict[str, Any]:
-    user_input = state.get("user_input", "")
-    if user_input and isinstance(user_input, str) and len(user_input) > 1:
-        return {"destination": user_input.strip(), "current_step": None}
+    user_input = _answer(state)
+    if len(user_input) > 1:
+        return {"destination": user_input, "current_step": None}
     return {"response": "Please enter a valid destination (at least 2 characters).", "current_step": "destination"}
 
 # Node: Ask for travel_style
 async def ask_travel_style(state: ItineraryInputState) -> dict[str, Any]:
     return {
         "current_step": "travel_style",
-        "response": "What is your travel style? (relaxed, balanced, packed)"
+        "response": QUESTIONS["travel_style"]
     }
 
 # Node: Validate travel_style
 async def validate_travel_style(state: ItineraryInputState) -> dict[str, Any]:
-    user_input = state.get("user_input", "")
+    user_input = _answer(state).lower()
     valid = ["relaxed", "balanced", "packed"]
     if user_input in valid:
         return {"travel_style": user_input, "current_step": None}
@@ -63,12 +118,12 @@ async def validate_travel_style(state: ItineraryInputState) -> dict[str, Any]:
 async def ask_budget_level(state: ItineraryInputState) -> dict[str, Any]:
     return {
         "current_step": "budget_level",
-        "response": "What is your budget level? (low, medium, high)"
+        "response": QUESTIONS["budget_level"]
     }
 
 # Node: Validate budget_level
 async def validate_budget_level(state: ItineraryInputState) -> dict[str, Any]:
-    user_input = state.get("user_input", "")
+    user_input = _answer(state).lower()
     valid = ["low", "medium", "high"]
     if user_input in valid:
         return {"budget_level": user_input, "current_step": None}
@@ -84,44 +139,238 @@ async def confirm_inputs(state: ItineraryInputState) -> dict[str, Any]:
         f"- Budget level: {state.get('budget_level')}\n"
         "Is this correct? (yes/no or type the field to change)"
     )
-    return {"current_step": "confirmation", "response": summary}
+    return {"current_step": "confirmation", "editing": False, "response": summary}
 
 # Node: Handle confirmation
 async def handle_confirmation(state: ItineraryInputState) -> dict[str, Any]:
-    user_input = state.get("user_input", "")
-    if user_input.lower() == "yes":
-        return {"confirmed": True, "response": "Thank you! Your itinerary input is complete."}
-    elif user_input.lower() == "no":
+    user_input = _answer(state).lower()
+    if user_input == "yes":
+        return {"confirmed": True, "current_step": None, "response": "Thank you! Your itinerary input is complete."}
+    elif user_input == "no":
         return {"response": "Which field would you like to change? (number_of_days, destination, travel_style, budget_level)", "current_step": "confirmation"}
-    elif user_input in ["number_of_days", "destination", "travel_style", "budget_level"]:
-        return {"current_step": user_input, "response": f"Okay, let's update {user_input}."}
+    elif user_input in FIELDS:
+        return {"current_step": user_input, "editing": True, "response": f"Okay, let's update {user_input}. {QUESTIONS[user_input]}"}
     else:
         return {"response": "Please reply 'yes', 'no', or the field name to change.", "current_step": "confirmation"}
 
+# Turn entry: jump straight to the validator for the pending question.
+# A new conversation treats its first message as the number of days.
+def route_turn(state: ItineraryInputState) -> str:
+    step = state.get("current_step") or "number_of_days"
+    return "handle_confirmation" if step == "confirmation" else f"validate_{step}"
+
+def _after_validation(next_node: str):
+    def route(state: ItineraryInputState) -> str:
+        if state.get("current_step") is not None:
+            return "reask"  # invalid: the validator already set the re-ask message
+        return "confirm_inputs" if state.get("editing") else next_node
+    return route
+
 # Build the LangGraph
-workflow = StateGraph(ItineraryInputState)
-workflow.add_node("ask_number_of_days", ask_number_of_days)
-workflow.add_node("validate_number_of_days", validate_number_of_days)
-workflow.add_node("ask_destination", ask_destination)
-workflow.add_node("validate_destination", validate_destination)
-workflow.add_node("ask_travel_style", ask_travel_style)
-workflow.add_node("validate_travel_style", validate_travel_style)
-workflow.add_node("ask_budget_level", ask_budget_level)
-workflow.add_node("validate_budget_level", validate_budget_level)
-workflow.add_node("confirm_inputs", confirm_inputs)
-workflow.add_node("handle_confirmation", handle_confirmation)
-
-# Edges for deterministic flow
-workflow.set_entry_point("ask_number_of_days")
-workflow.add_edge("ask_number_of_days", "validate_number_of_days")
-workflow.add_edge("validate_number_of_days", "ask_destination")
-workflow.add_edge("ask_destination", "validate_destination")
-workflow.add_edge("validate_destination", "ask_travel_style")
-workflow.add_edge("ask_travel_style", "validate_travel_style")
-workflow.add_edge("validate_travel_style", "ask_budget_level")
-workflow.add_edge("ask_budget_level", "validate_budget_level")
-workflow.add_edge("validate_budget_level", "confirm_inputs")
-workflow.add_edge("confirm_inputs", "handle_confirmation")
-workflow.add_edge("handle_confirmation", END)
-
-app = workflow.compile()
+def _build():
+    # LangGraph is imported here so importing this module stays cheap
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(ItineraryInputState)
+    workflow.add_node("validate_number_of_days", validate_number_of_days)
+    workflow.add_node("ask_destination", ask_destination)
+    workflow.add_node("validate_destination", validate_destination)
+    workflow.add_node("ask_travel_style", ask_travel_style)
+    workflow.add_node("validate_travel_style", validate_travel_style)
+    workflow.add_node("ask_budget_level", ask_budget_level)
+    workflow.add_node("validate_budget_level", validate_budget_level)
+    workflow.add_node("confirm_inputs", confirm_inputs)
+    workflow.add_node("handle_confirmation", handle_confirmation)
+
+    # Every turn runs the pending validator, then at most one question node
+    workflow.set_conditional_entry_point(route_turn)
+    for validator, next_node in [
+        ("validate_number_of_days", "ask_destination"),
+        ("validate_destination", "ask_travel_style"),
+        ("validate_travel_style", "ask_budget_level"),
+        ("validate_budget_level", "confirm_inputs"),
+    ]:
+        workflow.add_conditional_edges(
+            validator,
+            _after_validation(next_node),
+            {"reask": END, next_node: next_node, "confirm_inputs": "confirm_inputs"},
+        )
+    for node in ["ask_destination", "ask_travel_style", "ask_budget_level", "confirm_inputs", "handle_confirmation"]:
+        workflow.add_edge(node, END)
+
+    return workflow
+
+
+# Built on first use (or by startup warm-up); compiled with the checkpointer below
+get_workflow = lazy("itinerary_input_graph", _build)
+
+_session_app = None
+_checkpointer = None
+_checkpoint_conn = None
+# DEFAULT_SESSION, and every session when SQLite is unavailable
+_memory_app = None
+_memory_checkpointer = None
+# Last turn per in-memory session
+_memory_activity: Dict[str, float] = {}
+_last_sweep = 0.0
+_sweep_task: Optional[asyncio.Task] = None
+
+
+async def _open_checkpointer():
+    try:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError:
+        logger.warning("langgraph-checkpoint-sqlite not installed; itinerary sessions are kept in memory")
+        return None, None
+    ITINERARY_CHECKPOINT_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = aiosqlite.connect(str(ITINERARY_CHECKPOINT_DB))
+    # aiosqlite's worker thread is non-daemon, so a process that never closed
+    # the connection would hang at exit before atexit hooks run. Every write is
+    # committed, so letting exit proceed loses nothing; _stop_at_exit closes it.
+    conn._thread.daemon = True
+    await conn
+    saver = AsyncSqliteSaver(conn)
+    await saver.setup()
+    async with saver.lock:
+        await conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_activity "
+            "(thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        # Left by versions that persisted the shared default session
+        for table in ("checkpoints", "writes", "session_activity"):
+            await conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (DEFAULT_SESSION,))
+        await conn.commit()
+    return conn, saver
+
+
+async def get_session_app():
+    """The input graph compiled with the session checkpointer."""
+    global _session_app, _checkpointer, _checkpoint_conn, _memory_app, _memory_checkpointer
+    if _session_app is None:
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        workflow = await get_workflow.aget()
+        conn, checkpointer = await _open_checkpointer()
+        if _session_app is not None:
+            # Another turn finished opening it while we awaited
+            if conn is not None:
+                await conn.close()
+            return _session_app
+        if _memory_app is None:
+            _memory_checkpointer = InMemorySaver()
+            _memory_app = workflow.compile(checkpointer=_memory_checkpointer)
+        if conn is None:
+            _checkpointer, _session_app = _memory_checkpointer, _memory_app
+        else:
+            _checkpoint_conn, _checkpointer = conn, checkpointer
+            _session_app = workflow.compile(checkpointer=checkpointer)
+    return _session_app
+
+
+def _in_memory(session_id: str) -> bool:
+    return _checkpoint_conn is None or session_id == DEFAULT_SESSION
+
+
+async def run_turn(session_id: str, user_input: str) -> Dict[str, Any]:
+    """Feed one user message to the session's conversation; returns the updated state."""
+    app = await get_session_app()
+    if _in_memory(session_id):
+        app = _memory_app
+    config = {"configurable": {"thread_id": session_id}}
+    # confirmed only holds for the turn that confirmed
+    state = await app.ainvoke({"user_input": user_input, "confirmed": False}, config)
+    await _touch(session_id)
+    _maybe_sweep()
+    return state
+
+
+async def reset_session(session_id: str) -> None:
+    """Forget a session's conversation (after planning, or to start over)."""
+    await get_session_app()
+    if _in_memory(session_id):
+        await _memory_checkpointer.adelete_thread(session_id)
+        _memory_activity.pop(session_id, None)
+        return
+    await _checkpointer.adelete_thread(session_id)
+    async with _checkpointer.lock:
+        await _checkpoint_conn.execute("DELETE FROM session_activity WHERE thread_id = ?", (session_id,))
+        await _checkpoint_conn.commit()
+
+
+async def _touch(session_id: str) -> None:
+    now = time.time()
+    if _in_memory(session_id):
+        _memory_activity[session_id] = now
+        return
+    async with _checkpointer.lock:
+        await _checkpoint_conn.execute(
+            "INSERT INTO session_activity VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (session_id, now),
+        )
+        await _checkpoint_conn.commit()
+
+
+def _maybe_sweep() -> None:
+    global _last_sweep, _sweep_task
+    now = time.monotonic()
+    if now - _last_sweep < _SWEEP_EVERY_S or (_sweep_task is not None and not _sweep_task.done()):
+        return
+    _last_sweep = now
+    _sweep_task = asyncio.get_running_loop().create_task(_sweep(), name="itinerary-session-sweep")
+
+
+async def _sweep() -> None:
+    try:
+        expired = await expire_sessions()
+        if expired:
+            logger.info("Deleted %d idle itinerary conversations", expired)
+    except Exception as e:
+        logger.warning("Itinerary session sweep failed: %s", e)
+
+
+async def expire_sessions(ttl_s: Optional[float] = None) -> int:
+    """Delete conversations without a turn for ttl_s (default ITINERARY_SESSION_TTL_S); returns how many."""
+    await get_session_app()
+    now = time.time()
+    cutoff = now - (ITINERARY_SESSION_TTL_S if ttl_s is None else ttl_s)
+    expired = [thread_id for thread_id, at in _memory_activity.items() if at < cutoff]
+    if _checkpoint_conn is not None:
+        async with _checkpointer.lock:
+            # Threads checkpointed before activity was recorded start their TTL now
+            await _checkpoint_conn.execute(
+                "INSERT OR IGNORE INTO session_activity SELECT DISTINCT thread_id, ? FROM checkpoints", (now,)
+            )
+            async with _checkpoint_conn.execute(
+                "SELECT thread_id FROM session_activity WHERE updated_at < ?", (cutoff,)
+            ) as cursor:
+                expired += [row[0] for row in await cursor.fetchall()]
+            await _checkpoint_conn.commit()
+    for thread_id in expired:
+        await reset_session(thread_id)
+    if expired and _checkpoint_conn is not None:
+        async with _checkpointer.lock:
+            # Fold the deletions into the database and truncate the WAL
+            await _checkpoint_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return len(expired)
+
+
+async def close_checkpointer() -> None:
+    """Close the session database; the next turn reopens it."""
+    global _session_app, _checkpointer, _checkpoint_conn, _sweep_task
+    if _sweep_task is not None:
+        _sweep_task.cancel()
+        _sweep_task = None
+    if _checkpoint_conn is not None:
+        await _checkpoint_conn.close()
+    _session_app = _checkpointer = _checkpoint_conn = None
+
+
+@atexit.register
+def _stop_at_exit() -> None:
+    # Hand the close to the worker thread and give it a moment to run it
+    conn = _checkpoint_conn
+    if conn is not None:
+        conn.stop()
+        conn._thread.join(timeout=2)
@@ -1,5 +1,8 @@
 from typing import TypedDict, Literal, Any, List, Dict
-from langgraph.graph import StateGraph, END
+from graph.route_optimizer import route_itinerary
+from observability.metrics import timed_node
+from startup import lazy
+import hashlib
 import random
 
 # --- State Definition ---
@@ -15,6 +18,27 @@ class ItineraryPlanningState(TypedDict, total=False):
     final_itinerary: List[Dict[str, Any]]
     validation_errors: List[str]
     current_step: str
+    city_center: Dict[str, float]
+    seed: int
+    assignment_attempt: int
+
+# Deterministic pseudo-coordinates (demo data has no real geocoding)
+def _hashed_unit(key: str) -> float:
+    digest = hashlib.md5(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 0xFFFFFFFF
+
+def _city_center(destination: str) -> Dict[str, float]:
+    key = destination.strip().lower()
+    return {
+        "lat": round(-50 + 110 * _hashed_unit(f"lat:{key}"), 6),
+        "lon": round(-180 + 360 * _hashed_unit(f"lon:{key}"), 6),
+    }
+
+def _place_near(center: Dict[str, float], name: str, radius_deg: float = 0.08) -> Dict[str, float]:
+    return {
+        "lat": round(center["lat"] + radius_deg * (2 * _hashed_unit(f"lat:{name}") - 1), 6),
+        "lon": round(center["lon"] + radius_deg * (2 * _hashed_unit(f"lon:{name}") - 1), 6),
+    }
 
 # --- Agent 1: ItineraryPlannerAgent ---
 def itinerary_planner_agent(state: ItineraryPlanningState) -> Dict[str, Any]:
@@ -55,22 +79,32 @@ def activity_research_agent(state: ItineraryPlanningState) -> Dict[str, Any]:
         {"name": f"{destination} Festival", "type": "cultural"},
         {"name": f"{destination} Botanical Garden", "type": "leisure"},
     ]
-    return {"activities": all_activities, "current_step": "assignment"}
+    center = _city_center(destination)
+    for act in all_activities:
+        act.update(_place_near(center, act["name"]))
+    return {"activities": all_activities, "city_center": center, "current_step": "assignment"}
 
 # --- Agent 3: DayAssignmentAgent ---
 def day_assignment_agent(state: ItineraryPlanningState) -> Dict[str, Any]:
     skeleton = state["skeleton"]
     activities = state["activities"][:]
-    random.shuffle(activities)
+    # Seeded per attempt so a (inputs, seed) pair always yields the same plan
+    seed = state.get("seed")
+    attempt = state.get("assignment_attempt", 0)
+    rng = random.Random(f"{seed}:{attempt}") if seed is not None else random.Random()
+    rng.shuffle(activities)
     assignments = []
     used = set()
     for day in skeleton:
         slots = ["morning", "afternoon", "evening"]
         min_a = day["min_activities"]
         max_a = day["max_activities"]
-        n_acts = random.randint(min_a, max_a)
+        n_acts = rng.randint(min_a, max_a)
         acts_for_day = []
         for _ in range(n_acts):
+            # Long trips exhaust the pool: start another pass over it
+            if len(used) >= len(activities):
+                used = {a["name"] for a in acts_for_day}
             for act in activities:
                 if act["name"] not in used:
                     acts_for_day.append(act)
@@ -82,7 +116,7 @@ def day_assignment_agent(state: ItineraryPlanningState) -> Dict[str, Any]:
             slot = slots[idx % 3]
             slot_assignments[slot].append(act)
         assignments.append({"day": day["day"], "slots": slot_assignments})
-    return {"assignments": assignments, "current_step": "validation"}
+    return {"assignments": assignments, "assignment_attempt": attempt + 1, "current_step": "validation"}
 
 # --- Agent 4: ItineraryValidationAgent ---
 def itinerary_validation_agent(state: ItineraryPlanningState) -> Dict[str, Any]:
@@ -125,24 +159,42 @@ def itinerary_validation_agent(state: ItineraryPlanningState) -> Dict[str, Any]:
                         acts += 1
         return {"assignments": assignments, "validation_passed": False, "validation_errors": errors, "current_step": "assignment"}
     # If valid, finalize
-    return {"final_itinerary": assignments, "validation_passed": True, "validation_errors": [], "current_step": "done"}
+    return {"final_itinerary": assignments, "validation_passed": True, "validation_errors": [], "current_step": "routing"}
+
+# --- Agent 5: RouteOptimizationAgent ---
+def route_optimization_agent(state: ItineraryPlanningState) -> Dict[str, Any]:
+    # Order each day's stops geographically, starting from the city centre
+    center = state.get("city_center")
+    anchor = (center["lat"], center["lon"]) if center else None
+    routed = route_itinerary(state["final_itinerary"], anchor)
+    return {"final_itinerary": routed, "current_step": "done"}
 
 # --- LangGraph Construction ---
-workflow = StateGraph(ItineraryPlanningState)
-workflow.add_node("planner", itinerary_planner_agent)
-workflow.add_node("activity_research", activity_research_agent)
-workflow.add_node("assignment", day_assignment_agent)
-workflow.add_node("validation", itinerary_validation_agent)
+def _build():
+    # LangGraph is imported here so importing this module stays cheap
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(ItineraryPlanningState)
+    workflow.add_node("planner", timed_node("itinerary_planning", "planner", itinerary_planner_agent))
+    workflow.add_node("activity_research", timed_node("itinerary_planning", "activity_research", activity_research_agent))
+    workflow.add_node("assignment", timed_node("itinerary_planning", "assignment", day_assignment_agent))
+    workflow.add_node("validation", timed_node("itinerary_planning", "validation", itinerary_validation_agent))
+    workflow.add_node("routing", timed_node("itinerary_planning", "routing", route_optimization_agent))
+
+    workflow.set_entry_point("planner")
+    workflow.add_edge("planner", "activity_research")
+    workflow.add_edge("activity_research", "assignment")
+    workflow.add_edge("assignment", "validation")
+
+    # Conditional routing from validation
+    def should_continue(state: ItineraryPlanningState) -> str:
+        return "assignment" if not state.get("validation_passed", False) else "routing"
 
-workflow.set_entry_point("planner")
-workflow.add_edge("planner", "activity_research")
-workflow.add_edge("activity_research", "assignment")
-workflow.add_edge("assignment", "validation")
+    workflow.add_conditional_edges("validation", should_continue, {"assignment": "assignment", "routing": "routing"})
+    workflow.add_edge("routing", END)
 
-# Conditional routing from validation
-def should_continue(state: ItineraryPlanningState) -> str:
-    return "assignment" if not state.get("validation_passed", False) else END
+    return workflow.compile()
 
-workflow.add_conditional_edges("validation", should_continue, {"assignment": "assignment", END: END})
 
-app = workflow.compile()
+# Compiled on first use (or by startup warm-up)
+get_app = lazy("itinerary_planning_graph", _build)
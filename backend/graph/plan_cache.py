@@ -0,0 +1,187 @@
+"""
+Memoized itinerary planning.
+
+Plans are deterministic for a given set of normalized inputs and seed, so
+results are kept in a bounded LRU cache keyed on both. The cache key is
+returned to clients as a plan id they can re-fetch or share. Every caller
+gets its own copy of a cached itinerary, so one request editing its plan
+never changes what the next one is served.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from observability.metrics import CACHE_LATENCY, CACHE_LOOKUPS, TASKS_IN_FLIGHT
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "512"))
+# Requests without an explicit seed share this one, so popular inputs hit the cache
+DEFAULT_PLAN_SEED = int(os.getenv("PLAN_DEFAULT_SEED", "0"))
+
+TRAVEL_STYLES = ("relaxed", "balanced", "packed")
+BUDGET_LEVELS = ("low", "medium", "high")
+# Same limit the interactive flow enforces
+MAX_PLAN_DAYS = 60
+
+
+def normalize_plan_inputs(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonicalize planning inputs and make sure a seed is present.
+
+    Raises:
+        ValueError: If a required field is missing or malformed
+    """
+    try:
+        days = int(state["number_of_days"])
+        # Title case so "goa" and "GOA" share a plan and it reads the same for both
+        destination = " ".join(str(state["destination"]).split()).title()
+        travel_style = str(state["travel_style"]).strip().lower()
+        budget_level = str(state["budget_level"]).strip().lower()
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid planning inputs: {e}") from e
+    if not destination:
+        raise ValueError("Invalid planning inputs: destination is empty")
+    if not 1 <= days <= MAX_PLAN_DAYS:
+        raise ValueError(f"Invalid planning inputs: number_of_days must be between 1 and {MAX_PLAN_DAYS}")
+    if travel_style not in TRAVEL_STYLES:
+        raise ValueError(f"Invalid planning inputs: travel_style must be one of {', '.join(TRAVEL_STYLES)}")
+    if budget_level not in BUDGET_LEVELS:
+        raise ValueError(f"Invalid planning inputs: budget_level must be one of {', '.join(BUDGET_LEVELS)}")
+
+    seed = state.get("seed")
+    seed = int(seed) if seed is not None else DEFAULT_PLAN_SEED
+    return {
+        "number_of_days": days,
+        "destination": destination,
+        "travel_style": travel_style,
+        "budget_level": budget_level,
+        "seed": seed,
+    }
+
+
+def plan_cache_key(inputs: Dict[str, Any]) -> str:
+    """Stable id for normalized inputs (destination compared case-insensitively)."""
+    key_fields = {
+        "number_of_days": inputs["number_of_days"],
+        "destination": inputs["destination"].casefold(),
+        "travel_style": inputs["travel_style"],
+        "budget_level": inputs["budget_level"],
+        "seed": inputs["seed"],
+    }
+    raw = json.dumps(key_fields, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class PlanCache:
+    """Thread-safe bounded LRU of plan id -> plan entry."""
+
+    def __init__(self, max_size: int = PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        CACHE_LOOKUPS.set_function(lambda: self.hits, cache="plans", result="hits")
+        CACHE_LOOKUPS.set_function(lambda: self.misses, cache="plans", result="misses")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+plan_cache = PlanCache()
+_IN_FLIGHT: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+TASKS_IN_FLIGHT.set_function(lambda: len(_IN_FLIGHT), kind="plan")
+
+
+def _detached(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """A caller's own copy of a cache entry."""
+    return {**entry, "inputs": dict(entry["inputs"]), "final_itinerary": copy.deepcopy(entry["final_itinerary"])}
+
+
+def _store(inputs: Dict[str, Any], itinerary: Any) -> Dict[str, Any]:
+    key = plan_cache_key(inputs)
+    entry = {"plan_id": key, "inputs": dict(inputs), "final_itinerary": itinerary}
+    plan_cache.put(key, entry)
+    return entry
+
+
+def store_plan(inputs: Dict[str, Any], itinerary: Any) -> Dict[str, Any]:
+    """Insert an already computed plan (e.g. from a batch worker)."""
+    return _detached(_store(inputs, itinerary))
+
+
+def get_plan(plan_id: str) -> Optional[Dict[str, Any]]:
+    entry = plan_cache.get(plan_id)
+    return _detached(entry) if entry is not None else None
+
+
+async def _plan(inputs: Dict[str, Any], key: str) -> Dict[str, Any]:
+    from graph.itinerary_planning_graph import get_app
+
+    try:
+        result = await (await get_app.aget()).ainvoke(dict(inputs))
+        return _store(inputs, result.get("final_itinerary"))
+    finally:
+        _IN_FLIGHT.pop(key, None)
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # Every caller may have gone; don't log an unawaited failure
+    if not task.cancelled():
+        task.exception()
+
+
+async def plan_itinerary_cached(state: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """
+    Plan an itinerary, serving identical (inputs, seed) requests from cache.
+
+    Concurrent identical requests share a single planning run. The run is
+    its own task, so a caller that is cancelled (e.g. its client went away)
+    leaves the others waiting on it unaffected.
+
+    Returns:
+        (entry with plan_id, inputs and final_itinerary, result), where result
+        is "hit", "coalesced" (joined a run already in flight) or "miss",
+        as in the plans CACHE_LATENCY series
+    """
+    started = time.perf_counter()
+    inputs = normalize_plan_inputs(state)
+    key = plan_cache_key(inputs)
+
+    entry = get_plan(key)
+    if entry is not None:
+        CACHE_LATENCY.observe(time.perf_counter() - started, cache="plans", result="hit")
+        return entry, "hit"
+
+    task = _IN_FLIGHT.get(key)
+    result = "miss" if task is None else "coalesced"
+    if task is None:
+        task = asyncio.create_task(_plan(inputs, key), name=f"plan-{key}")
+        task.add_done_callback(_retrieve_exception)
+        _IN_FLIGHT[key] = task
+    entry = _detached(await asyncio.shield(task))
+    CACHE_LATENCY.observe(time.perf_counter() - started, cache="plans", result=result)
+    return entry, result
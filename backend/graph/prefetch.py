@@ -0,0 +1,222 @@
+"""
+Speculative prefetch during the itinerary conversation.
+
+The input conversation knows the destination and trip length two turns in,
+but planning used to wait for the final "yes". After each unconfirmed turn,
+speculate() starts background work for whatever is already known:
+
+- days + destination: plan every travel style / budget combination still
+  possible (activity research and day assignment land in the plan cache), and
+  optionally search hotels for likely dates so the hotel cache is warm
+- all four answers (the confirmation summary): a per-session draft that plans
+  and narrates the trip, with narration at the "prefetch" Gemini priority so
+  it never delays a user who is actually waiting
+
+On confirmation take_draft() hands back the draft if it was made for the
+confirmed inputs. A draft still running is promoted to the class direct
+narration uses, and waited for at most PREFETCH_DRAFT_WAIT_SHARE of the
+remaining request budget so planning directly still fits in the rest. A draft
+for inputs that have since changed is cancelled, and one whose narration
+failed (e.g. shed under load) is a miss rather than a template answer.
+Drafts are per process; a confirmation served by another worker simply
+plans as before.
+
+Environment:
+    PREFETCH_ENABLED          "1" (default) or "0" to turn speculation off
+    PREFETCH_HOTELS           "1" to also search hotels for likely dates (default "0":
+                              each search is billed against the SERP quota)
+    PREFETCH_HOTEL_LEAD_DAYS  check-in this many days from today (default 14)
+    PREFETCH_MAX_DRAFTS       drafts kept at once; the oldest is cancelled (default 64)
+    PREFETCH_DRAFT_TTL_S      drafts nobody confirmed are dropped after this (default 900)
+    PREFETCH_DRAFT_WAIT_SHARE share of the remaining budget a confirmation waits for
+                              an unfinished draft (default 0.5)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
+from deadline import CHAT_DEADLINE_S, Deadline
+from graph.plan_cache import BUDGET_LEVELS, TRAVEL_STYLES, normalize_plan_inputs, plan_cache_key, plan_itinerary_cached
+from nlp.gemini_scheduler import PriorityTicket
+from observability.metrics import CACHE_LOOKUPS, TASKS_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_HOTELS = os.getenv("PREFETCH_HOTELS", "0") == "1"
+PREFETCH_HOTEL_LEAD_DAYS = int(os.getenv("PREFETCH_HOTEL_LEAD_DAYS", "14"))
+PREFETCH_MAX_DRAFTS = int(os.getenv("PREFETCH_MAX_DRAFTS", "64"))
+PREFETCH_DRAFT_TTL_S = float(os.getenv("PREFETCH_DRAFT_TTL_S", "900"))
+PREFETCH_DRAFT_WAIT_SHARE = float(os.getenv("PREFETCH_DRAFT_WAIT_SHARE", "0.5"))
+# What narrate_itinerary uses when planning directly; a confirmed draft is owed the same
+CONFIRMED_DRAFT_PRIORITY = "bulk"
+
+
+class _Speculation:
+    __slots__ = ("warmed", "draft_key", "draft", "priority", "started")
+
+    def __init__(self):
+        # (days, destination) whose plans and hotels were already warmed
+        self.warmed: Optional[Tuple[int, str]] = None
+        self.draft_key: Optional[str] = None
+        self.draft: Optional[asyncio.Task] = None
+        # Priority of the draft's Gemini calls, raised on confirmation
+        self.priority: Optional[PriorityTicket] = None
+        self.started = time.monotonic()
+
+    def cancel_draft(self) -> None:
+        if self.draft is not None and not self.draft.done():
+            self.draft.cancel()
+        self.draft = self.draft_key = self.priority = None
+
+
+_sessions: Dict[str, _Speculation] = {}
+# Strong references, so fire-and-forget tasks aren't garbage collected mid-run
+_background: Set[asyncio.Task] = set()
+_draft_hits = 0
+_draft_misses = 0
+
+TASKS_IN_FLIGHT.set_function(lambda: len(_background), kind="prefetch")
+CACHE_LOOKUPS.set_function(lambda: _draft_hits, cache="itinerary_drafts", result="hits")
+CACHE_LOOKUPS.set_function(lambda: _draft_misses, cache="itinerary_drafts", result="misses")
+
+
+def _spawn(coro, name: str) -> asyncio.Task:
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+def _expire_sessions() -> None:
+    now = time.monotonic()
+    for session_id, spec in list(_sessions.items()):
+        if now - spec.started > PREFETCH_DRAFT_TTL_S:
+            spec.cancel_draft()
+            del _sessions[session_id]
+    drafts = sorted((s for s in _sessions.values() if s.draft is not None), key=lambda s: s.started)
+    for spec in drafts[:max(0, len(drafts) - PREFETCH_MAX_DRAFTS)]:
+        spec.cancel_draft()
+
+
+def speculate(session_id: str, state: Dict[str, Any]) -> None:
+    """Start background work for the answers an unconfirmed turn has collected so far."""
+    if not PREFETCH_ENABLED:
+        return
+    days, destination = state.get("number_of_days"), state.get("destination")
+    if not days or not destination:
+        return
+    _expire_sessions()
+    spec = _sessions.setdefault(session_id, _Speculation())
+
+    warm_key = (int(days), " ".join(str(destination).split()).casefold())
+    if spec.warmed != warm_key:
+        spec.warmed = warm_key
+        _spawn(_warm(dict(state)), f"prefetch-warm-{session_id}")
+
+    if state.get("current_step") != "confirmation":
+        return
+    try:
+        inputs = normalize_plan_inputs(state)
+    except ValueError:
+        return
+    key = plan_cache_key(inputs)
+    if spec.draft_key == key:
+        return
+    # The answers changed since the last summary: the old draft is useless
+    spec.cancel_draft()
+    spec.draft_key = key
+    spec.started = time.monotonic()
+    spec.priority = PriorityTicket("prefetch")
+    spec.draft = _spawn(_draft(inputs, spec.priority), f"prefetch-draft-{session_id}")
+
+
+async def take_draft(
+    session_id: str, state: Dict[str, Any], deadline: Deadline
+) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    The (plan entry, narration) drafted for these confirmed inputs, or None.
+
+    A draft still running is promoted and awaited for at most
+    PREFETCH_DRAFT_WAIT_SHARE of the remaining request budget; a draft for
+    other inputs, or one that failed or ran out of time, is discarded and the
+    caller plans as usual.
+    """
+    global _draft_hits, _draft_misses
+    spec = _sessions.pop(session_id, None)
+    if spec is None or spec.draft is None:
+        _draft_misses += 1
+        return None
+    task = spec.draft
+    if spec.draft_key != plan_cache_key(normalize_plan_inputs(state)):
+        spec.cancel_draft()
+        _draft_misses += 1
+        return None
+    if not task.done():
+        # The user is waiting on it now
+        spec.priority.promote(CONFIRMED_DRAFT_PRIORITY)
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), timeout=deadline.remaining() * PREFETCH_DRAFT_WAIT_SHARE)
+    except asyncio.TimeoutError:
+        logger.info("Itinerary draft not ready within the deadline; planning directly")
+        spec.cancel_draft()
+        _draft_misses += 1
+        return None
+    except Exception as e:
+        logger.warning("Itinerary draft failed: %s", e)
+        _draft_misses += 1
+        return None
+    _draft_hits += 1
+    return result
+
+
+async def _draft(inputs: Dict[str, Any], priority: PriorityTicket) -> Tuple[Dict[str, Any], str]:
+    from nlp.itinerary_narrator import narrate_itinerary
+
+    entry, _ = await plan_itinerary_cached(inputs)
+    narration = await narrate_itinerary(
+        entry["final_itinerary"],
+        inputs["travel_style"],
+        inputs["budget_level"],
+        inputs["destination"],
+        deadline=Deadline(CHAT_DEADLINE_S),
+        priority=priority,
+        # A shed or failed call must not leave the template as the answer;
+        # take_draft counts the failure as a miss and /chat narrates again
+        strict=True,
+    )
+    return entry, narration
+
+
+async def _warm(state: Dict[str, Any]) -> None:
+    # Only the combinations the user can still pick; answered fields are fixed
+    styles = [state["travel_style"]] if state.get("travel_style") else TRAVEL_STYLES
+    budgets = [state["budget_level"]] if state.get("budget_level") else BUDGET_LEVELS
+    for travel_style in styles:
+        for budget_level in budgets:
+            try:
+                await plan_itinerary_cached({**state, "travel_style": travel_style, "budget_level": budget_level})
+            except Exception as e:
+                logger.debug("Plan prefetch failed: %s", e)
+                return
+    if PREFETCH_HOTELS:
+        await _warm_hotels(state["destination"], int(state["number_of_days"]))
+
+
+async def _warm_hotels(destination: str, days: int) -> None:
+    from services.rate_limits import cache_only
+    from services.serp_hotels import search_hotels
+
+    if not os.getenv("SERP_API_KEY") or cache_only("serp"):
+        return
+    check_in = date.today() + timedelta(days=PREFETCH_HOTEL_LEAD_DAYS)
+    check_out = check_in + timedelta(days=days)
+    try:
+        # A hit in hotel_cache makes this free; a miss fills it for the hotel search
+        await asyncio.to_thread(search_hotels, destination, check_in.isoformat(), check_out.isoformat())
+    except Exception as e:
+        logger.debug("Hotel prefetch for %s failed: %s", destination, e)
@@ -0,0 +1,166 @@
+"""
+Intra-day route ordering for planned itineraries.
+
+Each day's located activities are ordered with a nearest-neighbour tour
+improved by 2-opt over a per-day distance matrix, then poured back into
+the morning/afternoon/evening slots in visiting order.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+SLOTS = ["morning", "afternoon", "evening"]
+EARTH_RADIUS_KM = 6371.0
+CITY_SPEED_KMH = 20.0  # Average door-to-door speed for urban travel
+MAX_2OPT_PASSES = 50
+
+
+def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance in km between two (lat, lon) points."""
+    lat1, lon1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lon2 = math.radians(b[0]), math.radians(b[1])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def distance_matrix(points: List[Tuple[float, float]]) -> List[List[float]]:
+    """Symmetric pairwise distance matrix (km)."""
+    n = len(points)
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            d = haversine_km(points[i], points[j])
+            matrix[i][j] = d
+            matrix[j][i] = d
+    return matrix
+
+
+def _path_length(order: List[int], matrix: List[List[float]]) -> float:
+    return sum(matrix[order[i]][order[i + 1]] for i in range(len(order) - 1))
+
+
+def _nearest_neighbour(matrix: List[List[float]], start: int) -> List[int]:
+    n = len(matrix)
+    order = [start]
+    remaining = set(range(n)) - {start}
+    while remaining:
+        last = order[-1]
+        nxt = min(remaining, key=lambda j: matrix[last][j])
+        order.append(nxt)
+        remaining.remove(nxt)
+    return order
+
+
+def _two_opt(order: List[int], matrix: List[List[float]], fixed_start: bool) -> List[int]:
+    """Improve an open path with 2-opt segment reversals until no gain."""
+    order = order[:]
+    n = len(order)
+    first = 1 if fixed_start else 0
+    for _ in range(MAX_2OPT_PASSES):
+        improved = False
+        for i in range(first, n - 1):
+            for j in range(i + 1, n):
+                # Reversing order[i..j] changes edges (i-1, i) and (j, j+1)
+                before = 0.0
+                after = 0.0
+                if i > 0:
+                    before += matrix[order[i - 1]][order[i]]
+                    after += matrix[order[i - 1]][order[j]]
+                if j < n - 1:
+                    before += matrix[order[j]][order[j + 1]]
+                    after += matrix[order[i]][order[j + 1]]
+                if after < before - 1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def order_stops(
+    points: List[Tuple[float, float]],
+    anchor: Optional[Tuple[float, float]] = None,
+) -> Tuple[List[int], float]:
+    """
+    Order points to minimise the open-path travel distance.
+
+    Args:
+        points: (lat, lon) of each stop
+        anchor: Optional fixed starting point (e.g. hotel or city centre)
+
+    Returns:
+        (visiting order as indices into points, total distance in km incl. anchor leg)
+    """
+    if not points:
+        return [], 0.0
+
+    if anchor is not None:
+        matrix = distance_matrix([anchor] + points)
+        order = _two_opt(_nearest_neighbour(matrix, 0), matrix, fixed_start=True)
+        return [i - 1 for i in order[1:]], _path_length(order, matrix)
+
+    matrix = distance_matrix(points)
+    best_order, best_len = None, float("inf")
+    for start in range(len(points)):
+        order = _two_opt(_nearest_neighbour(matrix, start), matrix, fixed_start=False)
+        length = _path_length(order, matrix)
+        if length < best_len:
+            best_order, best_len = order, length
+    return best_order, best_len
+
+
+def _location(activity: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    lat, lon = activity.get("lat"), activity.get("lon")
+    if lat is None or lon is None:
+        return None
+    return (float(lat), float(lon))
+
+
+def route_day(
+    day: Dict[str, Any],
+    anchor: Optional[Tuple[float, float]] = None,
+    speed_kmh: float = CITY_SPEED_KMH,
+) -> Dict[str, Any]:
+    """
+    Reorder one day's activities by route and annotate travel estimates.
+
+    Slot sizes are preserved: located activities are refilled into
+    morning/afternoon/evening in visiting order. Activities without
+    coordinates (e.g. "Rest") stay in their original slot.
+    """
+    slots = day.get("slots", {})
+    located: List[Dict[str, Any]] = []
+    slot_sizes: Dict[str, int] = {}
+    unlocated: Dict[str, List[Dict[str, Any]]] = {}
+    for slot in SLOTS:
+        acts = slots.get(slot, [])
+        with_loc = [a for a in acts if _location(a) is not None]
+        located.extend(with_loc)
+        slot_sizes[slot] = len(with_loc)
+        unlocated[slot] = [a for a in acts if _location(a) is None]
+
+    order, distance_km = order_stops([_location(a) for a in located], anchor)
+    ordered = [located[i] for i in order]
+
+    new_slots: Dict[str, List[Dict[str, Any]]] = {}
+    pos = 0
+    for slot in SLOTS:
+        size = slot_sizes[slot]
+        new_slots[slot] = ordered[pos:pos + size] + unlocated[slot]
+        pos += size
+
+    routed = dict(day)
+    routed["slots"] = new_slots
+    routed["travel_distance_km"] = round(distance_km, 2)
+    routed["travel_time_minutes"] = round(distance_km / speed_kmh * 60) if speed_kmh > 0 else None
+    return routed
+
+
+def route_itinerary(
+    itinerary: List[Dict[str, Any]],
+    anchor: Optional[Tuple[float, float]] = None,
+) -> List[Dict[str, Any]]:
+    """Apply route_day to every day of an itinerary."""
+    return [route_day(day, anchor) for day in itinerary]
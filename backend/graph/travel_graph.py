@@ -1,9 +1,14 @@
-from typing import TypedDict, Any
-from langgraph.graph import StateGraph, END
+from typing import TypedDict, Any, Optional
 from agents.coordinator_agent import CoordinatorAgent
-from agents.flight_agent import FlightAgent
+from agents.flight_agent import FlightAgent, format_flight
 from agents.hotel_agent import HotelAgent
+from deadline import Deadline
+from observability.metrics import timed_node
+from startup import lazy
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class State(TypedDict):
@@ -18,8 +23,15 @@ class State(TypedDict):
     passengers: int | None
     cabin_class: str | None
     additional_info: str | None
+    # Package constraints (see graph.package_optimizer)
+    max_budget: float | None
+    min_rating: float | None
+    max_stops: int | None
     flight_results: list[str]
+    # Structured offers behind flight_results, for package pricing
+    flight_offers: list[dict[str, Any]]
     hotel_results: list[str]
+    deadline: Optional[Deadline]
 
 
 def coordinator_node(state: State) -> dict[str, Any]:
@@ -40,6 +52,9 @@ def coordinator_node(state: State) -> dict[str, Any]:
         "passengers": entities.get("passengers", 1),
         "cabin_class": entities.get("cabin_class"),
         "additional_info": entities.get("additional_info"),
+        "max_budget": entities.get("max_budget"),
+        "min_rating": entities.get("min_rating"),
+        "max_stops": entities.get("max_stops"),
     }
 
 
@@ -50,26 +65,28 @@ async def flight_agent_node(state: State) -> State:
     agent = FlightAgent()
 
     try:
-        results = await agent.search_flights(
+        offers = await agent.search_flight_offers(
             source=state.get("source"),
             destination=state.get("destination"),
             start_date=state.get("start_date"),  # Maps to departure_date in Amadeus
             passengers=state.get("passengers", 1),
-            cabin_class=state.get("cabin_class")
+            cabin_class=state.get("cabin_class"),
+            deadline=state.get("deadline")
         )
 
         # Return only the field we're updating - LangGraph will merge it
         # Replace existing flight_results (don't append) to avoid duplicates
         return {
-            "flight_results": results
+            "flight_results": [format_flight(offer) for offer in offers],
+            "flight_offers": offers,
         }
 
     except asyncio.CancelledError:
         raise
     except Exception as e:
         # Log but don't crash - return empty results
-        print(f"❌ [FLIGHT_NODE] Unexpected error: {e}")
-        return {"flight_results": []}
+        logger.exception("Unexpected error in flight node: %s", e)
+        return {"flight_results": [], "flight_offers": []}
 
 
 
@@ -87,6 +104,7 @@ async def hotel_agent_node(state: State) -> State:
             end_date=state.get("end_date"),
             duration=state.get("duration"),
             additional_info=state.get("additional_info"),
+            deadline=state.get("deadline"),
         )
 
         # Return only the field we're updating - LangGraph will merge it
@@ -100,26 +118,35 @@ async def hotel_agent_node(state: State) -> State:
 
 
 
-# Create the graph
-workflow = StateGraph(State)
+def _build():
+    # LangGraph is imported here so importing this module stays cheap
+    from langgraph.graph import StateGraph, END
+
+    # Create the graph
+    workflow = StateGraph(State)
+
+    # Add nodes
+    workflow.add_node("coordinator", timed_node("travel", "coordinator", coordinator_node))
+    workflow.add_node("flight_agent", timed_node("travel", "flight_agent", flight_agent_node))
+    workflow.add_node("hotel_agent", timed_node("travel", "hotel_agent", hotel_agent_node))
+
+    # Set entry point
+    workflow.set_entry_point("coordinator")
 
-# Add nodes
-workflow.add_node("coordinator", coordinator_node)
-workflow.add_node("flight_agent", flight_agent_node)
-workflow.add_node("hotel_agent", hotel_agent_node)
 
-# Set entry point
-workflow.set_entry_point("coordinator")
+    # After coordinator, fan out: flight and hotel searches run concurrently
+    # so a "both" request waits for the slower provider, not the sum of both
+    workflow.add_edge("coordinator", "flight_agent")
+    workflow.add_edge("coordinator", "hotel_agent")
 
+    # Both agents go to END
+    workflow.add_edge("flight_agent", END)
+    workflow.add_edge("hotel_agent", END)
 
-# After coordinator, always go to flight_agent
-workflow.add_edge("coordinator", "flight_agent")
+    # Compile the graph
+    return workflow.compile()
 
-# After flight_agent, go to hotel_agent
-workflow.add_edge("flight_agent", "hotel_agent")
 
-# After hotel_agent, go to END
-workflow.add_edge("hotel_agent", END)
 
-# Compile the graph
-app = workflow.compile()
+# Compiled on first use (or by startup warm-up)
+get_app = lazy("travel_graph", _build)
@@ -1,29 +1,75 @@
-from dotenv import load_dotenv
-load_dotenv()
+import startup
+startup.load_environment()
+startup.mark("import.dotenv")
 import asyncio
-from fastapi import FastAPI
+import logging
+import math
+import time
+import uuid
+from typing import Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+startup.mark("import.fastapi")
 from schemas import ChatRequest, ChatResponse, HealthResponse
-from graph.travel_graph import app as workflow_app
-from graph.itinerary_input_graph import app as itinerary_input_app
-from graph.itinerary_planning_graph import app as itinerary_planning_app
+from responses import CompressionMiddleware, FastJSONResponse, chat_response
+from deadline import CHAT_DEADLINE_S, Deadline
+from observability.log import bind_context, configure_logging, reset_context, session_id_var
+from observability.metrics import REQUEST_LATENCY, REQUESTS_IN_FLIGHT, request_labels, set_request_label
+from observability.tracing import span, start_trace
+from graph.travel_graph import get_app as get_workflow_app
+from graph.batch_planner import shutdown_pool
+from graph.itinerary_input_graph import DEFAULT_SESSION, close_checkpointer, reset_session, run_turn
+from graph.plan_cache import plan_itinerary_cached
+from graph.prefetch import speculate, take_draft
+from services.cache_warmer import CACHE_WARM_ENABLED, run_warmer
 from plan_router import router as plan_router
+from fares_router import router as fares_router
+from status_router import router as status_router
 from nlp.itinerary_narrator import narrate_itinerary
+from nlp.gemini_client import LLMOverloaded
 from nlp.parser import parse_user_message_async
 from nlp.summarizer import (
-    summarize_flight_results_async,
-    summarize_hotel_results_async,
+    get_late_summary,
+    summarize_combined_results_budgeted,
+    summarize_hotel_results_budgeted,
+    template_package_summary,
 )
+from agents.flight_agent import format_flight
+from graph.package_optimizer import build_packages, stay_nights
+startup.mark("import.app_modules")
 
+configure_logging()
+logger = logging.getLogger(__name__)
 
 
+# Accept traffic as soon as the app is constructed; SDKs and graphs are
+# initialized in the background (or on first use) rather than at import
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.mark("lifespan.startup")
+    startup.set_accepting(True)
+    warm_task = asyncio.create_task(startup.warm_up()) if startup.warm_on_startup() else None
+    # Keeps popular flight and hotel searches fresh (see services.cache_warmer)
+    cache_warm_task = asyncio.create_task(run_warmer()) if CACHE_WARM_ENABLED else None
+    try:
+        yield
+    finally:
+        # Fail readiness first so load balancers drain this instance
+        startup.set_accepting(False)
+        if warm_task is not None and not warm_task.done():
+            warm_task.cancel()
+        if cache_warm_task is not None:
+            cache_warm_task.cancel()
+        shutdown_pool()
+        await close_checkpointer()
 
 
-
-
-
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 app.include_router(plan_router)
+app.include_router(fares_router)
+app.include_router(status_router)
 
 # Add CORS middleware to allow frontend connections
 app.add_middleware(
@@ -33,14 +79,61 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Wraps CORS and the routes, so responses from exception handlers (HTTPException,
+# LLMOverloaded) are compressed too. request_context below is added later and so
+# runs outside it, and unhandled 500s from ServerErrorMiddleware are not compressed.
+app.add_middleware(CompressionMiddleware)
+startup.mark("app")
 
-# Global variable to track the currently running LangGraph task
-current_task = None
-last_processed_message = None
-last_processed_time = 0
 
-# Session state for each user (in-memory, replace with persistent store for production)
-user_sessions = {}
+# Correlate every log line of a request (honours an incoming X-Request-ID),
+# record its latency and trace it
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    tokens = bind_context(request_id=request_id)
+    started = time.perf_counter()
+    status = 500
+    with request_labels() as labels, REQUESTS_IN_FLIGHT.track(), \
+            start_trace(f"{request.method} {request.url.path}", request_id=request_id) as root:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            reset_context(tokens)
+            # Route template keeps /plan_itinerary/{plan_id} a single series
+            endpoint = getattr(request.scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                endpoint=endpoint,
+                method=request.method,
+                status=status,
+                intent=labels.get("intent", ""),
+            )
+            if root is not None:
+                root.name = f"{request.method} {endpoint}"
+                root.attributes.update(labels)
+                root.set_attribute("http.status_code", status)
+                if status >= 500:
+                    root.error = f"HTTP {status}"
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# LLM admission control shed this request; requests that don't need Gemini
+# (regex-parsed searches, planning) keep being served
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, exc: LLMOverloaded):
+    return FastJSONResponse(
+        {"detail": "The assistant is busy right now, please retry shortly.", "retry_after": math.ceil(exc.retry_after)},
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+# Per session: the running LangGraph task and the last (message, time) processed,
+# so one user's new search only cancels or de-duplicates their own request
+current_tasks = {}
+last_processed = {}
 
 
 @app.get("/", response_model=HealthResponse)
@@ -51,8 +144,18 @@ async def root():
     )
 
 
-async def run_workflow(message: str, parsed_data: dict):
+# Readiness: 200 once the server accepts traffic; with ?warm=true only once
+# warm-up has finished. The body carries the startup profile.
+@app.get("/ready")
+async def ready(warm: bool = False):
+    report = startup.readiness()
+    ok = report["accepting"] and (report["warm"] or not warm)
+    return JSONResponse(report, status_code=200 if ok else 503)
+
+
+async def run_workflow(message: str, parsed_data: dict, deadline: Deadline = None):
     """Async wrapper for the LangGraph workflow invocation."""
+    workflow_app = await get_workflow_app.aget()
     result = await workflow_app.ainvoke({
         "user_message": message,
         "parsed_data": parsed_data,
@@ -64,25 +167,33 @@ async def run_workflow(message: str, parsed_data: dict):
         "duration": None,
         "additional_info": None,
         "flight_results": [],
-        "hotel_results": []
+        "flight_offers": [],
+        "hotel_results": [],
+        "deadline": deadline
     })
     return result
 
 
+# Poll for an LLM summary that missed the /chat latency budget
+@app.get("/chat/summary/{summary_id}")
+async def late_summary(summary_id: str):
+    status, summary = get_late_summary(summary_id)
+    return {"summary_id": summary_id, "status": status, "summary": summary}
+
+
 # Old flight/hotel endpoint removed - unified in itinerary_chat below
 
 # --- Unified /chat endpoint supporting itinerary, flights, and hotels ---
+# Responses are built as plain dicts (no re-validation of our own results);
+# ?fields=response,hotel_results.name,... trims them to what the client renders
 @app.post("/chat", response_model=ChatResponse)
-async def unified_chat(request: ChatRequest):
-    global current_task, last_processed_message, last_processed_time
+async def unified_chat(request: ChatRequest, fields: Optional[str] = None):
+    # One budget for the whole request; every stage below gets only what is left
+    deadline = Deadline(CHAT_DEADLINE_S)
     
-    # For demo: use a single session (replace with user/session id for multi-user)
-    session_id = "default"
-    session = user_sessions.get(session_id, {
-        "state": {},
-        "step": None,
-        "graph": "itinerary_input"
-    })
+    # Clients that don't send a session id share the demo session
+    session_id = request.session_id or DEFAULT_SESSION
+    session_id_var.set(session_id)
 
     user_input = request.message.strip()
     
@@ -93,26 +204,26 @@ async def unified_chat(request: ChatRequest):
     
     # FLIGHT/HOTEL FLOW - Process immediately
     if is_flight_query or is_hotel_query:
-        print(f"🔵 [MAIN] ========== FLIGHT/HOTEL REQUEST ==========")
-        print(f"📩 [MAIN] Message: '{request.message}'")
+        logger.info("Flight/hotel request: %r", request.message)
         
         # Prevent duplicate requests
-        import time
         current_time = time.time()
-        if (last_processed_message == request.message and 
-            current_time - last_processed_time < 2.0):
-            print(f"⚠️ [MAIN] DUPLICATE REQUEST DETECTED - Ignoring")
-            return ChatResponse(
+        last_message, last_time = last_processed.get(session_id, (None, 0))
+        if (last_message == request.message and 
+            current_time - last_time < 2.0):
+            logger.warning("Duplicate request detected - ignoring")
+            return chat_response(
+                fields=fields,
                 response="Processing your previous request...",
                 intent=None,
                 flight_results=[],
                 hotel_results=[],
             )
         
-        last_processed_message = request.message
-        last_processed_time = current_time
+        last_processed[session_id] = (request.message, current_time)
         
         # Cancel existing task if running
+        current_task = current_tasks.get(session_id)
         if current_task is not None and not current_task.done():
             current_task.cancel()
             try:
@@ -121,7 +232,8 @@ async def unified_chat(request: ChatRequest):
                 pass
         
         # Parse user message for context
-        parsed_data = await parse_user_message_async(request.message)
+        with span("parse"):
+            parsed_data = await parse_user_message_async(request.message, deadline=deadline)
         
         # Build query context for summarization
         query_context_parts = []
@@ -135,23 +247,36 @@ async def unified_chat(request: ChatRequest):
         query_context = " ".join(query_context_parts) if query_context_parts else request.message
         
         # Start workflow task
-        current_task = asyncio.create_task(run_workflow(request.message, parsed_data))
-        result = await current_task
+        with span("travel_graph"):
+            current_task = asyncio.create_task(run_workflow(request.message, parsed_data, deadline))
+            current_tasks[session_id] = current_task
+            try:
+                result = await current_task
+            finally:
+                if current_tasks.get(session_id) is current_task:
+                    del current_tasks[session_id]
         
         # Extract results
         flight_results = result.get("flight_results", [])
         hotel_results = result.get("hotel_results", [])
         intent = result.get("intent", "")
+        set_request_label("intent", intent or "none")
         
-        print(f"🎯 [MAIN] Intent: '{intent}', Flights: {len(flight_results)}, Hotels: {len(hotel_results)}")
+        logger.info(
+            "Workflow done",
+            extra={"intent": intent, "flights": len(flight_results), "hotels": len(hotel_results)},
+        )
         
+        # Set when the LLM summary missed its latency budget and is still being generated
+        summary_id = None
+        packages = []
+
         # For flights, skip LLM summarization - let frontend display real Amadeus data
         if intent == "flight":
             if flight_results:
-                print(f"✅ [MAIN] Returning {len(flight_results)} real Amadeus flights without LLM summarization")
                 reply = f"Found {len(flight_results)} available flights from {query_context or 'your search'}."
             else:
-                print(f"⚠️ [MAIN] No flights found for this route")
+                logger.info("No flights found for this route")
                 reply = (
                     f"No flights available for {query_context or 'this route'}. "
                     "This may be due to:\n"
@@ -161,46 +286,74 @@ async def unified_chat(request: ChatRequest):
                     "Try searching for a different date or popular routes like DEL→BOM, DEL→BLR, or BOM→GOI."
                 )
         elif intent == "hotel" and hotel_results:
-            reply = await summarize_hotel_results_async(hotel_results, query_context)
+            with span("summarize_hotels"):
+                reply, summary_id = await summarize_hotel_results_budgeted(hotel_results, query_context, deadline=deadline)
         elif intent == "both" and (flight_results or hotel_results):
             # For combined, only summarize hotels if present
             if hotel_results and not flight_results:
-                reply = await summarize_hotel_results_async(hotel_results, query_context)
+                with span("summarize_hotels"):
+                    reply, summary_id = await summarize_hotel_results_budgeted(hotel_results, query_context, deadline=deadline)
             elif flight_results and not hotel_results:
                 reply = f"Found {len(flight_results)} available flights from {query_context or 'your search'}."
             else:
-                reply = f"Found {len(flight_results)} flights and {len(hotel_results)} hotels from {query_context or 'your search'}."
+                # Price every flight x hotel x stay combination under the parsed constraints
+                with span("build_packages") as s:
+                    packages = build_packages(
+                        result.get("flight_offers") or [],
+                        hotel_results,
+                        stay_nights(result.get("start_date"), result.get("end_date"), result.get("duration")),
+                        max_budget=result.get("max_budget"),
+                        min_rating=result.get("min_rating"),
+                        max_stops=result.get("max_stops"),
+                    )
+                    if s is not None:
+                        s.set_attribute("packages", len(packages))
+                template = template_package_summary(packages, len(flight_results), len(hotel_results), query_context)
+                if packages:
+                    with span("summarize_packages"):
+                        reply, summary_id = await summarize_combined_results_budgeted(
+                            [format_flight(p["flight"]) for p in packages],
+                            [
+                                f"{p['hotel'].get('name')} | {p['currency']} {p['hotel']['price_per_night']:,.0f} per night | "
+                                f"Rating: {p['hotel'].get('rating')} | {p['nights']} night(s) | "
+                                f"Package total: {p['currency']} {p['total']:,.0f}"
+                                for p in packages
+                            ],
+                            template,
+                            query_context,
+                            deadline=deadline,
+                        )
+                else:
+                    reply = template
         else:
             reply = "I couldn't find any results. Please try rephrasing with more details."
 
-        return ChatResponse(
+        return chat_response(
+            fields=fields,
             response=reply,
             intent=intent or None,
             flight_results=flight_results,
             hotel_results=hotel_results,
+            packages=packages,
+            summary_id=summary_id,
         )
     
-    # ITINERARY FLOW - Collect sequential inputs
-    state = session["state"]
-    
-    if not state:
-        state = {"collected": []}
-        
-    collected = state.get("collected", [])
-    collected.append(user_input)
-    
-    # Collect 5 inputs: days, destination, style, budget, confirmation
-    if len(collected) < 5:
-        state["collected"] = collected
-        user_sessions[session_id] = {"state": state, "step": None, "graph": "itinerary_input"}
-        return ChatResponse(response="Processing...")
+    # ITINERARY FLOW - One turn of the checkpointed input conversation; invalid
+    # answers are re-asked. Answers known so far are planned and narrated in the
+    # background, so the confirming turn usually just picks up the draft.
+    set_request_label("intent", "itinerary")
+    with span("itinerary_input"):
+        state = await run_turn(session_id, user_input)
+    if not state.get("confirmed"):
+        speculate(session_id, state)
+        return chat_response(fields=fields, response=state.get("response"))
     
-    # All inputs collected - plan itinerary
+    # Inputs confirmed - plan itinerary
     try:
-        number_of_days = int(collected[0])
-        destination = collected[1]
-        travel_style = collected[2]
-        budget_level = collected[3]
+        number_of_days = state["number_of_days"]
+        destination = state["destination"]
+        travel_style = state["travel_style"]
+        budget_level = state["budget_level"]
         
         planning_state = {
             "number_of_days": number_of_days,
@@ -208,19 +361,32 @@ async def unified_chat(request: ChatRequest):
             "travel_style": travel_style,
             "budget_level": budget_level
         }
-        plan_result = await itinerary_planning_app.ainvoke(planning_state)
-        final_itin = plan_result.get("final_itinerary")
-        
-        # Generate narrative
-        narration = await narrate_itinerary(
-            final_itin,
-            travel_style,
-            budget_level,
-            destination
-        )
-        user_sessions[session_id] = {"state": {}, "step": None, "graph": "itinerary_input"}
-        return ChatResponse(response=narration, itinerary=final_itin)
+        with span("itinerary_draft") as s:
+            draft = await take_draft(session_id, planning_state, deadline)
+            if s is not None:
+                s.set_attribute("hit", draft is not None)
+        if draft is not None:
+            plan_entry, narration = draft
+            final_itin = plan_entry["final_itinerary"]
+        else:
+            with span("plan_itinerary") as s:
+                plan_entry, cache_result = await plan_itinerary_cached(planning_state)
+                if s is not None:
+                    s.set_attribute("cache", cache_result)
+            final_itin = plan_entry["final_itinerary"]
+
+            # Generate narrative
+            with span("narrate", days=len(final_itin or [])):
+                narration = await narrate_itinerary(
+                    final_itin,
+                    travel_style,
+                    budget_level,
+                    destination,
+                    deadline=deadline
+                )
+        await reset_session(session_id)
+        return chat_response(fields=fields, response=narration, itinerary=final_itin, plan_id=plan_entry["plan_id"])
     except Exception as e:
-        print(f"Error planning itinerary: {e}")
-        user_sessions[session_id] = {"state": {}, "step": None, "graph": "itinerary_input"}
-        return ChatResponse(response=f"Error planning itinerary: {str(e)}")
+        logger.exception("Error planning itinerary: %s", e)
+        await reset_session(session_id)
+        return chat_response(fields=fields, response=f"Error planning itinerary: {str(e)}")
@@ -3,33 +3,102 @@ Gemini API client with robust rate limiting and error handling.
 """
 
 import asyncio
+import logging
 import os
 import time
-from pathlib import Path
 from typing import Any, Optional
-import google.generativeai as genai
-from dotenv import load_dotenv
+from deadline import Deadline, DeadlineExceeded
+from observability.metrics import LLM_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_SHED
+from observability.tracing import span
+from services.circuit_breaker import CircuitOpenError, get_breaker
+from nlp.gemini_scheduler import SPECULATIVE, Priority, PriorityGate, priority_name
+from services.provider_replay import gemini_generate, skips_pacing
+from services.rate_limits import make_bucket, make_semaphore
+from services.retry_policy import TIMEOUT, get_retry_policy, status_of
+from startup import lazy
 
-_ENV_PATH = Path(__file__).resolve().parents[1] / ".env"
-load_dotenv(dotenv_path=_ENV_PATH)
+logger = logging.getLogger(__name__)
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+def _configure_sdk():
+    # The SDK takes most of a second to import; keep it off the import path
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai
+
+
+# Imported and configured on first call (or by startup warm-up)
+_genai = lazy("gemini_sdk", _configure_sdk)
 
 DEFAULT_MODEL_NAME = os.getenv("GEMINI_MODEL", "models/gemini-flash-latest")
 
-_GEMINI_CALL_SEMAPHORE = asyncio.Semaphore(1)
-_LAST_REQUEST_TIME = 0
-_MIN_REQUEST_INTERVAL = 2.0  # Increased to 2 seconds between calls
+# Calls may overlap (chunked narration), but call starts stay spaced by the interval.
+# Both limits are per host with RATE_LIMIT_BACKEND=shared (see services.rate_limits).
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "3"))
+# Slots go to the highest-priority waiter (see nlp.gemini_scheduler), not FIFO
+_GEMINI_CALL_SEMAPHORE = PriorityGate(make_semaphore("gemini", GEMINI_MAX_CONCURRENCY))
+_MIN_REQUEST_INTERVAL = float(os.getenv("GEMINI_MIN_REQUEST_INTERVAL", "2.0"))  # Seconds between call starts
+# One token per interval and no burst: call starts are spaced by the interval (0 disables)
+_GEMINI_PACING = make_bucket("gemini", 1.0 / _MIN_REQUEST_INTERVAL, capacity=1.0) if _MIN_REQUEST_INTERVAL > 0 else None
 _API_CALL_COUNTER = 0  # Track total API calls
 
+# Admission control: a bounded wait queue in front of the semaphore. Calls are
+# shed (LLMOverloaded) when the queue is full, when the estimated wait exceeds
+# what the caller can afford, or when they wait longer than GEMINI_MAX_QUEUE_S.
+# Speculative (prefetch) waiters don't count toward a user call's queue limit;
+# a speculative call is shed once the whole queue, theirs included, is full.
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "24"))
+GEMINI_MAX_QUEUE_S = float(os.getenv("GEMINI_MAX_QUEUE_S", "10"))
+_in_flight = 0  # Calls holding a slot in this process
+_service_time_s = float(os.getenv("GEMINI_EXPECTED_CALL_S", "3.0"))  # EWMA of slot hold time
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class LLMOverloaded(RuntimeError):
+    """Raised instead of queueing a Gemini call that would wait too long."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimated_wait(priority: str = "standard") -> float:
+    """Seconds a call of `priority` arriving now would wait for a slot and its pacing turn."""
+    # Only waiters at the same or better (aged) priority are served before it
+    ahead = _GEMINI_CALL_SEMAPHORE.queued(priority)
+    busy = ahead + _in_flight
+    if busy < GEMINI_MAX_CONCURRENCY:
+        slot_wait = 0.0
+    else:
+        slot_wait = (busy - GEMINI_MAX_CONCURRENCY + 1) / GEMINI_MAX_CONCURRENCY * _service_time_s
+    pacing_wait = ahead * _MIN_REQUEST_INTERVAL if _GEMINI_PACING is not None else 0.0
+    return max(slot_wait, pacing_wait)
+
 
-async def _wait_for_rate_limit():
-    global _LAST_REQUEST_TIME
-    current_time = time.time()
-    time_since_last = current_time - _LAST_REQUEST_TIME
-    if time_since_last < _MIN_REQUEST_INTERVAL:
-        await asyncio.sleep(_MIN_REQUEST_INTERVAL - time_since_last)
-    _LAST_REQUEST_TIME = time.time()
+def _shed(reason: str, estimate: float) -> LLMOverloaded:
+    LLM_SHED.inc(reason=reason)
+    logger.warning(
+        "Shedding Gemini call (%s): queued=%d, estimated wait %.1fs",
+        reason, _GEMINI_CALL_SEMAPHORE.queued(), estimate,
+    )
+    return LLMOverloaded(f"Gemini is overloaded ({reason})", retry_after=max(1.0, estimate))
+
+
+def _record_service_time(seconds: float) -> None:
+    global _service_time_s
+    _service_time_s += _SERVICE_TIME_ALPHA * (seconds - _service_time_s)
+
+
+async def _wait_for_rate_limit(deadline: Optional[Deadline] = None):
+    if skips_pacing() or _GEMINI_PACING is None:
+        return
+    while True:
+        wait = await _GEMINI_PACING.try_acquire_async()
+        if wait == 0.0:
+            return
+        if deadline is not None and not deadline.allows(wait):
+            raise DeadlineExceeded("Deadline exceeded waiting for the Gemini pacing interval")
+        await asyncio.sleep(wait)
 
 
 async def generate_text(
@@ -38,78 +107,139 @@ async def generate_text(
     model_name: str = DEFAULT_MODEL_NAME,
     generation_config: Optional[dict[str, Any]] = None,
     retry_on_429_once: bool = True,
-    max_retries: int = 1,
+    max_retries: Optional[int] = None,
     timeout: float = 15.0,
-    use_google_search: bool = False
+    use_google_search: bool = False,
+    deadline: Optional[Deadline] = None,
+    priority: Priority = "standard",
 ) -> str:
-    global _API_CALL_COUNTER
+    """
+    One Gemini call. `priority` ("interactive", "standard", "bulk" or "prefetch", or a
+    PriorityTicket) decides who gets the next free slot; see nlp.gemini_scheduler.
+    """
+    global _API_CALL_COUNTER, _in_flight
     _API_CALL_COUNTER += 1
     search_mode = "with Google Search" if use_google_search else "standard"
-    print(f"🤖 [GEMINI] generate_text called (Call #{_API_CALL_COUNTER}, {search_mode}), model={model_name}, timeout={timeout}s")
+    logger.debug("generate_text call #%d (%s), model=%s, timeout=%ss", _API_CALL_COUNTER, search_mode, model_name, timeout)
     if generation_config is None:
         generation_config = {"temperature": 0.1, "max_output_tokens": 4096}
     
     # Enable Google Search grounding if requested
     # Note: Google Search grounding uses a different API - Tool object from google.generativeai.types
     
-    async with _GEMINI_CALL_SEMAPHORE:
-        print(f"🔒 [GEMINI] Acquired semaphore, waiting for rate limit...")
-        await _wait_for_rate_limit()
-        print(f"✅ [GEMINI] Rate limit check passed, making API call...")
+    breaker = get_breaker("gemini")
+    retry_policy = get_retry_policy("gemini")
+    if breaker.rejecting():
+        # Don't even queue for a slot while Gemini is known to be failing
+        raise CircuitOpenError("gemini circuit is open; failing fast")
+
+    # A cold SDK import must not happen while holding a slot
+    genai = await _genai.aget()
+
+    # Queueing for a slot counts against the request deadline and is capped by
+    # GEMINI_MAX_QUEUE_S; don't queue at all if the wait would not fit
+    if deadline is not None:
+        deadline.check("Gemini call")
+    wait_budget = GEMINI_MAX_QUEUE_S if deadline is None else min(GEMINI_MAX_QUEUE_S, deadline.remaining())
+    ticket, priority = priority, priority_name(priority)
+    estimate = estimated_wait(priority)
+    if priority == SPECULATIVE:
+        queued = _GEMINI_CALL_SEMAPHORE.queued()
+    else:
+        queued = _GEMINI_CALL_SEMAPHORE.queued_for_users()
+    if queued >= GEMINI_MAX_QUEUE:
+        raise _shed("queue_full", estimate)
+    if estimate > wait_budget:
+        raise _shed("wait_budget", estimate)
+    queued_at = time.monotonic()
+    with LLM_QUEUE_DEPTH.track(priority=priority), span("gemini.queue_wait", priority=priority):
+        try:
+            await asyncio.wait_for(_GEMINI_CALL_SEMAPHORE.acquire(ticket), timeout=wait_budget)
+        except asyncio.TimeoutError:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded("Deadline exceeded waiting for a Gemini slot")
+            raise _shed("queue_timeout", estimated_wait(priority))
+    _in_flight += 1
+    slot_started = time.monotonic()
+    LLM_IN_FLIGHT.inc()
+    try:
+        with LLM_QUEUE_DEPTH.track(priority=priority), span("gemini.rate_limit_wait"):
+            await _wait_for_rate_limit(deadline)
+        LLM_QUEUE_WAIT.observe(time.monotonic() - queued_at, priority=priority)
         
-        for attempt in range(max_retries):
+        attempts = max_retries if max_retries is not None else retry_policy.max_attempts
+        retry_policy.budget.deposit()
+        backoff = retry_policy.base_s
+        for attempt in range(1, attempts + 1):
+            if deadline is not None:
+                deadline.check("Gemini call")
+                call_timeout = deadline.timeout(timeout)
+            else:
+                call_timeout = timeout
             try:
                 # Initialize model with or without Google Search tool
                 if use_google_search:
-                    print(f"🔍 [GEMINI] Initializing model with Google Search grounding...")
                     try:
                         # Use the correct Tool import for Google Search
                         from google.generativeai.types import Tool
                         # Correct tool name: google_search (not google_search_retrieval)
                         google_search_tool = Tool(google_search={})
                         model = genai.GenerativeModel(model_name, tools=[google_search_tool])
-                        print(f"✅ [GEMINI] Model initialized with Google Search tool")
                     except Exception as tool_error:
-                        print(f"⚠️ [GEMINI] Failed to initialize Google Search tool: {tool_error}")
-                        print(f"🔄 [GEMINI] Falling back to standard model without search...")
+                        logger.warning("Google Search tool unavailable (%s), using the standard model", tool_error)
                         model = genai.GenerativeModel(model_name)
                 else:
                     model = genai.GenerativeModel(model_name)
                 
-                print(f"🚀 [GEMINI] API call attempt {attempt + 1}/{max_retries}")
+                logger.debug("API call attempt %d/%d", attempt, attempts)
                 
                 # Make the API call
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(model.generate_content, prompt, generation_config=generation_config),
-                    timeout=timeout
-                )
+                breaker.allow()
+                call_started = time.monotonic()
+                try:
+                    with span("gemini.generate_content", model=model_name, attempt=attempt, grounded=use_google_search):
+                        response = await asyncio.wait_for(
+                            asyncio.to_thread(gemini_generate, model, model_name, prompt, generation_config, use_google_search),
+                            timeout=call_timeout
+                        )
+                except asyncio.CancelledError:
+                    breaker.abandon()
+                    raise
+                except Exception as call_error:
+                    breaker.record_failure(time.monotonic() - call_started, call_error)
+                    raise
+                breaker.record_success(time.monotonic() - call_started)
                 
                 if response and response.text:
-                    print(f"✅ [GEMINI] Success! Got response: {len(response.text)} chars")
+                    logger.debug("Got response: %d chars", len(response.text))
                     return response.text.strip()
                 else:
-                    print(f"⚠️ [GEMINI] Empty response from API")
                     raise Exception("Empty response")
-            except asyncio.TimeoutError:
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 2
-                    print(f"⏳ [GEMINI] Waiting {wait_time}s before retry...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(f"❌ [GEMINI] Max retries on timeout")
-                    raise Exception("Timeout")
+            except CircuitOpenError:
+                raise
             except Exception as e:
-                error_msg = str(e).lower()
-                print(f"⚠️ [GEMINI] Error on attempt {attempt + 1}: {type(e).__name__}: {e}")
-                if "429" in error_msg or "quota" in error_msg or "rate limit" in error_msg:
-                    # Don't retry on rate limit - fail immediately to prevent quota exhaustion
-                    print(f"❌ [GEMINI] RATE LIMIT HIT - Failing immediately to preserve quota")
+                logger.warning("Error on attempt %d: %s: %s", attempt, type(e).__name__, e)
+                status = status_of(e)
+                if status == 429 and not retry_on_429_once:
+                    logger.error("Rate limit hit, failing immediately to preserve quota")
                     raise Exception("Rate limit exceeded - not retrying")
-                elif attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 0.5
-                    print(f"🔄 [GEMINI] Retrying after {wait_time}s...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(f"❌ [GEMINI] Final failure: {e}")
+                # 429s are retried only when Gemini's retry hint fits the policy cap,
+                # and only while the shared retry budget allows it
+                delay = None
+                if attempt < attempts:
+                    delay = retry_policy.next_delay(e, attempt, backoff, idempotent=True, deadline=deadline)
+                if delay is None:
+                    logger.error("Final failure: %s", e)
+                    if status == 429:
+                        raise Exception("Rate limit exceeded - not retrying")
+                    if status == TIMEOUT:
+                        raise Exception("Timeout")
                     raise Exception(f"Failed: {e}")
+                backoff = delay
+                await asyncio.sleep(delay)
         raise Exception("Max retries exceeded")
+    finally:
+        LLM_IN_FLIGHT.dec()
+        _in_flight -= 1
+        _record_service_time(time.monotonic() - slot_started)
+        _GEMINI_CALL_SEMAPHORE.release()
@@ -0,0 +1,130 @@
+"""
+Priority dispatch for Gemini call slots.
+
+Calls wait in one queue, but each slot that frees up goes to the waiter with
+the best effective priority rather than the oldest one:
+
+    interactive  query parsing; a user is waiting on the answer to route
+    standard     result summaries
+    bulk         itinerary narration and other long generations
+    prefetch     speculative drafts nobody is waiting on yet (graph.prefetch)
+
+Strict priority alone would let a steady stream of interactive calls starve
+bulk work, so waiting improves a call's priority by one class every
+GEMINI_PRIORITY_AGING_S seconds. Ties go to the earlier arrival.
+
+A PriorityTicket in place of a class name lets the caller raise the class of
+calls it already queued, e.g. when a user confirms the inputs a speculative
+draft was made for.
+
+The gate sits in front of the slot semaphore (local or shared, see
+services.rate_limits): a dispatcher task acquires a slot first and only then
+picks the waiter, so late-arriving interactive calls still jump the queue.
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from typing import Any, List, Optional, Union
+
+PRIORITIES = {"interactive": 0, "standard": 1, "bulk": 2, "prefetch": 3}
+# Work nobody waits on yet: not counted toward the queue limit, shed first
+SPECULATIVE = "prefetch"
+GEMINI_PRIORITY_AGING_S = float(os.getenv("GEMINI_PRIORITY_AGING_S", "5"))
+
+
+class PriorityTicket:
+    """A priority class that can be raised while calls made with it are queued."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        if name not in PRIORITIES:
+            raise ValueError(f"Unknown Gemini priority class: {name}")
+        self.name = name
+
+    def promote(self, name: str) -> None:
+        """Raise the class to `name` (never lowers it)."""
+        if PRIORITIES[name] < PRIORITIES[self.name]:
+            self.name = name
+
+
+Priority = Union[str, PriorityTicket]
+
+
+def priority_name(priority: Priority) -> str:
+    return priority.name if isinstance(priority, PriorityTicket) else priority
+
+
+class _Waiter:
+    __slots__ = ("priority", "enqueued", "seq", "future")
+
+    def __init__(self, priority: Priority, seq: int, future: asyncio.Future):
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.seq = seq
+        self.future = future
+
+    def rank(self, now: float) -> tuple:
+        aged = PRIORITIES[priority_name(self.priority)] - (now - self.enqueued) / GEMINI_PRIORITY_AGING_S
+        return (aged, self.seq)
+
+
+class PriorityGate:
+    """acquire(priority) / release() over a semaphore with asyncio.Semaphore's API."""
+
+    def __init__(self, semaphore: Any):
+        self._semaphore = semaphore
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        """Waiters a new call of `priority` would queue behind (all waiters if None)."""
+        if priority is None:
+            return len(self._waiters)
+        now = time.monotonic()
+        level = PRIORITIES[priority]
+        return sum(1 for w in self._waiters if w.rank(now)[0] <= level)
+
+    def queued_for_users(self) -> int:
+        """Waiters other than speculative ones (the queue limit counts only these)."""
+        return sum(1 for w in self._waiters if priority_name(w.priority) != SPECULATIVE)
+
+    async def acquire(self, priority: Priority = "standard") -> None:
+        if priority_name(priority) not in PRIORITIES:
+            raise ValueError(f"Unknown Gemini priority class: {priority_name(priority)}")
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._ensure_dispatcher()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot just as the caller gave up: hand it back
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            await self._semaphore.acquire()
+            # Pick only once a slot is free, so the choice sees every current waiter
+            now = time.monotonic()
+            live = [w for w in self._waiters if not w.future.done()]
+            self._waiters = live
+            if not live:
+                self._semaphore.release()
+                return
+            best = min(live, key=lambda w: w.rank(now))
+            live.remove(best)
+            best.future.set_result(None)
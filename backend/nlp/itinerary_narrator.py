@@ -1,41 +1,80 @@
+import asyncio
+import logging
 import os
+import re
 from nlp.gemini_client import generate_text
-from typing import List, Dict
+from nlp.gemini_scheduler import Priority
+from deadline import Deadline, timeout_for
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
 
 LLM_NARRATION_ENABLED = os.environ.get("LLM_NARRATION_ENABLED", "1") == "1"
+# Trips longer than this are narrated in day-range chunks generated concurrently
+NARRATION_CHUNK_DAYS = int(os.environ.get("NARRATION_CHUNK_DAYS", "4"))
+# Below this much remaining request budget, go straight to the readable template
+NARRATION_LLM_MIN_S = 5.0
+
+_FORMATTING_RULES = (
+    f"- FORMATTING RULES:\n"
+    f"  * Use PLAIN TEXT ONLY - NO markdown symbols (no #, ##, ###, *, **, _, etc.)\n"
+    f"  * Use simple paragraph breaks between sections\n"
+    f"  * Write in flowing, coherent prose (NOT bullet points)\n"
+)
+
+
+def _day_summary(day: Dict) -> str:
+    """One-line structured summary of a day for prompts."""
+    day_num = day.get("day", "?")
+    slots = day.get("slots", {})
+    morning = slots.get("morning", [])
+    afternoon = slots.get("afternoon", [])
+    evening = slots.get("evening", [])
+    day_text = f"Day {day_num}: "
+    parts = []
+    if morning:
+        parts.append(f"Morning - {', '.join(a['name'] for a in morning)}")
+    if afternoon:
+        parts.append(f"Afternoon - {', '.join(a['name'] for a in afternoon)}")
+    if evening:
+        parts.append(f"Evening - {', '.join(a['name'] for a in evening)}")
+    day_text += "; ".join(parts) if parts else "Free day"
+    if day.get("travel_time_minutes") is not None:
+        day_text += f" (about {day['travel_time_minutes']} min of travel between stops)"
+    return day_text
 
-async def narrate_itinerary(itinerary: List[Dict], travel_style: str, budget_level: str, destination: str) -> str:
+
+async def narrate_itinerary(
+    itinerary: List[Dict],
+    travel_style: str,
+    budget_level: str,
+    destination: str,
+    deadline: Optional[Deadline] = None,
+    priority: Priority = "bulk",
+    strict: bool = False,
+) -> str:
     """
-    Use LLM ONCE at the final stage to generate a polished, natural-language narrative.
+    Use LLM at the final stage to generate a polished, natural-language narrative.
     Input: Structured itinerary + user preferences.
     Output: Professional, flowing prose like a travel advisor would write.
-    Fallback to readable text if LLM fails or is disabled.
+    Long trips are split into day-range chunks (see narrate_itinerary_chunked).
+    Fallback to readable text if LLM fails or is disabled; with strict=True a
+    failed LLM call raises instead (prefetch drafts, which are re-done on failure).
     """
     if not itinerary:
         return "No itinerary available."
     if not LLM_NARRATION_ENABLED:
         return readable_itinerary(itinerary, travel_style, budget_level, destination)
+    if deadline is not None and not deadline.allows(NARRATION_LLM_MIN_S):
+        logger.info("Only %.1fs left, using readable itinerary", deadline.remaining())
+        return readable_itinerary(itinerary, travel_style, budget_level, destination)
+    if len(itinerary) > NARRATION_CHUNK_DAYS:
+        return await narrate_itinerary_chunked(
+            itinerary, travel_style, budget_level, destination, deadline=deadline, priority=priority, strict=strict
+        )
     try:
         # Build a structured summary for the LLM
-        days_summary = []
-        for day in itinerary:
-            day_num = day.get("day", "?")
-            slots = day.get("slots", {})
-            morning = slots.get("morning", [])
-            afternoon = slots.get("afternoon", [])
-            evening = slots.get("evening", [])
-            day_text = f"Day {day_num}: "
-            parts = []
-            if morning:
-                parts.append(f"Morning - {', '.join(a['name'] for a in morning)}")
-            if afternoon:
-                parts.append(f"Afternoon - {', '.join(a['name'] for a in afternoon)}")
-            if evening:
-                parts.append(f"Evening - {', '.join(a['name'] for a in evening)}")
-            day_text += "; ".join(parts) if parts else "Free day"
-            days_summary.append(day_text)
-        
-        itinerary_text = "\n".join(days_summary)
+        itinerary_text = "\n".join(_day_summary(day) for day in itinerary)
         
         prompt = (
             f"You are a professional travel advisor. Write a comprehensive, detailed narrative guide "
@@ -70,12 +109,151 @@ async def narrate_itinerary(itinerary: List[Dict], travel_style: str, budget_lev
             f"- IMPORTANT: Complete the ENTIRE narrative without cutting off mid-sentence\n\n"
             f"Write the complete travel guide narrative:"
         )
-        response = await generate_text(prompt, generation_config={"temperature": 0.6, "max_output_tokens": 4096})
+        response = await generate_text(
+            prompt,
+            generation_config={"temperature": 0.6, "max_output_tokens": 4096},
+            timeout=timeout_for(deadline, 15.0),
+            deadline=deadline,
+            priority=priority,
+        )
         return response.strip()
     except Exception as e:
-        print(f"[NARRATOR] LLM failed: {e}")
+        if strict:
+            raise
+        logger.warning("LLM failed: %s", e)
         return readable_itinerary(itinerary, travel_style, budget_level, destination)
 
+async def narrate_itinerary_chunked(
+    itinerary: List[Dict],
+    travel_style: str,
+    budget_level: str,
+    destination: str,
+    chunk_days: Optional[int] = None,
+    deadline: Optional[Deadline] = None,
+    priority: Priority = "bulk",
+    strict: bool = False,
+) -> str:
+    """
+    Narrate a long trip as intro + day-range chunks + conclusion.
+
+    All parts are requested concurrently (generate_text enforces the Gemini
+    rate limit) and stitched back in order. Any part that fails, and any day
+    the model skipped, falls back to the readable template, so every day
+    always gets its paragraph; with strict=True a failed part raises instead.
+    """
+    chunk_days = chunk_days or NARRATION_CHUNK_DAYS
+    chunks = [itinerary[i:i + chunk_days] for i in range(0, len(itinerary), chunk_days)]
+    num_days = len(itinerary)
+    overview = "\n".join(_day_summary(day) for day in itinerary)
+    preferences = (
+        f"- Travel Style: {travel_style} (relaxed = fewer activities, balanced = moderate, packed = many activities)\n"
+        f"- Budget Level: {budget_level}\n"
+    )
+
+    intro_prompt = (
+        f"You are a professional travel advisor writing the opening of a narrative guide "
+        f"for a {num_days}-day trip to {destination}.\n\n"
+        f"User Preferences:\n{preferences}\n"
+        f"Full Itinerary (for context only):\n{overview}\n\n"
+        f"Instructions:\n"
+        f"- Write ONLY the introduction: 2-3 paragraphs\n"
+        f"- Explain the overall vision of the trip, how the {travel_style} pace and {budget_level} budget shape it, "
+        f"and the key highlights\n"
+        f"- Do NOT describe individual days\n"
+        + _FORMATTING_RULES
+        + "\nWrite the introduction:"
+    )
+    conclusion_prompt = (
+        f"You are a professional travel advisor writing the closing of a narrative guide "
+        f"for a {num_days}-day trip to {destination}.\n\n"
+        f"User Preferences:\n{preferences}\n"
+        f"Instructions:\n"
+        f"- Write ONLY a warm conclusion: 1-2 paragraphs\n"
+        f"- Do NOT describe individual days\n"
+        + _FORMATTING_RULES
+        + "\nWrite the conclusion:"
+    )
+
+    def chunk_prompt(chunk: List[Dict]) -> str:
+        first, last = chunk[0].get("day"), chunk[-1].get("day")
+        chunk_text = "\n".join(_day_summary(day) for day in chunk)
+        return (
+            f"You are a professional travel advisor writing part of a narrative guide "
+            f"for a {num_days}-day trip to {destination}. Write days {first} to {last} only.\n\n"
+            f"User Preferences:\n{preferences}\n"
+            f"Days to write:\n{chunk_text}\n\n"
+            f"Instructions:\n"
+            f"- Write ONE paragraph per day listed above, 3-5 sentences each\n"
+            f"- Start each paragraph with 'Day N:' (e.g. 'Day {first}:') on a new line\n"
+            f"- Describe the flow of the day, transitions between activities and the reasoning behind the pacing\n"
+            f"- If a slot is empty/free, describe it as intentional rest or flexible time\n"
+            f"- No introduction or conclusion\n"
+            + _FORMATTING_RULES
+            + "\nWrite the day paragraphs:"
+        )
+
+    async def generate(prompt: str, max_tokens: int) -> str:
+        response = await generate_text(
+            prompt,
+            generation_config={"temperature": 0.6, "max_output_tokens": max_tokens},
+            timeout=timeout_for(deadline, 15.0),
+            deadline=deadline,
+            priority=priority,
+        )
+        return response.strip()
+
+    results = await asyncio.gather(
+        generate(intro_prompt, 800),
+        *(generate(chunk_prompt(chunk), min(4096, 400 * len(chunk) + 200)) for chunk in chunks),
+        generate(conclusion_prompt, 500),
+        return_exceptions=True,
+    )
+    if strict:
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+    intro_result, chunk_results, conclusion_result = results[0], results[1:-1], results[-1]
+
+    if isinstance(intro_result, BaseException) or not intro_result:
+        logger.warning("Intro failed, using template: %s", intro_result)
+        intro_text = _readable_intro(num_days, travel_style, budget_level, destination)
+    else:
+        intro_text = intro_result
+
+    day_paragraphs = []
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        if isinstance(chunk_result, BaseException):
+            logger.warning("Chunk for days %s-%s failed: %s", chunk[0].get("day"), chunk[-1].get("day"), chunk_result)
+            chunk_result = ""
+        by_day = _split_day_paragraphs(chunk_result)
+        for day in chunk:
+            paragraph = by_day.get(day.get("day"))
+            day_paragraphs.append(paragraph if paragraph else _readable_day(day))
+
+    if isinstance(conclusion_result, BaseException) or not conclusion_result:
+        logger.warning("Conclusion failed, using template: %s", conclusion_result)
+        conclusion_text = _readable_closing(num_days, destination)
+    else:
+        conclusion_text = conclusion_result
+
+    return "\n\n".join([intro_text] + day_paragraphs + [conclusion_text])
+
+
+_DAY_MARKER = re.compile(r"^\s*Day\s+(\d+)\s*:", re.MULTILINE)
+
+
+def _split_day_paragraphs(text: str) -> Dict[int, str]:
+    """Split chunk output on 'Day N:' markers into {day_number: paragraph}."""
+    markers = list(_DAY_MARKER.finditer(text or ""))
+    paragraphs = {}
+    for i, m in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        paragraph = text[m.start():end].strip()
+        # Ignore bare markers with no prose after them
+        if len(paragraph) > len(m.group(0).strip()) + 1:
+            paragraphs.setdefault(int(m.group(1)), paragraph)
+    return paragraphs
+
 def readable_itinerary(itinerary: List[Dict], travel_style: str, budget_level: str, destination: str) -> str:
     """
     Fallback: Generate a detailed, narrative-style guide when LLM is disabled or fails.
@@ -85,7 +263,13 @@ def readable_itinerary(itinerary: List[Dict], travel_style: str, budget_level: s
         return "Your itinerary could not be generated at this time."
     
     num_days = len(itinerary)
-    
+    intro = _readable_intro(num_days, travel_style, budget_level, destination) + "\n\n"
+    days_narrative = "\n\n".join(_readable_day(day) for day in itinerary)
+    closing = "\n\n" + _readable_closing(num_days, destination)
+    return intro + days_narrative + closing
+
+
+def _readable_intro(num_days: int, travel_style: str, budget_level: str, destination: str) -> str:
     # Opening introduction
     intro = (
         f"Welcome to your {num_days}-day journey to {destination}! "
@@ -113,54 +297,49 @@ def readable_itinerary(itinerary: List[Dict], travel_style: str, budget_level: s
             "spontaneous discoveries, and personal reflection."
         )
     
-    intro += pace_desc + "\n\n"
+    return intro + pace_desc
+
+
+def _readable_day(day: Dict) -> str:
+    day_num = day.get("day", "?")
+    slots = day.get("slots", {})
+    morning = slots.get("morning", [])
+    afternoon = slots.get("afternoon", [])
+    evening = slots.get("evening", [])
     
-    # Day-by-day detailed descriptions
-    day_descriptions = []
-    for day in itinerary:
-        day_num = day.get("day", "?")
-        slots = day.get("slots", {})
-        morning = slots.get("morning", [])
-        afternoon = slots.get("afternoon", [])
-        evening = slots.get("evening", [])
-        
-        day_text = f"Day {day_num}: "
-        
-        # Build descriptive narrative for the day
-        day_parts = []
-        if morning:
-            morning_names = ", ".join(a["name"] for a in morning)
-            day_parts.append(f"Your morning begins with {morning_names}")
-        else:
-            day_parts.append("Your morning is kept free for a leisurely start")
-        
-        if afternoon:
-            afternoon_names = ", ".join(a["name"] for a in afternoon)
-            day_parts.append(f"followed by {afternoon_names} in the afternoon")
-        else:
-            day_parts.append("with the afternoon left open for exploration at your own pace")
-        
-        if evening:
-            evening_names = ", ".join(a["name"] for a in evening)
-            day_parts.append(f"The day concludes with {evening_names}")
-        else:
-            day_parts.append("The evening is yours to enjoy as you wish")
-        
-        day_text += ", ".join(day_parts[:2])
-        if len(day_parts) > 2:
-            day_text += ". " + day_parts[2]
-        day_text += "."
-        
-        day_descriptions.append(day_text)
+    day_text = f"Day {day_num}: "
+    
+    # Build descriptive narrative for the day
+    day_parts = []
+    if morning:
+        morning_names = ", ".join(a["name"] for a in morning)
+        day_parts.append(f"Your morning begins with {morning_names}")
+    else:
+        day_parts.append("Your morning is kept free for a leisurely start")
     
-    days_narrative = "\n\n".join(day_descriptions)
+    if afternoon:
+        afternoon_names = ", ".join(a["name"] for a in afternoon)
+        day_parts.append(f"followed by {afternoon_names} in the afternoon")
+    else:
+        day_parts.append("with the afternoon left open for exploration at your own pace")
+    
+    if evening:
+        evening_names = ", ".join(a["name"] for a in evening)
+        day_parts.append(f"The day concludes with {evening_names}")
+    else:
+        day_parts.append("The evening is yours to enjoy as you wish")
     
-    # Closing
-    closing = (
-        f"\n\nThis {num_days}-day itinerary provides a complete framework for your {destination} adventure. "
+    day_text += ", ".join(day_parts[:2])
+    if len(day_parts) > 2:
+        day_text += ". " + day_parts[2]
+    day_text += "."
+    return day_text
+
+
+def _readable_closing(num_days: int, destination: str) -> str:
+    return (
+        f"This {num_days}-day itinerary provides a complete framework for your {destination} adventure. "
         "Each activity has been selected to showcase the destination's character while respecting your "
         "preferences and budget. The detailed breakdown below allows you to see the full structure and "
         "make any adjustments that suit your interests. Enjoy your journey!"
     )
-    
-    return intro + days_narrative + closing
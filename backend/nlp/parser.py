@@ -2,8 +2,32 @@
 import re
 import asyncio
 import json
+import logging
 from typing import Dict, Any, Optional
-from nlp.gemini_client import generate_text
+from nlp.gemini_client import LLMOverloaded, generate_text
+from deadline import Deadline, timeout_for
+from observability.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Skip the LLM fallback when less than this much of the request budget is left
+PARSER_LLM_MIN_S = 2.0
+
+# Package constraints; each is only searched for when its keywords appear
+_RATING_RE = re.compile(r"rat(?:ed|ing)\s+(?:of\s+|above\s+|at least\s+)?(\d(?:\.\d)?)\s*\+?", re.IGNORECASE)
+_BUDGET_WORDS = ("under", "below", "less than", "within", "max", "budget")
+# "max" and "within" also bound stops and trip length, so they only mark a
+# budget next to a currency or when the message says "budget"
+_WEAK_BUDGET_WORDS = ("within", "max")
+_BUDGET_RE = re.compile(
+    r"(under|below|less than|within|max(?:imum)?|budget(?:\s+of)?)\s*(rs\.?|inr|₹)?\s*"
+    r"(\d[\d,]*(?:\.\d+)?)(?![.,]?\d)\s*(k)?\b"
+    # "under 4 star", "max 1 stop", "within 2 days" are not amounts
+    r"(?![\s-]*(?:stops?|days?|nights?|stars?)\b)",
+    re.IGNORECASE,
+)
+_NONSTOP_RE = re.compile(r"\b(?:non[- ]?stop|direct)\b", re.IGNORECASE)
+_MAX_STOPS_RE = re.compile(r"(?:at most|max(?:imum)?|up to)\s+(\d)\s+stops?", re.IGNORECASE)
 
 
 def _heuristic_parse(user_message: str, error: Optional[str] = None) -> Dict[str, Any]:
@@ -25,7 +49,7 @@ def _heuristic_parse(user_message: str, error: Optional[str] = None) -> Dict[str
     if m:
         source = m.group(1).strip() or None
         destination = m.group(2).strip() or None
-        print(f"🎯 [PARSER] Regex extracted - Source: '{source}', Destination: '{destination}'")
+        logger.debug("Regex extracted source=%r, destination=%r", source, destination)
     
     # Also check for "in LOCATION" or "to LOCATION" patterns
     if not destination:
@@ -33,7 +57,7 @@ def _heuristic_parse(user_message: str, error: Optional[str] = None) -> Dict[str
         m = re.search(r"(?:hotel|hotels|stay|accommodation|room|rooms|trip|visit|travel|vacation)\s+(?:in|to)\s+([A-Za-z\s]+?)(?:[\.,;\n]|for|from|on|check|$)", text, flags=re.IGNORECASE)
         if m:
             destination = m.group(1).strip() or None
-            print(f"🎯 [PARSER] Extracted destination: {destination}")
+            logger.debug("Extracted destination: %s", destination)
 
     # Extract dates
     start_date = None
@@ -97,10 +121,36 @@ def _heuristic_parse(user_message: str, error: Optional[str] = None) -> Dict[str
     if m:
         additional_info_parts.append(f"{m.group(1)} room(s)")
     
-    # Match star rating
+    # Match star rating; also the minimum hotel rating for packages
+    min_rating = None
     m = re.search(r"(\d+)\s+star(?:s)?", text, flags=re.IGNORECASE)
     if m:
         additional_info_parts.append(f"{m.group(1)} star rating")
+        min_rating = float(m.group(1))
+    if "rat" in lower:
+        m = _RATING_RE.search(text)
+        if m:
+            min_rating = float(m.group(1))
+
+    # Match a total budget: "under 50000", "budget of ₹40,000", "below 60k"
+    max_budget = None
+    if any(k in lower for k in _BUDGET_WORDS):
+        for m in _BUDGET_RE.finditer(text):
+            word, currency, amount, thousands = m.groups()
+            if word.lower().startswith(_WEAK_BUDGET_WORDS) and not currency and "budget" not in lower:
+                continue
+            max_budget = float(amount.replace(",", "")) * (1000 if thousands else 1)
+            break
+
+    # Match stop constraints: "non-stop", "direct", "at most 1 stop"
+    max_stops = None
+    if "stop" in lower or "direct" in lower:
+        if _NONSTOP_RE.search(text):
+            max_stops = 0
+        else:
+            m = _MAX_STOPS_RE.search(text)
+            if m:
+                max_stops = int(m.group(1))
 
     duration = None
     m = re.search(r"\bfor\s+(\d+)\s+(?:day|days|night|nights)\b", lower)
@@ -120,21 +170,28 @@ def _heuristic_parse(user_message: str, error: Optional[str] = None) -> Dict[str
         "passengers": passengers,
         "cabin_class": cabin_class,
         "additional_info": " ".join(additional_info_parts) if additional_info_parts else None,
+        "max_budget": max_budget,
+        "min_rating": min_rating,
+        "max_stops": max_stops,
         "original_query": user_message,
     }
     if error:
         result["error"] = error
     
-    print(f"📋 [PARSER] Extracted: intent={intent}, source={source}, dest={destination}, dates={start_date}/{end_date}, passengers={passengers}, cabin={cabin_class}")
+    logger.debug(
+        "Extracted: intent=%s, source=%s, dest=%s, dates=%s/%s, passengers=%s, cabin=%s",
+        intent, source, destination, start_date, end_date, passengers, cabin_class,
+    )
     return result
 
 
-async def parse_user_message_async(user_message: str) -> Dict[str, Any]:
+async def parse_user_message_async(user_message: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
     """
     Smart hybrid parser: Try regex first, use LLM only if needed.
     This saves API quota while providing NLP flexibility.
+    The LLM step is skipped when the request deadline leaves too little time.
     """
-    print(f"🧠 [PARSER] Parsing: '{user_message}'")
+    logger.debug("Parsing: %r", user_message)
     
     # Step 1: Try fast regex-based parsing first
     regex_result = _heuristic_parse(user_message)
@@ -145,11 +202,15 @@ async def parse_user_message_async(user_message: str) -> Dict[str, Any]:
     
     # If regex successfully extracted intent AND location, use it (no LLM needed)
     if has_intent and has_location:
-        print(f"✅ [PARSER] Regex extraction sufficient: intent={regex_result['intent']}, locations found")
+        logger.info("Regex extraction sufficient: intent=%s", regex_result["intent"])
         return regex_result
     
+    if deadline is not None and not deadline.allows(PARSER_LLM_MIN_S):
+        logger.info("Only %.1fs left, skipping LLM parsing", deadline.remaining())
+        return regex_result
+
     # Step 3: Regex failed or incomplete - use LLM for complex/ambiguous queries
-    print(f"🤖 [PARSER] Regex incomplete (intent={has_intent}, location={has_location}), trying LLM...")
+    logger.info("Regex incomplete (intent=%s, location=%s), trying LLM", has_intent, bool(has_location))
     
     prompt = f"""You are a JSON parser. Extract travel information and return ONLY the JSON object.
 
@@ -167,30 +228,40 @@ Rules:
 JSON:"""
 
     try:
-        response = await generate_text(
-            prompt,
-            generation_config={"temperature": 0.1, "max_output_tokens": 300},
-            timeout=10.0,
-            use_google_search=False
-        )
+        with span("parser.llm_fallback"):
+            response = await generate_text(
+                prompt,
+                generation_config={"temperature": 0.1, "max_output_tokens": 300},
+                timeout=timeout_for(deadline, 10.0),
+                use_google_search=False,
+                deadline=deadline,
+                priority="interactive",
+            )
         
         # Extract JSON from response
-        print(f"📄 [PARSER] LLM response: {response}")
+        logger.debug("LLM response: %s", response)
         json_match = re.search(r'\{.*\}', response, re.DOTALL)
         if json_match:
             try:
                 parsed = json.loads(json_match.group(0))
                 parsed["original_query"] = user_message
-                print(f"✅ [PARSER] LLM success: intent={parsed.get('intent')}, dest={parsed.get('destination')}")
+                # The prompt doesn't ask for package constraints; keep the regex ones
+                for constraint in ("max_budget", "min_rating", "max_stops"):
+                    parsed.setdefault(constraint, regex_result.get(constraint))
+                logger.info("LLM parse: intent=%s, dest=%s", parsed.get("intent"), parsed.get("destination"))
                 return parsed
             except json.JSONDecodeError as je:
-                print(f"⚠️ [PARSER] Invalid JSON: {je}, using regex fallback")
+                logger.warning("Invalid JSON from LLM (%s), using regex fallback", je)
                 return regex_result
         else:
-            print(f"⚠️ [PARSER] No JSON in LLM response (got {len(response)} chars), using regex fallback")
+            logger.warning("No JSON in LLM response (%d chars), using regex fallback", len(response))
             return regex_result
             
+    except LLMOverloaded:
+        # The regex result was not enough to route the request; answering from it
+        # would look like "no results", so let the client retry instead
+        raise
     except Exception as e:
-        print(f"❌ [PARSER] LLM failed: {e}, using regex result")
+        logger.error("LLM parse failed: %s, using regex result", e)
         return regex_result
 
@@ -1,8 +1,28 @@
 """LLM-powered result summarization with fallback."""
 
 import asyncio
-from typing import List, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+import statistics
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from nlp.gemini_client import generate_text
+from deadline import Deadline, timeout_for
+from observability.metrics import TASKS_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# How long /chat waits for the LLM summary before answering with the template
+SUMMARY_LATENCY_BUDGET_S = float(os.getenv("SUMMARY_LATENCY_BUDGET_S", "1.5"))
+# Don't start an LLM summary at all when less than this much request budget is left
+SUMMARY_LLM_MIN_S = 1.0
+_LATE_SUMMARY_CACHE_SIZE = 256
+_LATE_SUMMARIES: "OrderedDict[str, str]" = OrderedDict()
+_PENDING_SUMMARIES: Dict[str, asyncio.Task] = {}
+TASKS_IN_FLIGHT.set_function(lambda: len(_PENDING_SUMMARIES), kind="hotel_summary")
 
 
 async def summarize_flight_results_async(
@@ -10,7 +30,7 @@ async def summarize_flight_results_async(
     query_context: Optional[str] = None
 ) -> str:
     """Summarize flight results using Gemini LLM."""
-    print(f"📝 [SUMMARIZER] Starting flight summary for {len(results)} results")
+    logger.debug("Starting flight summary for %d results", len(results))
     if not results:
         return "No flight results found."
     
@@ -32,7 +52,6 @@ IMPORTANT INSTRUCTIONS:
     prompt = f"{system_prompt}\n\nSearch Query{context}\n\nFlight Results:\n{results_text}\n\nProvide your complete, detailed summary (4-6 sentences minimum):"
     
     try:
-        print(f"📤 [SUMMARIZER] Calling Gemini LLM for summarization...")
         summary = await generate_text(
             prompt,
             generation_config={
@@ -40,12 +59,11 @@ IMPORTANT INSTRUCTIONS:
                 "max_output_tokens": 1500,
             }
         )
-        print(f"✅ [SUMMARIZER] LLM summarized successfully: '{summary[:80]}...'")
+        logger.info("LLM summarized %d flight results", len(results))
         return f"✨ {summary}"
     except Exception as e:
-        print(f"❌ [SUMMARIZER] LLM FAILED: {type(e).__name__}: {e}")
+        logger.error("LLM flight summary failed: %s: %s", type(e).__name__, e)
         fallback = f"[FALLBACK - API NOT USED] Found {len(results)} flight option(s). Check details below."
-        print(f"🔄 [SUMMARIZER] Using fallback: '{fallback}'")
         return fallback
 
 
@@ -57,6 +75,20 @@ async def summarize_hotel_results_async(
     if not results:
         return "No hotel results found."
     
+    try:
+        summary = await _llm_hotel_summary(results, query_context)
+        logger.info("LLM summarized %d hotel results", len(results))
+        return summary
+    except Exception as e:
+        logger.warning("LLM summarization failed: %s", e)
+        return f"[FALLBACK - API NOT USED] Found {len(results)} hotel option(s). Check details below."
+
+
+async def _llm_hotel_summary(
+    results: List[str],
+    query_context: Optional[str] = None
+) -> str:
+    """Ask Gemini for a hotel summary; raises on failure."""
     system_prompt = """You are a professional travel assistant AI. Your task is to provide a COMPLETE and DETAILED summary of hotel search results.
 
 IMPORTANT INSTRUCTIONS:
@@ -74,27 +106,258 @@ IMPORTANT INSTRUCTIONS:
     
     prompt = f"{system_prompt}\n\nSearch Query{context}\n\nHotel Results:\n{results_text}\n\nProvide your complete, detailed summary (4-6 sentences minimum):"
     
-    try:
-        summary = await generate_text(
-            prompt,
-            generation_config={
-                "temperature": 0.4,
-                "max_output_tokens": 1500,
-            }
+    summary = await generate_text(
+        prompt,
+        generation_config={
+            "temperature": 0.4,
+            "max_output_tokens": 1500,
+        }
+    )
+    return f"✨ {summary}"
+
+
+def _parse_price(price: Any) -> Tuple[Optional[float], str]:
+    """Split a display price like '₹5,400' or '$120' into (amount, currency prefix)."""
+    if isinstance(price, (int, float)):
+        return float(price), ""
+    if not isinstance(price, str):
+        return None, ""
+    m = re.search(r"(\d[\d,]*(?:\.\d+)?)", price)
+    if not m:
+        return None, ""
+    return float(m.group(1).replace(",", "")), price[:m.start()].strip()
+
+
+def _format_amount(amount: float, currency: str) -> str:
+    return f"{currency}{amount:,.0f}"
+
+
+def template_hotel_summary(
+    results: List[Dict[str, Any]],
+    query_context: Optional[str] = None
+) -> str:
+    """Deterministic, data-rich hotel summary built locally (no LLM)."""
+    if not results:
+        return "No hotel results found."
+    hotels = [h for h in results if isinstance(h, dict)]
+    context = f" {query_context}" if query_context else ""
+    if not hotels:
+        return f"Found {len(results)} hotel option(s){context}. Check details below."
+
+    sentences = [f"Found {len(hotels)} hotel option(s){context}."]
+
+    priced = []
+    for h in hotels:
+        amount, currency = _parse_price(h.get("price"))
+        if amount is not None:
+            priced.append((amount, currency, h))
+    if priced:
+        amounts = [p[0] for p in priced]
+        currency = priced[0][1]
+        sentences.append(
+            f"Nightly prices range from {_format_amount(min(amounts), currency)} to "
+            f"{_format_amount(max(amounts), currency)}, with a median of "
+            f"{_format_amount(statistics.median(amounts), currency)}."
         )
-        print(f"✅ LLM summarized {len(results)} hotel results")
-        return f"✨ {summary}"
-    except Exception as e:
-        print(f"⚠️ LLM summarization failed: {e}")
-        return f"[FALLBACK - API NOT USED] Found {len(results)} hotel option(s). Check details below."
 
+    rated = [h for h in hotels if isinstance(h.get("rating"), (int, float))]
+    if rated:
+        top = max(rated, key=lambda h: (h["rating"], h.get("reviews") or 0))
+        reviews = f", {top['reviews']:,} reviews" if isinstance(top.get("reviews"), int) else ""
+        sentences.append(f"The top-rated option is {top.get('name')} ({top['rating']}★{reviews}).")
 
-async def summarize_combined_results_async(
+    # Best value: highest rating per unit price among priced and rated hotels
+    value = [(p[2]["rating"] / p[0], p) for p in priced if isinstance(p[2].get("rating"), (int, float)) and p[0] > 0]
+    if value:
+        _, (amount, currency, best) = max(value, key=lambda v: v[0])
+        sentences.append(
+            f"For the best value, consider {best.get('name')} at {_format_amount(amount, currency)} "
+            f"with a {best['rating']}★ rating."
+        )
+    elif priced:
+        amount, currency, cheapest = min(priced, key=lambda p: p[0])
+        sentences.append(f"The most affordable option is {cheapest.get('name')} at {_format_amount(amount, currency)}.")
+
+    amenity_counts: Dict[str, int] = {}
+    for h in hotels:
+        for amenity in h.get("amenities") or []:
+            amenity_counts[amenity] = amenity_counts.get(amenity, 0) + 1
+    if amenity_counts:
+        common = sorted(amenity_counts.items(), key=lambda kv: (-kv[1], kv[0]))[:4]
+        sentences.append("Common amenities include " + ", ".join(name for name, _ in common) + ".")
+
+    return " ".join(sentences)
+
+
+def _summary_key(kind: str, results: List[Any], query_context: Optional[str]) -> str:
+    raw = json.dumps([kind, query_context, results], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _store_late_summary(key: str, summary: str) -> None:
+    _LATE_SUMMARIES[key] = summary
+    _LATE_SUMMARIES.move_to_end(key)
+    while len(_LATE_SUMMARIES) > _LATE_SUMMARY_CACHE_SIZE:
+        _LATE_SUMMARIES.popitem(last=False)
+
+
+def get_late_summary(summary_id: str) -> Tuple[str, Optional[str]]:
+    """
+    Look up an LLM summary that finished after its request was answered.
+
+    Returns:
+        (status, summary) where status is "ready", "pending" or "unknown"
+    """
+    if summary_id in _LATE_SUMMARIES:
+        return "ready", _LATE_SUMMARIES[summary_id]
+    if summary_id in _PENDING_SUMMARIES:
+        return "pending", None
+    return "unknown", None
+
+
+async def summarize_hotel_results_budgeted(
+    results: List[Dict[str, Any]],
+    query_context: Optional[str] = None,
+    budget_s: Optional[float] = None,
+    deadline: Optional[Deadline] = None
+) -> Tuple[str, Optional[str]]:
+    """
+    Race the LLM summary against a latency budget, template-first.
+
+    The templated summary is ready immediately. If the LLM finishes within
+    budget_s (bounded by the request deadline) its summary is returned; otherwise the template is returned and
+    the LLM keeps running in the background. Its result is stored so the next
+    identical request (or a poll on summary_id) gets it without waiting.
+
+    Returns:
+        (summary, summary_id) - summary_id is set while an LLM summary is still pending
+    """
+    if not results:
+        return "No hotel results found.", None
+    return await _budgeted_summary(
+        _summary_key("hotel", results, query_context),
+        lambda: template_hotel_summary(results, query_context),
+        lambda: _llm_hotel_summary(results, query_context),
+        budget_s,
+        deadline,
+    )
+
+
+async def summarize_combined_results_budgeted(
     flight_results: List[str],
     hotel_results: List[str],
+    template: str,
+    query_context: Optional[str] = None,
+    budget_s: Optional[float] = None,
+    deadline: Optional[Deadline] = None
+) -> Tuple[str, Optional[str]]:
+    """
+    Combined flight + hotel summary with the same template-first hedge as
+    summarize_hotel_results_budgeted; template is the ready-made answer.
+
+    Returns:
+        (summary, summary_id) - summary_id is set while an LLM summary is still pending
+    """
+    if not flight_results or not hotel_results:
+        return template, None
+    return await _budgeted_summary(
+        _summary_key("combined", flight_results + hotel_results, query_context),
+        lambda: template,
+        lambda: _llm_combined_summary(flight_results, hotel_results, query_context),
+        budget_s,
+        deadline,
+    )
+
+
+async def _budgeted_summary(
+    key: str,
+    template: Callable[[], str],
+    llm: Callable[[], Awaitable[str]],
+    budget_s: Optional[float],
+    deadline: Optional[Deadline]
+) -> Tuple[str, Optional[str]]:
+    budget_s = SUMMARY_LATENCY_BUDGET_S if budget_s is None else budget_s
+
+    if key in _LATE_SUMMARIES:
+        _LATE_SUMMARIES.move_to_end(key)
+        return _LATE_SUMMARIES[key], None
+
+    fallback = template()
+
+    if deadline is not None:
+        if not deadline.allows(SUMMARY_LLM_MIN_S) and key not in _PENDING_SUMMARIES:
+            logger.info("Only %.1fs left, skipping LLM summary", deadline.remaining())
+            return fallback, None
+        budget_s = min(budget_s, deadline.remaining())
+
+    task = _PENDING_SUMMARIES.get(key)
+    if task is None:
+        task = asyncio.create_task(llm())
+        _PENDING_SUMMARIES[key] = task
+
+        def _on_done(t: asyncio.Task, key: str = key) -> None:
+            _PENDING_SUMMARIES.pop(key, None)
+            if t.cancelled():
+                return
+            if t.exception() is not None:
+                logger.warning("Background LLM summary failed: %s", t.exception())
+                return
+            _store_late_summary(key, t.result())
+
+        task.add_done_callback(_on_done)
+
+    if budget_s > 0:
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=budget_s), None
+        except asyncio.TimeoutError:
+            logger.info("LLM summary exceeded %ss budget, returning template", budget_s)
+        except Exception as e:
+            logger.warning("LLM summarization failed: %s", e)
+            return fallback, None
+
+    return fallback, (key if not task.done() else None)
+
+
+def template_package_summary(
+    packages: List[Dict[str, Any]],
+    flight_count: int,
+    hotel_count: int,
     query_context: Optional[str] = None
 ) -> str:
-    """Summarize combined flight and hotel results."""
+    """Deterministic summary of ranked flight + hotel packages (no LLM)."""
+    context = f" {query_context}" if query_context else ""
+    sentences = [f"Found {flight_count} flights and {hotel_count} hotels{context}."]
+    if not packages:
+        sentences.append("No flight and hotel combination fits your budget and preferences.")
+        return " ".join(sentences)
+    best = packages[0]
+    currency = best["currency"] + " "
+    stops = best["flight"].get("stops")
+    rating = best["hotel"].get("rating")
+    sentences.append(
+        f"The best package is {_format_amount(best['total'], currency)} for {best['nights']} night(s): "
+        f"flight {best['flight']['flight_number']}"
+        + (" (non-stop)" if stops == 0 else f" ({stops} stop(s))" if stops is not None else "")
+        + f" with {best['hotel'].get('name')}"
+        + (f" (rated {rating})" if rating is not None else "")
+        + "."
+    )
+    if len(packages) > 1:
+        sentences.append(
+            f"{len(packages)} packages are ranked below, up to "
+            f"{_format_amount(packages[-1]['total'], packages[-1]['currency'] + ' ')}."
+        )
+    return " ".join(sentences)
+
+
+async def summarize_combined_results_async(
+    flight_results: List[str],
+    hotel_results: List[str],
+    query_context: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
+    fallback: Optional[str] = None
+) -> str:
+    """Summarize combined flight and hotel results (fallback replaces the generic failure text)."""
     if not flight_results and not hotel_results:
         return "No results found."
     
@@ -103,6 +366,22 @@ async def summarize_combined_results_async(
     if not flight_results:
         return await summarize_hotel_results_async(hotel_results, query_context)
     
+    try:
+        return await _llm_combined_summary(flight_results, hotel_results, query_context, deadline)
+    except Exception as e:
+        logger.warning("LLM summarization failed: %s", e)
+        if fallback is not None:
+            return fallback
+        return f"[FALLBACK - API NOT USED] Found {len(flight_results)} flight(s) and {len(hotel_results)} hotel(s). Check details below."
+
+
+async def _llm_combined_summary(
+    flight_results: List[str],
+    hotel_results: List[str],
+    query_context: Optional[str] = None,
+    deadline: Optional[Deadline] = None
+) -> str:
+    """Ask Gemini for a flight + hotel summary; raises on failure."""
     system_prompt = """You are a professional travel assistant AI. Your task is to provide a COMPLETE and DETAILED summary of a complete trip package including flights and hotels.
 
 IMPORTANT INSTRUCTIONS:
@@ -122,16 +401,14 @@ IMPORTANT INSTRUCTIONS:
     
     prompt = f"{system_prompt}\n\nTrip Query{context}\n\nFlight Options:\n{flights_text}\n\nHotel Options:\n{hotels_text}\n\nProvide your complete, detailed trip summary (5-8 sentences minimum):"
     
-    try:
-        summary = await generate_text(
-            prompt,
-            generation_config={
-                "temperature": 0.4,
-                "max_output_tokens": 2000,
-            }
-        )
-        print(f"✅ LLM summarized {len(flight_results)} flights + {len(hotel_results)} hotels")
-        return f"✨ {summary}"
-    except Exception as e:
-        print(f"⚠️ LLM summarization failed: {e}")
-        return f"[FALLBACK - API NOT USED] Found {len(flight_results)} flight(s) and {len(hotel_results)} hotel(s). Check details below."
+    summary = await generate_text(
+        prompt,
+        generation_config={
+            "temperature": 0.4,
+            "max_output_tokens": 2000,
+        },
+        timeout=timeout_for(deadline, 15.0),
+        deadline=deadline,
+    )
+    logger.info("LLM summarized %d flights + %d hotels", len(flight_results), len(hotel_results))
+    return f"✨ {summary}"
@@ -0,0 +1,150 @@
+"""
+Structured, non-blocking logging.
+
+Modules log through the standard library (logging.getLogger(__name__)).
+configure_logging() installs a single QueueHandler on the root logger, so a
+log call only resolves its message and enqueues the record; a QueueListener
+thread does the formatting and the stdout write. Records carry the request and
+session correlation ids of the request that produced them.
+
+Environment:
+    LOG_LEVEL   root level (default INFO)
+    LOG_LEVELS  per-module overrides, e.g. "nlp.parser=DEBUG,services=WARNING"
+    LOG_FORMAT  "json" (default) or "text"
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from observability.tracing import current_trace_id
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "session_id", "trace_id",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Stamp records with correlation ids; runs in the logging thread's caller."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        record.trace_id = current_trace_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "session_id", None):
+            entry["session_id"] = record.session_id
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+class _EnqueueOnlyHandler(logging.handlers.QueueHandler):
+    """Queue the record as-is; formatting happens on the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now (args may be mutated later) but skip formatting
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if name and level:
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    module_levels: Optional[str] = None,
+    fmt: Optional[str] = None,
+) -> None:
+    """Install the queue-based handler on the root logger (idempotent)."""
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    module_levels = module_levels if module_levels is not None else os.getenv("LOG_LEVELS", "")
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    for name, module_level in parse_module_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _EnqueueOnlyHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def bind_context(request_id: Optional[str] = None, session_id: Optional[str] = None) -> Tuple[Any, Any]:
+    """Set correlation ids for the current task; returns tokens for reset_context."""
+    return request_id_var.set(request_id), session_id_var.set(session_id)
+
+
+def reset_context(tokens: Tuple[Any, Any]) -> None:
+    request_id_var.reset(tokens[0])
+    session_id_var.reset(tokens[1])
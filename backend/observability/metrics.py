@@ -0,0 +1,326 @@
+"""
+In-process metrics exposed in Prometheus text format (GET /metrics).
+
+Recording is lock-free: observe()/inc() append a tuple to a deque (atomic
+under the GIL) and return. The pending samples are folded into the bucket
+and sum/count tables when /metrics is scraped, or by the recording call that
+finds more than _MAX_PENDING of them waiting, so memory stays bounded when
+nothing scrapes. That call only folds if no other thread is already doing
+so; the request path never waits on a lock.
+
+Metrics are per process; plans computed in batch_planner worker processes
+are not included.
+"""
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from observability.tracing import span
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+# Pending samples per metric before a recording call folds them itself
+_MAX_PENDING = 1024
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._pending: deque = deque()
+        # Held while folding pending samples into the tables
+        self._fold_lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _record(self, key: LabelValues, value: float) -> None:
+        pending = self._pending
+        pending.append((key, value))
+        if len(pending) > _MAX_PENDING and self._fold_lock.acquire(blocking=False):
+            try:
+                self._fold()
+            finally:
+                self._fold_lock.release()
+
+    def _drain(self) -> None:
+        with self._fold_lock:
+            self._fold()
+
+    def _fold(self) -> None:
+        pending = self._pending
+        while True:
+            try:
+                key, value = pending.popleft()
+            except IndexError:
+                return
+            self._apply(key, value)
+
+    def _apply(self, key: LabelValues, value: float) -> None:
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        self._drain()
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class _Scalar(_Metric):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        self._record(self._key(labels), amount)
+
+    def set_function(self, fn: Callable[[], float], **labels: Any) -> None:
+        """Read this series from fn() at scrape time (e.g. len() of a registry)."""
+        self._functions[self._key(labels)] = fn
+
+    def _apply(self, key: LabelValues, value: float) -> None:
+        self._values[key] = self._values.get(key, 0.0) + value
+
+    def _samples(self) -> List[str]:
+        values = dict(self._values)
+        for key, fn in self._functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                continue
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Counter(_Scalar):
+    kind = "counter"
+
+
+class Gauge(_Scalar):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self._record(self._key(labels), -amount)
+
+    @contextmanager
+    def track(self, **labels: Any) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        self._record(self._key(labels), value)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _apply(self, key: LabelValues, value: float) -> None:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        # Only scrapes take this lock; recording never does
+        self._scrape_lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._scrape_lock:
+            lines: List[str] = []
+            for metric in self._metrics.values():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Application metrics ---
+
+REQUEST_LATENCY = histogram(
+    "tripweave_request_duration_seconds", "HTTP request latency", ("endpoint", "method", "status", "intent"),
+)
+REQUESTS_IN_FLIGHT = gauge("tripweave_requests_in_flight", "HTTP requests being served")
+NODE_LATENCY = histogram(
+    "tripweave_graph_node_duration_seconds", "LangGraph node duration", ("graph", "node", "outcome"),
+)
+PROVIDER_LATENCY = histogram(
+    "tripweave_provider_call_duration_seconds", "Provider call latency", ("provider", "outcome"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0),
+)
+PROVIDER_CALLS = counter(
+    "tripweave_provider_calls_total", "Provider calls by outcome (ok, error, rejected)", ("provider", "outcome"),
+)
+LLM_QUEUE_DEPTH = gauge("tripweave_llm_queue_depth", "Gemini calls waiting for a concurrency slot or rate limit", ("priority",))
+LLM_QUEUE_WAIT = histogram(
+    "tripweave_llm_queue_wait_seconds", "Time a Gemini call waited before being sent",
+    ("priority",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0),
+)
+LLM_IN_FLIGHT = gauge("tripweave_llm_in_flight", "Gemini calls currently being sent")
+LLM_SHED = counter("tripweave_llm_shed_total", "Gemini calls rejected by admission control", ("reason",))
+TASKS_IN_FLIGHT = gauge("tripweave_tasks_in_flight", "Background tasks in flight", ("kind",))
+CACHE_LATENCY = histogram(
+    "tripweave_cache_serve_duration_seconds",
+    "Time to answer a cacheable lookup; result=miss includes computing or fetching the value",
+    ("cache", "result"),
+)
+CACHE_LOOKUPS = counter("tripweave_cache_lookups_total", "Cache lookups by result", ("cache", "result"))
+CACHE_WARM = counter(
+    "tripweave_cache_warm_total", "Cache warmer decisions (refreshed, fresh, over_budget, failed)", ("cache", "result"),
+)
+STARTUP_PHASE = gauge("tripweave_startup_phase_seconds", "Duration of each startup phase (imports, initializers)", ("phase",))
+
+
+# Labels the endpoint learns while handling a request (e.g. the parsed intent).
+# The middleware installs a fresh dict; handlers mutate it in place, so it is
+# visible even though the handler runs in a copied context.
+_request_labels: ContextVar[Optional[Dict[str, str]]] = ContextVar("request_labels", default=None)
+
+
+@contextmanager
+def request_labels() -> Iterator[Dict[str, str]]:
+    labels: Dict[str, str] = {}
+    token = _request_labels.set(labels)
+    try:
+        yield labels
+    finally:
+        _request_labels.reset(token)
+
+
+def set_request_label(name: str, value: Any) -> None:
+    labels = _request_labels.get()
+    if labels is not None:
+        labels[name] = str(value)
+
+
+def timed_node(graph: str, node: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a LangGraph node (sync or async) so its duration is recorded and traced."""
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(state):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                with span(f"{graph}.{node}"):
+                    result = await fn(state)
+                outcome = "ok"
+                return result
+            finally:
+                NODE_LATENCY.observe(time.perf_counter() - start, graph=graph, node=node, outcome=outcome)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(state):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with span(f"{graph}.{node}"):
+                result = fn(state)
+            outcome = "ok"
+            return result
+        finally:
+            NODE_LATENCY.observe(time.perf_counter() - start, graph=graph, node=node, outcome=outcome)
+    return wrapper
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
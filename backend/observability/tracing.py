@@ -0,0 +1,358 @@
+"""
+Hierarchical request tracing.
+
+    with start_trace("POST /chat"):
+        with span("parser.parse"):
+            ...
+
+Spans nest through a ContextVar, so they follow asyncio tasks and
+asyncio.to_thread calls. Every span of a trace is buffered in memory and the
+keep/drop decision is made when the root span ends: a trace is exported if it
+was head-sampled (TRACE_SAMPLE_RATE), ran longer than TRACE_SLOW_MS, or ended
+in an error. Export runs on a background thread behind a bounded queue; when
+the exporter falls behind, new traces are dropped rather than queued without
+limit. The file exporter rotates its file once it reaches TRACE_FILE_MAX_BYTES,
+keeping one previous file (TRACE_FILE.1).
+
+Environment:
+    TRACING_ENABLED       "1" (default) or "0" to make span() a no-op
+    TRACE_SAMPLE_RATE     fraction of traces always exported (default 0.1)
+    TRACE_SLOW_MS         traces slower than this are always exported (default 5000)
+    TRACE_EXPORTER        "file" (default), "otlp", "log" or "none"
+    TRACE_FILE            JSON-lines output for the file exporter (default backend/.data/traces.jsonl)
+    TRACE_FILE_MAX_BYTES  size at which the trace file is rotated (default 50 MB)
+    TRACE_EXPORT_QUEUE    traces waiting for export before new ones are dropped (default 1000)
+    OTLP_ENDPOINT         base URL of an OTLP/HTTP collector (default http://localhost:4318)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+from paths import data_dir
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_EXPORT_QUEUE = int(os.getenv("TRACE_EXPORT_QUEUE", "1000"))
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "http://localhost:4318")
+SERVICE_NAME = "tripweave-backend"
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class Trace:
+    def __init__(self, sampled: bool):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current_span.get()
+    return active.trace.trace_id if active is not None else None
+
+
+@contextmanager
+def _open_span(trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]) -> Iterator[Span]:
+    active = Span(trace, name, parent_id, attributes)
+    trace.spans.append(active)
+    token = _current_span.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        active.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Open a root span; the trace is exported (or dropped) when it ends."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(sampled=random.random() < TRACE_SAMPLE_RATE)
+    try:
+        with _open_span(trace, name, None, attributes) as root:
+            trace.root = root
+            yield root
+    finally:
+        _finish(trace)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Open a child of the current span; a no-op outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _open_span(parent.trace, name, parent.span_id, attributes) as child:
+        yield child
+
+
+# --- Reading traces ---
+
+def critical_path(spans: List[Span]) -> List[Span]:
+    """Root first, then at each level the child that finished last."""
+    children: Dict[Optional[str], List[Span]] = {}
+    for s in spans:
+        children.setdefault(s.parent_id, []).append(s)
+    path = []
+    level = children.get(None, [])
+    while level:
+        last = max(level, key=lambda s: s.end_ns or 0)
+        path.append(last)
+        level = children.get(last.span_id, [])
+    return path
+
+
+def render_tree(spans: List[Span]) -> str:
+    """Indented span tree with start offsets and durations; * marks the critical path."""
+    if not spans:
+        return ""
+    children: Dict[Optional[str], List[Span]] = {}
+    for s in spans:
+        children.setdefault(s.parent_id, []).append(s)
+    on_path = {s.span_id for s in critical_path(spans)}
+    origin = min(s.start_ns for s in spans)
+    lines: List[str] = []
+
+    def walk(parent_id: Optional[str], depth: int) -> None:
+        for s in sorted(children.get(parent_id, []), key=lambda s: s.start_ns):
+            marker = "*" if s.span_id in on_path else " "
+            offset_ms = (s.start_ns - origin) / 1e6
+            error = f"  !! {s.error}" if s.error else ""
+            lines.append(f"{marker} {'  ' * depth}{s.name}  +{offset_ms:.0f}ms  {s.duration_ms:.1f}ms{error}")
+            walk(s.span_id, depth + 1)
+
+    walk(None, 0)
+    return "\n".join(lines)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: Trace) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for one trace."""
+    spans = []
+    for s in trace.spans:
+        item = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "tripweave"}, "spans": spans}],
+        }]
+    }
+
+
+# --- Exporters ---
+
+class FileExporter:
+    """Append each trace as one OTLP/JSON line, rotating the file at max_bytes."""
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = TRACE_FILE_MAX_BYTES):
+        # Resolved on first export: this module is imported before backend/.env is loaded
+        self.path = Path(path) if path is not None else None
+        self.max_bytes = max_bytes
+
+    def _rotate(self, path: Path) -> None:
+        try:
+            if path.stat().st_size >= self.max_bytes:
+                os.replace(path, path.with_name(path.name + ".1"))
+        except FileNotFoundError:
+            pass
+
+    def export(self, trace: Trace) -> None:
+        if self.path is None:
+            self.path = Path(os.getenv("TRACE_FILE", data_dir() / "traces.jsonl"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.max_bytes > 0:
+            self._rotate(self.path)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(to_otlp(trace)) + "\n")
+
+
+class OTLPHttpExporter:
+    """POST traces to an OTLP/HTTP collector (JSON encoding)."""
+
+    def __init__(self, endpoint: str = OTLP_ENDPOINT, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, trace: Trace) -> None:
+        requests.post(self.url, json=to_otlp(trace), timeout=self.timeout).raise_for_status()
+
+
+class LogExporter:
+    """Log the span tree; handy in development."""
+
+    def export(self, trace: Trace) -> None:
+        logger.info("Trace %s (%.0fms)\n%s", trace.trace_id, trace.root.duration_ms, render_tree(trace.spans))
+
+
+def _make_exporter(kind: str) -> Optional[Any]:
+    if kind == "file":
+        return FileExporter()
+    if kind == "otlp":
+        return OTLPHttpExporter()
+    if kind == "log":
+        return LogExporter()
+    return None
+
+
+_exporter = _make_exporter(TRACE_EXPORTER)
+_export_queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=TRACE_EXPORT_QUEUE)
+_dropped_traces = 0
+_export_thread: Optional[threading.Thread] = None
+_export_thread_lock = threading.Lock()
+
+# Most recent exported traces, for /status/traces
+RECENT_TRACES: deque = deque(maxlen=50)
+
+
+def set_exporter(exporter: Optional[Any]) -> None:
+    """Replace the exporter (any object with export(trace))."""
+    global _exporter
+    _exporter = exporter
+
+
+def _export_loop() -> None:
+    while True:
+        trace = _export_queue.get()
+        if trace is None:
+            return
+        try:
+            if _exporter is not None:
+                _exporter.export(trace)
+        except Exception as e:
+            logger.warning("Trace export failed: %s", e)
+
+
+def _ensure_export_thread() -> None:
+    global _export_thread
+    if _export_thread is not None:
+        return
+    with _export_thread_lock:
+        if _export_thread is None:
+            _export_thread = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+            _export_thread.start()
+            atexit.register(shutdown_tracing)
+
+
+def _finish(trace: Trace) -> None:
+    root = trace.root
+    if root is None:
+        return
+    if not (trace.sampled or root.error or root.duration_ms >= TRACE_SLOW_MS):
+        return
+    RECENT_TRACES.append(trace)
+    if _exporter is not None:
+        _ensure_export_thread()
+        try:
+            _export_queue.put_nowait(trace)
+        except queue.Full:
+            _drop(trace)
+
+
+def _drop(trace: Trace) -> None:
+    global _dropped_traces
+    _dropped_traces += 1
+    if _dropped_traces == 1 or _dropped_traces % 1000 == 0:
+        logger.warning("Trace export queue full, dropped %d traces so far", _dropped_traces)
+
+
+def shutdown_tracing() -> None:
+    """Export whatever is queued and stop the exporter thread."""
+    global _export_thread
+    if _export_thread is not None:
+        try:
+            _export_queue.put(None, timeout=5)
+        except queue.Full:
+            # The exporter is stuck; it is a daemon thread, so don't wait for it
+            _export_thread = None
+            return
+        _export_thread.join(timeout=5)
+        _export_thread = None
+
+
+def recent_traces(limit: int = 20) -> List[Dict[str, Any]]:
+    """Summaries of recently kept traces, slowest first."""
+    traces = sorted(RECENT_TRACES, key=lambda t: t.root.duration_ms, reverse=True)[:limit]
+    return [
+        {
+            "trace_id": t.trace_id,
+            "name": t.root.name,
+            "duration_ms": round(t.root.duration_ms, 1),
+            "error": t.root.error,
+            "critical_path": [f"{s.name} ({s.duration_ms:.0f}ms)" for s in critical_path(t.spans)],
+            "tree": render_tree(t.spans).splitlines(),
+        }
+        for t in traces
+    ]
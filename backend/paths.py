@@ -0,0 +1,17 @@
+"""
+Where the backend keeps its local state: SQLite stores, provider fixtures,
+traces and the startup profile.
+
+Environment:
+    TRIPWEAVE_DATA_DIR   base directory (default backend/.data)
+"""
+
+import os
+from pathlib import Path
+
+_DEFAULT_DATA_DIR = Path(__file__).resolve().parent / ".data"
+
+
+def data_dir() -> Path:
+    """The data directory, read from the environment on every call."""
+    return Path(os.getenv("TRIPWEAVE_DATA_DIR", _DEFAULT_DATA_DIR))
@@ -1,13 +1,41 @@
-from fastapi import APIRouter
-from graph.itinerary_planning_graph import app as planning_graph
-from schemas import ChatResponse
+import json
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from graph.batch_planner import plan_batch
+from graph.plan_cache import get_plan, plan_itinerary_cached
+from responses import chat_response
+from schemas import BatchPlanRequest, ChatResponse
 
 router = APIRouter()
 
-# This endpoint expects all required structured inputs in the request state
+# This endpoint expects all required structured inputs in the request state.
+# An optional "seed" selects the plan variant; identical inputs + seed are served from cache.
 @router.post("/plan_itinerary", response_model=ChatResponse)
-async def plan_itinerary(state: dict):
-    # Run the planning graph
-    result = await planning_graph.ainvoke(state)
+async def plan_itinerary(state: dict, fields: Optional[str] = None):
+    try:
+        entry, _ = await plan_itinerary_cached(state)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     # Return only the structured itinerary
-    return ChatResponse(response="Itinerary planned.", intent=None, flight_results=[], hotel_results=[], itinerary=result.get("final_itinerary"))
+    return chat_response(fields=fields, response="Itinerary planned.", intent=None, flight_results=[], hotel_results=[], itinerary=entry["final_itinerary"], plan_id=entry["plan_id"])
+
+
+# Re-fetch a previously planned itinerary by the plan_id returned on creation
+@router.get("/plan_itinerary/{plan_id}", response_model=ChatResponse)
+async def get_planned_itinerary(plan_id: str, fields: Optional[str] = None):
+    entry = get_plan(plan_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Plan not found or expired from cache")
+    return chat_response(fields=fields, response="Itinerary planned.", itinerary=entry["final_itinerary"], plan_id=plan_id)
+
+
+# Batch planning: one planning state per variant, spread over a process pool.
+# Streams newline-delimited JSON events as each plan (and optional narration) completes.
+@router.post("/plan_itinerary/batch")
+async def plan_itinerary_batch(request: BatchPlanRequest):
+    async def event_stream():
+        async for event in plan_batch(request.states, narrate=request.narrate):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
@@ -0,0 +1,208 @@
+"""
+Fast response path for the chat endpoints.
+
+- dumps(): orjson when installed (several times faster than json for the
+  hotel-heavy payloads), stdlib json otherwise
+- chat_payload(): ChatResponse-shaped dicts built from the model's field
+  defaults, skipping validation of results we built ourselves
+- fields= projection: clients list the top-level and per-item fields they
+  render, e.g. ?fields=response,intent,hotel_results.name,hotel_results.price
+- CompressionMiddleware: brotli (if the brotli package is installed) or gzip
+  for single-body responses above COMPRESS_MIN_BYTES, as Accept-Encoding
+  allows (q=0 refuses a coding); such responses carry Vary: Accept-Encoding
+  even when sent uncompressed. Streamed responses (NDJSON batch planning)
+  pass through untouched
+
+Environment:
+    COMPRESS_MIN_BYTES   smallest body worth compressing (default 1024)
+    COMPRESS_LEVEL       gzip level 1-9 (default 5); brotli uses quality 4
+"""
+
+import gzip
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+from schemas import ChatResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "5"))
+BROTLI_QUALITY = 4
+
+_COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+_CHAT_FIELDS = ChatResponse.model_fields
+_CHAT_REQUIRED = {name for name, field in _CHAT_FIELDS.items() if field.is_required()}
+_CHAT_DEFAULTS = {name: field.get_default() for name, field in _CHAT_FIELDS.items() if not field.is_required()}
+
+
+def chat_payload(**values: Any) -> Dict[str, Any]:
+    """ChatResponse fields with defaults filled in, built without validation."""
+    unknown = values.keys() - _CHAT_FIELDS.keys()
+    if unknown:
+        raise TypeError(f"Unknown ChatResponse fields: {sorted(unknown)}")
+    missing = _CHAT_REQUIRED - values.keys()
+    if missing:
+        raise TypeError(f"Missing required ChatResponse fields: {sorted(missing)}")
+    return {**_CHAT_DEFAULTS, **values}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, Optional[set]]]:
+    """"a,b.x,b.y" -> {"a": None, "b": {"x", "y"}}; None means everything."""
+    if not fields:
+        return None
+    spec: Dict[str, Optional[set]] = {}
+    for raw in fields.split(","):
+        name = raw.strip()
+        if not name:
+            continue
+        top, _, sub = name.partition(".")
+        if not sub:
+            spec[top] = None
+        elif top not in spec or spec[top] is not None:
+            spec.setdefault(top, set()).add(sub)
+    return spec
+
+
+def _project_items(items: List[Any], keep: set) -> List[Any]:
+    # Only dict items have fields; formatted strings pass through as they are
+    return [{k: v for k, v in item.items() if k in keep} if isinstance(item, dict) else item for item in items]
+
+
+def project(payload: Dict[str, Any], spec: Optional[Dict[str, Optional[set]]]) -> Dict[str, Any]:
+    if spec is None:
+        return payload
+    projected = {}
+    for key, sub in spec.items():
+        if key not in payload:
+            continue
+        value = payload[key]
+        if sub is not None and isinstance(value, list):
+            value = _project_items(value, sub)
+        projected[key] = value
+    return projected
+
+
+def chat_response(fields: Optional[str] = None, **values: Any) -> FastJSONResponse:
+    """A ChatResponse-shaped JSON response, optionally projected to `fields`."""
+    return FastJSONResponse(project(chat_payload(**values), parse_fields(fields)))
+
+
+def _accepted_encoding(headers: List[Any]) -> Optional[str]:
+    """The coding to use for this request: the highest-q of br / gzip, br on a tie; q=0 refuses."""
+    for name, value in headers:
+        if name != b"accept-encoding":
+            continue
+        weights: Dict[str, float] = {}
+        for token in value.decode("latin-1").lower().split(","):
+            coding, _, params = token.partition(";")
+            q = 1.0
+            for param in params.split(";"):
+                key, _, val = param.partition("=")
+                if key.strip() == "q":
+                    try:
+                        q = float(val)
+                    except ValueError:
+                        q = 0.0
+            weights[coding.strip()] = q
+        wildcard = weights.get("*", 0.0)
+        candidates = ("br", "gzip") if brotli is not None else ("gzip",)
+        best = max(candidates, key=lambda c: weights.get(c, wildcard))
+        return best if weights.get(best, wildcard) > 0 else None
+    return None
+
+
+def _with_vary(raw_headers: List[Any]) -> List[Any]:
+    """Add Accept-Encoding to the response's Vary header."""
+    for i, (name, value) in enumerate(raw_headers):
+        if name == b"vary":
+            if b"accept-encoding" not in value.lower() and value.strip() != b"*":
+                raw_headers[i] = (name, value + b", Accept-Encoding")
+            return raw_headers
+    return raw_headers + [(b"vary", b"Accept-Encoding")]
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+
+
+class CompressionMiddleware:
+    """Compress whole (non-streamed) responses above a size threshold."""
+
+    def __init__(self, app: Any, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # None still goes through the wrapper: an uncompressed reply to a
+        # response that could have been compressed must carry Vary too
+        encoding = _accepted_encoding(scope.get("headers") or [])
+
+        start_message: Optional[Dict[str, Any]] = None
+        passthrough = False
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            headers = dict(start_message.get("headers") or [])
+            body = message.get("body", b"")
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            eligible = (
+                not message.get("more_body", False)
+                and b"content-encoding" not in headers
+                and len(body) >= self.minimum_size
+                and content_type.startswith(_COMPRESSIBLE_TYPES)
+            )
+            if not eligible or encoding is None:
+                passthrough = True
+                if eligible:
+                    start_message = {**start_message, "headers": _with_vary(list(start_message.get("headers") or []))}
+                await send(start_message)
+                await send(message)
+                return
+            compressed = _compress(body, encoding)
+            raw_headers = [(k, v) for k, v in start_message.get("headers") or [] if k != b"content-length"]
+            raw_headers = _with_vary(raw_headers) + [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+            ]
+            await send({**start_message, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
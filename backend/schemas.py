@@ -1,9 +1,15 @@
-from pydantic import BaseModel
+import os
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, Union, Any
+from graph.plan_cache import MAX_PLAN_DAYS
+
+# Variants accepted in one batch planning request
+BATCH_PLAN_MAX_STATES = int(os.getenv("BATCH_PLAN_MAX_STATES", "100"))
 
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -11,7 +17,30 @@ class ChatResponse(BaseModel):
     intent: Optional[str] = None
     flight_results: list[str] = []
     hotel_results: list[Union[str, dict[str, Any]]] = []
+    # Ranked flight + hotel packages for "both" searches (graph.package_optimizer)
+    packages: list[dict[str, Any]] = []
     itinerary: Optional[list] = None
+    plan_id: Optional[str] = None
+    summary_id: Optional[str] = None
+
+
+class BatchPlanRequest(BaseModel):
+    states: list[dict[str, Any]] = Field(max_length=BATCH_PLAN_MAX_STATES)
+    narrate: bool = False
+
+    @field_validator("states")
+    @classmethod
+    def _check_days(cls, states: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        for index, state in enumerate(states):
+            days = state.get("number_of_days")
+            try:
+                too_long = days is not None and int(days) > MAX_PLAN_DAYS
+            except (TypeError, ValueError):
+                # Reported per variant by the planner
+                continue
+            if too_long:
+                raise ValueError(f"states[{index}]: number_of_days must be at most {MAX_PLAN_DAYS}")
+        return states
 
 
 class HealthResponse(BaseModel):
@@ -1,27 +1,36 @@
 import os
-import requests
+from observability.tracing import span
+from services.provider_replay import http_request, is_offline
+from services.rate_limits import record_provider_call
 
 AMADEUS_AUTH_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
 
 
-def get_amadeus_access_token():
+def get_amadeus_access_token(timeout: float = 10):
     client_id = os.getenv("AMADEUS_CLIENT_ID")
     client_secret = os.getenv("AMADEUS_CLIENT_SECRET")
 
-    if not client_id or not client_secret:
+    # Replay and stub answer without credentials
+    if (not client_id or not client_secret) and not is_offline():
         raise RuntimeError("Amadeus credentials not found in environment variables")
 
-    response = requests.post(
-        AMADEUS_AUTH_URL,
-        data={
-            "grant_type": "client_credentials",
-            "client_id": client_id,
-            "client_secret": client_secret,
-        },
-        headers={
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-    )
+    with span("http POST amadeus.oauth2_token"):
+        response = http_request(
+            "amadeus",
+            "POST",
+            AMADEUS_AUTH_URL,
+            data={
+                "grant_type": "client_credentials",
+                "client_id": client_id,
+                "client_secret": client_secret,
+            },
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded"
+            },
+            timeout=timeout
+        )
+    # Token requests count against the same quota as searches
+    record_provider_call("amadeus")
 
     response.raise_for_status()
     return response.json()["access_token"]
@@ -1,18 +1,56 @@
-import requests
-from dotenv import load_dotenv
-load_dotenv()
+import logging
+import time
 from services.amadeus_auth import get_amadeus_access_token
+from services.circuit_breaker import get_breaker
+from services.retry_policy import get_retry_policy
+from services.rate_limits import (
+    QuotaExhaustedError,
+    acquire_provider_slot,
+    cache_only,
+    record_provider_call,
+)
+from services.provider_replay import http_request
+from services.response_cache import FLIGHT_EMPTY_CACHE_TTL_S, cache_key, flight_cache
+from services.cache_warmer import record_search
+from services.fare_history import record_offers
+from deadline import Deadline, DeadlineExceeded
+from observability.metrics import CACHE_LATENCY
+from observability.tracing import span
+
+logger = logging.getLogger(__name__)
 
 AMADEUS_FLIGHT_OFFERS_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
 
 
+def flight_params(
+    origin: str,
+    destination: str,
+    departure_date: str,
+    adults: int = 1,
+    max_results: int = 5,
+    travel_class: str = "ECONOMY",
+) -> dict:
+    """Flight offers query parameters; also the flight cache key."""
+    return {
+        "originLocationCode": origin,
+        "destinationLocationCode": destination,
+        "departureDate": departure_date,
+        "adults": adults,
+        "travelClass": travel_class,
+        "currencyCode": "INR",
+        "max": max_results,
+    }
+
+
 def search_flights(
     origin: str,
     destination: str,
     departure_date: str,
     adults: int = 1,
     max_results: int = 5,
-    travel_class: str = "ECONOMY"
+    travel_class: str = "ECONOMY",
+    timeout: float = 15,
+    refresh: bool = False,
 ):
     """
     Fetch real flight offers from Amadeus and return formatted results.
@@ -24,49 +62,87 @@ def search_flights(
         adults: Number of adult passengers
         max_results: Maximum number of results to return
         travel_class: Cabin class - ECONOMY, PREMIUM_ECONOMY, BUSINESS, or FIRST
+        timeout: Total time budget in seconds, shared by the auth and search calls
+        refresh: Fetch even if a fresh result is cached (the cache warmer); not counted as traffic
     """
-    token = get_amadeus_access_token()
-
-    params = {
-        "originLocationCode": origin,
-        "destinationLocationCode": destination,
-        "departureDate": departure_date,
-        "adults": adults,
-        "travelClass": travel_class,
-        "currencyCode": "INR",
-        "max": max_results,
-    }
+    started = time.perf_counter()
+    params = flight_params(origin, destination, departure_date, adults, max_results, travel_class)
+    if not refresh:
+        record_search("flights", origin=origin, destination=destination, departure_date=departure_date,
+                      adults=adults, max_results=max_results, travel_class=travel_class)
+
+    key = cache_key("amadeus", params)
+    cached = None if refresh else flight_cache.get(key)
+    if cached is not None:
+        logger.info("Cache hit: %s → %s on %s", origin, destination, departure_date)
+        CACHE_LATENCY.observe(time.perf_counter() - started, cache="flights", result="hit")
+        return cached
+    if cache_only("amadeus"):
+        stale = flight_cache.get(key, allow_stale=True)
+        if stale is not None:
+            logger.warning("Quota low - serving stale cached flights")
+            CACHE_LATENCY.observe(time.perf_counter() - started, cache="flights", result="stale")
+            return stale
+        raise QuotaExhaustedError("Amadeus quota is low; serving from cache only")
     
-    print(f"📤 [AMADEUS] Requesting flights: {origin} → {destination} on {departure_date}")
-    print(f"📤 [AMADEUS] Full params: {params}")
-
-    response = requests.get(
-        AMADEUS_FLIGHT_OFFERS_URL,
-        headers={
-            "Authorization": f"Bearer {token}"
-        },
-        params=params,
-        timeout=15
-    )
+    logger.info("Requesting flights: %s → %s on %s", origin, destination, departure_date)
+    logger.debug("Full params: %s", params)
 
-    response.raise_for_status()
-    raw_data = response.json()
+    # Each attempt waits for a client-side rate-limit token, then goes through the
+    # breaker (fails fast while Amadeus is degraded); throttling and transient
+    # errors are retried within the shared time budget
+    budget = Deadline(timeout)
+
+    def attempt():
+        acquire_provider_slot("amadeus", budget.remaining())
+        # A budget spent waiting on our own limiter says nothing about Amadeus
+        budget.check("Amadeus request")
+        return get_breaker("amadeus").call(_fetch_flight_offers, params, budget.remaining())
+
+    raw_data = get_retry_policy("amadeus").call(attempt, idempotent=True, deadline=budget)
     
-    print(f"🔍 [AMADEUS] Raw response contains {len(raw_data.get('data', []))} offers")
-    if raw_data.get('data'):
-        first_offer = raw_data['data'][0]
-        first_segment = first_offer['itineraries'][0]['segments'][0]
-        print(f"🔍 [AMADEUS] First flight: {first_segment['departure']['iataCode']} → {first_segment['arrival']['iataCode']}")
+    logger.debug("Raw response contains %d offers", len(raw_data.get('data', [])))
 
     formatted_results = format_flight_offers(raw_data, destination)
     
     if not formatted_results:
-        print(f"⚠️ [AMADEUS] No flights found matching destination {destination}")
-        print(f"⚠️ [AMADEUS] This may be due to Test API limitations or no available flights for this route")
+        logger.warning("No flights found matching destination %s (test API limitations or no availability)", destination)
     
+    flight_cache.put(key, formatted_results, ttl_s=None if formatted_results else FLIGHT_EMPTY_CACHE_TTL_S)
+    record_offers(origin, destination, departure_date, formatted_results)
+    CACHE_LATENCY.observe(time.perf_counter() - started, cache="flights", result="miss")
     return formatted_results
 
 
+def _fetch_flight_offers(params: dict, timeout: float) -> dict:
+    """Authenticate and fetch raw offers within a shared time budget."""
+    if timeout <= 0:
+        raise DeadlineExceeded("Amadeus time budget exhausted")
+    expires_at = time.monotonic() + timeout
+    token = get_amadeus_access_token(timeout=min(10, timeout))
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Amadeus time budget spent on authentication")
+
+    with span("http GET amadeus.flight_offers") as s:
+        response = http_request(
+            "amadeus",
+            "GET",
+            AMADEUS_FLIGHT_OFFERS_URL,
+            headers={
+                "Authorization": f"Bearer {token}"
+            },
+            params=params,
+            timeout=remaining
+        )
+        if s is not None:
+            s.set_attribute("http.status_code", response.status_code)
+    record_provider_call("amadeus")
+
+    response.raise_for_status()
+    return response.json()
+
+
 def format_flight_offers(data: dict, requested_destination: str = None):
     """
     Convert raw Amadeus flight-offers JSON into clean, UI-ready objects.
@@ -87,11 +163,14 @@ def format_flight_offers(data: dict, requested_destination: str = None):
         
         actual_destination = segment['arrival']['iataCode']
         
-        print(f"🔍 [AMADEUS] Processing flight: {segment['departure']['iataCode']} → {actual_destination} | {segment['carrierCode']} {segment['number']}")
+        logger.debug(
+            "Processing flight: %s → %s | %s %s",
+            segment['departure']['iataCode'], actual_destination, segment['carrierCode'], segment['number'],
+        )
         
         # Validate destination matches if provided
         if requested_destination and actual_destination != requested_destination:
-            print(f"⚠️ [AMADEUS] Skipping flight - destination mismatch (expected {requested_destination}, got {actual_destination})")
+            logger.debug("Skipping flight - destination mismatch (expected %s, got %s)", requested_destination, actual_destination)
             continue
 
         # Safely extract baggage information with fallbacks
@@ -0,0 +1,263 @@
+"""
+Background refresh of popular flight and hotel searches.
+
+Most searches hit a handful of routes and cities, yet every cache expiry
+used to cost a user a cold provider call. The warmer keeps those entries
+fresh instead:
+
+- candidates are the top CACHE_WARM_TOP_N searches of recent traffic (search
+  counts decay with CACHE_WARM_HALF_LIFE_S) followed by the configured routes
+  and cities, searched CACHE_WARM_DAYS_AHEAD days from today
+- every CACHE_WARM_INTERVAL_S the entries past CACHE_WARM_REFRESH_AT of
+  their TTL (or missing) are fetched again, most popular first
+- refreshes are limited to CACHE_WARM_QUOTA_SHARE of each provider's
+  remaining monthly quota, spread evenly over the days left in the month,
+  and stop entirely once the provider is in cache-only mode
+
+Caches and traffic counts are per process, so each worker warms its own
+cache; the daily budget is kept in the quota ledger and shared by all of them.
+The warmer spends paid provider quota, so it is off unless enabled; with
+several workers, enabling it in one is usually enough. Ledger reads and writes
+run in a worker thread, off the event loop.
+
+Environment:
+    CACHE_WARM_ENABLED        "1" or "0" (default)
+    CACHE_WARM_INTERVAL_S     seconds between cycles (default 60)
+    CACHE_WARM_REFRESH_AT     refresh once an entry is this fraction of its TTL old (default 0.8)
+    CACHE_WARM_TOP_N          learned searches per cache (default 20)
+    CACHE_WARM_HALF_LIFE_S    half-life of search counts (default 3600)
+    CACHE_WARM_ROUTES         e.g. "DEL-BOM,DEL-BLR,BOM-GOI" (the default)
+    CACHE_WARM_CITIES         hotel cities, e.g. "Goa,Mumbai,Bangalore" (the default)
+    CACHE_WARM_DAYS_AHEAD     departure / check-in offsets for configured keys (default "7,14")
+    CACHE_WARM_HOTEL_NIGHTS   stay length for configured cities (default 2)
+    CACHE_WARM_QUOTA_SHARE    share of the remaining monthly quota the warmer may use (default 0.2)
+    CACHE_WARM_MAX_PER_CYCLE  refreshes per provider per cycle (default 10)
+"""
+
+import asyncio
+import calendar
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from observability.metrics import CACHE_WARM
+from services.provider_replay import is_offline
+from services.rate_limits import cache_only, ledger, quota_remaining
+from services.response_cache import ResponseCache, cache_key, flight_cache, hotel_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_WARM_ENABLED = os.getenv("CACHE_WARM_ENABLED", "0") == "1"
+CACHE_WARM_INTERVAL_S = float(os.getenv("CACHE_WARM_INTERVAL_S", "60"))
+CACHE_WARM_REFRESH_AT = float(os.getenv("CACHE_WARM_REFRESH_AT", "0.8"))
+CACHE_WARM_TOP_N = int(os.getenv("CACHE_WARM_TOP_N", "20"))
+CACHE_WARM_HALF_LIFE_S = float(os.getenv("CACHE_WARM_HALF_LIFE_S", "3600"))
+CACHE_WARM_ROUTES = os.getenv("CACHE_WARM_ROUTES", "DEL-BOM,DEL-BLR,BOM-GOI")
+CACHE_WARM_CITIES = os.getenv("CACHE_WARM_CITIES", "Goa,Mumbai,Bangalore")
+CACHE_WARM_DAYS_AHEAD = os.getenv("CACHE_WARM_DAYS_AHEAD", "7,14")
+CACHE_WARM_HOTEL_NIGHTS = int(os.getenv("CACHE_WARM_HOTEL_NIGHTS", "2"))
+CACHE_WARM_QUOTA_SHARE = float(os.getenv("CACHE_WARM_QUOTA_SHARE", "0.2"))
+CACHE_WARM_MAX_PER_CYCLE = int(os.getenv("CACHE_WARM_MAX_PER_CYCLE", "10"))
+# Per refresh; the warmer is never in a hurry
+CACHE_WARM_TIMEOUT_S = 20.0
+
+# kind -> (provider, cache, argument holding the travel date)
+_KINDS: Dict[str, Tuple[str, ResponseCache, str]] = {
+    "flights": ("amadeus", flight_cache, "departure_date"),
+    "hotels": ("serp", hotel_cache, "check_in_date"),
+}
+
+
+class SearchPopularity:
+    """Exponentially decayed search counts per (kind, search arguments)."""
+
+    def __init__(self, half_life_s: float = CACHE_WARM_HALF_LIFE_S, max_keys: int = 2000):
+        self.half_life_s = half_life_s
+        self.max_keys = max_keys
+        self._scores: Dict[Tuple[str, Tuple], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated) / self.half_life_s)
+
+    def record(self, kind: str, args: Dict[str, Any]) -> None:
+        key = (kind, tuple(sorted(args.items())))
+        now = time.monotonic()
+        with self._lock:
+            score, updated = self._scores.get(key, (0.0, now))
+            self._scores[key] = (self._decayed(score, updated, now) + 1.0, now)
+            if len(self._scores) > self.max_keys:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        # Drop the least popular quarter rather than one key per insert
+        ranked = sorted(self._scores, key=lambda k: self._decayed(*self._scores[k], now))
+        for key in ranked[:len(ranked) // 4]:
+            del self._scores[key]
+
+    def top(self, kind: str, n: int) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            scored = [
+                (self._decayed(score, updated, now), dict(args))
+                for (k, args), (score, updated) in self._scores.items()
+                if k == kind
+            ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [args for _, args in scored[:n]]
+
+
+popularity = SearchPopularity()
+_last_cycle: Dict[str, Any] = {}
+
+
+def record_search(kind: str, **args: Any) -> None:
+    """Count one user search; called by the provider services."""
+    popularity.record(kind, args)
+
+
+def _offsets() -> List[int]:
+    return [int(part) for part in CACHE_WARM_DAYS_AHEAD.split(",") if part.strip()]
+
+
+def configured_searches(kind: str, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    today = today or date.today()
+    searches = []
+    for offset in _offsets():
+        day = today + timedelta(days=offset)
+        if kind == "flights":
+            for route in filter(None, (r.strip() for r in CACHE_WARM_ROUTES.split(","))):
+                origin, _, destination = route.upper().partition("-")
+                searches.append({
+                    "origin": origin, "destination": destination, "departure_date": day.isoformat(),
+                    "adults": 1, "max_results": 5, "travel_class": "ECONOMY",
+                })
+        else:
+            for city in filter(None, (c.strip() for c in CACHE_WARM_CITIES.split(","))):
+                searches.append({
+                    "city": city,
+                    "check_in_date": day.isoformat(),
+                    "check_out_date": (day + timedelta(days=CACHE_WARM_HOTEL_NIGHTS)).isoformat(),
+                })
+    return searches
+
+
+def candidates(kind: str) -> List[Dict[str, Any]]:
+    """Searches to keep warm, most valuable first: learned, then configured; past dates dropped."""
+    date_arg = _KINDS[kind][2]
+    today = date.today().isoformat()
+    seen = set()
+    result = []
+    for args in popularity.top(kind, CACHE_WARM_TOP_N) + configured_searches(kind):
+        key = tuple(sorted(args.items()))
+        if key in seen or str(args.get(date_arg, "")) < today:
+            continue
+        seen.add(key)
+        result.append(args)
+    return result
+
+
+def _params(kind: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    if kind == "flights":
+        from services.amadeus_flights import flight_params
+        return flight_params(**args)
+    from services.serp_hotels import hotel_params
+    return hotel_params(**args)
+
+
+def is_due(kind: str, args: Dict[str, Any]) -> bool:
+    provider, cache, _ = _KINDS[kind]
+    age = cache.age(cache_key(provider, _params(kind, args)))
+    return age is None or age >= cache.ttl_s * CACHE_WARM_REFRESH_AT
+
+
+def daily_budget(provider: str) -> Optional[int]:
+    """Warm refreshes still allowed today (None: the provider has no quota)."""
+    remaining = quota_remaining(provider)
+    if remaining is None:
+        return None
+    now = datetime.now(timezone.utc)
+    days_left = calendar.monthrange(now.year, now.month)[1] - now.day + 1
+    # Today's allowance is based on the quota left at the start of the day
+    at_day_start = remaining + ledger.usage(provider)["today"]
+    allowance = int(CACHE_WARM_QUOTA_SHARE * at_day_start / days_left)
+    return max(0, allowance - ledger.usage(f"warm:{provider}")["today"])
+
+
+def _cycle_budget(provider: str) -> Optional[int]:
+    """Refreshes this cycle may spend on provider (None in cache-only mode)."""
+    if cache_only(provider):
+        return None
+    budget = daily_budget(provider)
+    return CACHE_WARM_MAX_PER_CYCLE if budget is None else min(budget, CACHE_WARM_MAX_PER_CYCLE)
+
+
+def _refresh(kind: str, args: Dict[str, Any]) -> None:
+    """Fetch one search again (blocking; run in a worker thread)."""
+    provider = _KINDS[kind][0]
+    if not is_offline():
+        ledger.record(f"warm:{provider}")
+    if kind == "flights":
+        from services.amadeus_flights import search_flights
+        search_flights(**args, timeout=CACHE_WARM_TIMEOUT_S, refresh=True)
+    else:
+        from services.serp_hotels import search_hotels
+        search_hotels(**args, timeout=CACHE_WARM_TIMEOUT_S, refresh=True)
+
+
+async def warm_once() -> Dict[str, Any]:
+    """One pass over both caches; returns per-cache counts by result."""
+    cycle: Dict[str, Any] = {}
+    for kind, (provider, _, _) in _KINDS.items():
+        counts = {"refreshed": 0, "failed": 0, "fresh": 0, "over_budget": 0}
+        cycle[kind] = counts
+        budget = await asyncio.to_thread(_cycle_budget, provider)
+        if budget is None:
+            continue
+        for args in candidates(kind):
+            if not is_due(kind, args):
+                result = "fresh"
+            elif budget <= 0:
+                result = "over_budget"
+            else:
+                budget -= 1
+                try:
+                    await asyncio.to_thread(_refresh, kind, args)
+                    result = "refreshed"
+                except Exception as e:
+                    # Missing credentials, open breaker, ...: retry next cycle
+                    logger.info("Cache warm of %s %s failed, skipping %s this cycle: %s", kind, args, provider, e)
+                    counts["failed"] += 1
+                    CACHE_WARM.inc(cache=kind, result="failed")
+                    break
+            counts[result] += 1
+            CACHE_WARM.inc(cache=kind, result=result)
+    _last_cycle.clear()
+    _last_cycle.update({"at": time.time(), **cycle})
+    return cycle
+
+
+async def run_warmer() -> None:
+    """Warm forever (until cancelled), one cycle every CACHE_WARM_INTERVAL_S."""
+    while True:
+        try:
+            cycle = await warm_once()
+            logger.debug("Cache warm cycle: %s", cycle)
+        except Exception:
+            logger.exception("Cache warm cycle failed")
+        await asyncio.sleep(CACHE_WARM_INTERVAL_S)
+
+
+async def warmer_status() -> Dict[str, Any]:
+    budget_today = await asyncio.to_thread(
+        lambda: {provider: daily_budget(provider) for provider, _, _ in _KINDS.values()}
+    )
+    return {
+        "enabled": CACHE_WARM_ENABLED,
+        "last_cycle": dict(_last_cycle),
+        "budget_today": budget_today,
+        "candidates": {kind: len(candidates(kind)) for kind in _KINDS},
+    }
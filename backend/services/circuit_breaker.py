@@ -0,0 +1,209 @@
+"""
+Per-provider circuit breakers.
+
+Each breaker keeps a rolling window of recent call outcomes. When the error
+rate or the slow-call rate crosses its threshold the breaker opens and calls
+fail immediately with CircuitOpenError instead of waiting out a timeout.
+After open_s it goes half-open and lets exactly one probe call through:
+success closes the breaker, failure re-opens it.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from deadline import DeadlineExceeded
+from observability.metrics import PROVIDER_CALLS, PROVIDER_LATENCY
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose breaker is open."""
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """Provider-side failures trip the breaker; our own bad requests don't."""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        return status >= 500 or status in (408, 429)
+    return True
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_s: float = 60.0,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call_s: float = 10.0,
+        slow_rate: float = 0.8,
+        open_s: float = 30.0,
+    ):
+        self.name = name
+        self.window_s = window_s
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._calls: deque = deque()  # (timestamp, failed, slow)
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error: Optional[str] = None
+
+    # --- state checks ---
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.open_s:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+
+    def rejecting(self) -> bool:
+        """Cheap check for callers that want to fail before queueing."""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state == OPEN or (self._state == HALF_OPEN and self._probe_in_flight)
+
+    def allow(self) -> None:
+        """
+        Admit one call or raise CircuitOpenError.
+
+        In half-open state only a single probe is admitted; its outcome must be
+        reported with record_success/record_failure.
+        """
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        PROVIDER_CALLS.inc(provider=self.name, outcome="rejected")
+        raise CircuitOpenError(f"{self.name} circuit is open; failing fast")
+
+    # --- outcome recording ---
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_s
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        self.times_opened += 1
+        logger.warning("%s circuit OPEN for %ss", self.name, self.open_s)
+
+    def _record(self, failed: bool, latency_s: float) -> None:
+        now = time.monotonic()
+        slow = latency_s >= self.slow_call_s
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    self._probe_in_flight = False
+                    logger.info("%s circuit CLOSED after successful probe", self.name)
+                return
+            if self._state == OPEN:
+                # Late result from a call admitted before the breaker opened
+                return
+            self._calls.append((now, failed, slow))
+            self._trim(now)
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            if failures / total >= self.error_rate or slow_calls / total >= self.slow_rate:
+                self._open(now)
+
+    def record_success(self, latency_s: float) -> None:
+        PROVIDER_CALLS.inc(provider=self.name, outcome="ok")
+        PROVIDER_LATENCY.observe(latency_s, provider=self.name, outcome="ok")
+        self._record(False, latency_s)
+
+    def record_failure(self, latency_s: float, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self.last_error = f"{type(error).__name__}: {error}"
+        PROVIDER_CALLS.inc(provider=self.name, outcome="error")
+        PROVIDER_LATENCY.observe(latency_s, provider=self.name, outcome="error")
+        self._record(True, latency_s)
+
+    def abandon(self) -> None:
+        """Release an admitted call without an outcome (e.g. it was cancelled)."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a synchronous provider call through the breaker."""
+        self.allow()
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except DeadlineExceeded:
+            # Our own time budget ran out; no outcome for the provider
+            self.abandon()
+            raise
+        except Exception as e:
+            latency = time.monotonic() - start
+            if counts_as_failure(e):
+                self.record_failure(latency, e)
+            else:
+                self.record_success(latency)
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            self._trim(now)
+            total = len(self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            return {
+                "state": self._state,
+                "window_calls": total,
+                "error_rate": round(failures / total, 3) if total else 0.0,
+                "slow_rate": round(slow_calls / total, 3) if total else 0.0,
+                "open_for_s": round(max(0.0, self.open_s - (now - self._opened_at)), 1) if self._state == OPEN else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
+
+
+_OPEN_S = float(os.getenv("BREAKER_OPEN_S", "30"))
+
+BREAKERS: Dict[str, CircuitBreaker] = {
+    "amadeus": CircuitBreaker("amadeus", slow_call_s=8.0, open_s=_OPEN_S),
+    "serp": CircuitBreaker("serp", slow_call_s=10.0, open_s=_OPEN_S),
+    "gemini": CircuitBreaker("gemini", slow_call_s=20.0, open_s=_OPEN_S),
+}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    return BREAKERS[provider]
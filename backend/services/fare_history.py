@@ -0,0 +1,182 @@
+"""
+Local history of observed flight fares.
+
+Every offer search_flights fetches from Amadeus is appended here, so fare
+calendars and "when should I fly" questions can be answered from what we
+have already seen, without provider calls.
+
+Layout (SQLite, WAL), both tables WITHOUT ROWID so rows are stored clustered
+by their primary key and a route's days are one contiguous range scan:
+
+    fares       every offer: (origin, destination, cabin, departure day,
+                observed_at, flight number) -> price in minor units,
+                currency, stops
+    daily_min   per route, cabin, departure day and observation day: the
+                cheapest offer seen that day; cheapest_days() reads only this
+
+Days are stored as date ordinals and prices as integer minor units (paise,
+cents) to keep rows small. Observations older than FARE_HISTORY_RETENTION_DAYS
+are pruned as new ones arrive.
+
+Environment:
+    FARE_HISTORY_ENABLED         "1" (default) or "0" to stop recording; nothing is
+                                 recorded in stub or replay mode (PROVIDER_MODE)
+    FARE_HISTORY_DB              database path (default backend/.data/fare_history.db)
+    FARE_HISTORY_RETENTION_DAYS  observations kept (default 90)
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from paths import data_dir
+from services.provider_replay import is_offline
+
+logger = logging.getLogger(__name__)
+
+FARE_HISTORY_ENABLED = os.getenv("FARE_HISTORY_ENABLED", "1") == "1"
+FARE_HISTORY_DB = Path(os.getenv("FARE_HISTORY_DB", data_dir() / "fare_history.db"))
+FARE_HISTORY_RETENTION_DAYS = int(os.getenv("FARE_HISTORY_RETENTION_DAYS", "90"))
+# Prune once per this many recorded searches rather than on every insert
+_PRUNE_EVERY = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS fares ("
+    " origin TEXT NOT NULL, destination TEXT NOT NULL, cabin TEXT NOT NULL,"
+    " departure_day INTEGER NOT NULL, observed_at INTEGER NOT NULL, flight_number TEXT NOT NULL,"
+    " price_minor INTEGER NOT NULL, currency TEXT NOT NULL, stops INTEGER,"
+    " PRIMARY KEY (origin, destination, cabin, departure_day, observed_at, flight_number)"
+    ") WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS daily_min ("
+    " origin TEXT NOT NULL, destination TEXT NOT NULL, cabin TEXT NOT NULL,"
+    " departure_day INTEGER NOT NULL, observed_day INTEGER NOT NULL,"
+    " price_minor INTEGER NOT NULL, currency TEXT NOT NULL, flight_number TEXT NOT NULL,"
+    " observed_at INTEGER NOT NULL,"
+    " PRIMARY KEY (origin, destination, cabin, departure_day, observed_day)"
+    ") WITHOUT ROWID",
+)
+
+
+def _to_minor(amount: Any) -> Optional[int]:
+    try:
+        return int((Decimal(str(amount)) * 100).to_integral_value())
+    except (InvalidOperation, ValueError):
+        return None
+
+
+class FareHistory:
+    def __init__(self, path: Path = FARE_HISTORY_DB):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._recorded = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def record(self, origin: str, destination: str, departure_date: str, offers: List[Dict[str, Any]],
+               observed_at: Optional[float] = None) -> int:
+        """Append formatted offers (format_flight_offers output); returns rows written."""
+        observed_at = int(observed_at if observed_at is not None else time.time())
+        observed_day = date.fromtimestamp(observed_at).toordinal()
+        departure_day = date.fromisoformat(departure_date).toordinal()
+        rows = []
+        for offer in offers:
+            price = _to_minor((offer.get("price") or {}).get("amount"))
+            if price is None:
+                continue
+            rows.append((
+                origin, destination, offer.get("cabin") or "ECONOMY", departure_day, observed_at,
+                offer.get("flight_number") or "", price, (offer.get("price") or {}).get("currency") or "",
+                offer.get("stops"),
+            ))
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO fares VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany(
+                    "INSERT INTO daily_min VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(origin, destination, cabin, departure_day, observed_day) DO UPDATE SET "
+                    " price_minor = excluded.price_minor, currency = excluded.currency,"
+                    " flight_number = excluded.flight_number, observed_at = excluded.observed_at "
+                    "WHERE excluded.price_minor < daily_min.price_minor",
+                    [(o, d, c, dep, observed_day, price, cur, fn, at) for o, d, c, dep, at, fn, price, cur, _ in rows],
+                )
+            self._recorded += 1
+            if self._recorded % _PRUNE_EVERY == 0:
+                self._prune(conn)
+        return len(rows)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        cutoff = int(time.time()) - FARE_HISTORY_RETENTION_DAYS * 86400
+        with conn:
+            conn.execute("DELETE FROM fares WHERE observed_at < ?", (cutoff,))
+            conn.execute("DELETE FROM daily_min WHERE observed_at < ?", (cutoff,))
+
+    def cheapest_days(self, origin: str, destination: str, days: int = 30, cabin: str = "ECONOMY",
+                      start: Optional[date] = None, max_age_days: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Cheapest observed fare for each departure day in [start, start + days).
+
+        Days with no observation are included with price None, so the result
+        is a complete calendar. max_age_days ignores older observations.
+        """
+        start = start or date.today()
+        first, last = start.toordinal(), start.toordinal() + days - 1
+        min_observed_day = 0 if max_age_days is None else date.today().toordinal() - max_age_days
+        with self._lock:
+            conn = self._connect()
+            # SQLite returns the other columns from the row holding MIN()
+            rows = conn.execute(
+                "SELECT departure_day, MIN(price_minor), currency, flight_number, observed_at FROM daily_min "
+                "WHERE origin = ? AND destination = ? AND cabin = ? AND departure_day BETWEEN ? AND ? "
+                "AND observed_day >= ? GROUP BY departure_day",
+                (origin, destination, cabin, first, last, min_observed_day),
+            ).fetchall()
+        by_day = {row[0]: row for row in rows}
+        calendar = []
+        for ordinal in range(first, last + 1):
+            row = by_day.get(ordinal)
+            calendar.append({
+                "date": date.fromordinal(ordinal).isoformat(),
+                "price": None if row is None else row[1] / 100,
+                "currency": None if row is None else row[2],
+                "flight_number": None if row is None else row[3],
+                "observed_at": None if row is None else row[4],
+            })
+        return calendar
+
+
+fare_history = FareHistory()
+
+
+def record_offers(origin: str, destination: str, departure_date: str, offers: List[Dict[str, Any]]) -> None:
+    """Store a search's offers; never fails the search that produced them."""
+    # Stubbed and replayed fares were never observed, so they don't belong in the history
+    if not FARE_HISTORY_ENABLED or not offers or is_offline():
+        return
+    try:
+        fare_history.record(origin, destination, departure_date, offers)
+    except Exception as e:
+        logger.warning("Could not record fare history: %s", e)
+
+
+def cheapest_days(origin: str, destination: str, days: int = 30, cabin: str = "ECONOMY",
+                  start: Optional[date] = None, max_age_days: Optional[int] = None) -> List[Dict[str, Any]]:
+    return fare_history.cheapest_days(origin.upper(), destination.upper(), days, cabin.upper(), start, max_age_days)
@@ -0,0 +1,268 @@
+"""
+Record-and-replay layer under the provider clients.
+
+Every outbound Amadeus/SERP HTTP request and every Gemini generate_content
+call goes through this module. PROVIDER_MODE selects what happens:
+
+- passthrough (default): call the provider
+- record: call the provider and store the response (status, body, observed
+  latency) in the fixture store, keyed by the normalized request
+- replay: serve responses from the fixture store without any network access
+- stub: answer from handlers registered with register_stub (synthetic
+  responses with simulated latency, e.g. for load tests)
+
+Normalization drops credentials (api_key, client_id/secret, Authorization),
+so fixtures recorded with one set of keys replay under any other, and OAuth
+tokens in recorded response bodies are redacted. Replay and stub need no
+provider credentials at all. Recorded
+errors (HTTP error statuses, Gemini exceptions) replay as the same errors.
+
+Replay and stub calls are not counted against provider quotas. Replay also
+skips client-side request pacing; stub keeps it, so load tests see the same
+provider limits as production. Concurrency limits, breakers and retries
+always apply.
+
+Environment:
+    PROVIDER_MODE           passthrough | record | replay | stub
+    PROVIDER_FIXTURES_DIR   fixture store (default backend/.data/fixtures)
+    REPLAY_LATENCY          "recorded" (sleep the observed latency) or "none"
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from paths import data_dir
+
+logger = logging.getLogger(__name__)
+
+PASSTHROUGH = "passthrough"
+RECORD = "record"
+REPLAY = "replay"
+STUB = "stub"
+
+PROVIDER_MODE = os.getenv("PROVIDER_MODE", PASSTHROUGH)
+FIXTURES_DIR = Path(os.getenv("PROVIDER_FIXTURES_DIR", data_dir() / "fixtures"))
+REPLAY_LATENCY = os.getenv("REPLAY_LATENCY", "recorded")
+
+# Request fields that identify the caller rather than the request
+_SECRET_FIELDS = {"api_key", "client_id", "client_secret", "authorization", "key"}
+# Response body fields scrubbed before a response is recorded (OAuth tokens)
+_SECRET_RESPONSE_FIELDS = {"access_token", "refresh_token", "id_token"}
+# Response headers worth keeping (retry hints)
+_KEPT_HEADERS = ("Retry-After", "Content-Type")
+
+
+class FixtureMissingError(RuntimeError):
+    """Replay mode found no recorded response for a request."""
+
+
+class RecordedProviderError(RuntimeError):
+    """A provider exception captured in record mode, raised again on replay."""
+
+
+def is_offline() -> bool:
+    """True when no real provider is called (replay or stub)."""
+    return PROVIDER_MODE in (REPLAY, STUB)
+
+
+def skips_pacing() -> bool:
+    return PROVIDER_MODE == REPLAY
+
+
+def set_mode(mode: str, fixtures_dir: Optional[Path] = None, latency: Optional[str] = None) -> None:
+    """Switch modes at runtime (tests, load generator)."""
+    global PROVIDER_MODE, FIXTURES_DIR, REPLAY_LATENCY
+    if mode not in (PASSTHROUGH, RECORD, REPLAY, STUB):
+        raise ValueError(f"Unknown provider mode: {mode}")
+    PROVIDER_MODE = mode
+    if fixtures_dir is not None:
+        FIXTURES_DIR = Path(fixtures_dir)
+    if latency is not None:
+        REPLAY_LATENCY = latency
+    _store.clear()
+
+
+def _strip_secrets(values: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: v for k, v in (values or {}).items() if k.lower() not in _SECRET_FIELDS}
+
+
+def _scrub_body(body: str) -> str:
+    """A response body with token fields replaced, so fixtures hold no live credentials."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(payload, dict) or not _SECRET_RESPONSE_FIELDS & payload.keys():
+        return body
+    return json.dumps({k: "redacted" if k in _SECRET_RESPONSE_FIELDS else v for k, v in payload.items()})
+
+
+def request_key(provider: str, request: Dict[str, Any]) -> str:
+    raw = json.dumps([provider, request], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class FixtureStore:
+    """One JSON file per recorded request under <dir>/<provider>/<key>.json."""
+
+    def __init__(self) -> None:
+        self._memo: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, provider: str, key: str) -> Path:
+        return FIXTURES_DIR / provider / f"{key}.json"
+
+    def get(self, provider: str, key: str) -> Optional[Dict[str, Any]]:
+        memo_key = f"{provider}/{key}"
+        entry = self._memo.get(memo_key)
+        if entry is not None:
+            return entry
+        path = self._path(provider, key)
+        if not path.exists():
+            return None
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        with self._lock:
+            self._memo[memo_key] = entry
+        return entry
+
+    def put(self, provider: str, key: str, entry: Dict[str, Any]) -> None:
+        path = self._path(provider, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entry, indent=1, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        with self._lock:
+            self._memo[f"{provider}/{key}"] = entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memo.clear()
+
+
+_store = FixtureStore()
+
+
+# provider -> handler(normalized request) -> entry like a recorded one
+_STUBS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+
+
+def register_stub(provider: str, handler: Callable[[Dict[str, Any]], Dict[str, Any]]) -> None:
+    """Answer `provider` calls from handler in stub mode; entries may set latency_s."""
+    _STUBS[provider] = handler
+
+
+def _stub_entry(provider: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    handler = _STUBS.get(provider)
+    if handler is None:
+        raise FixtureMissingError(f"No stub registered for {provider}")
+    entry = handler(request)
+    if entry.get("latency_s"):
+        time.sleep(entry["latency_s"])
+    return entry
+
+
+def _replay_entry(provider: str, key: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    entry = _store.get(provider, key)
+    if entry is None:
+        raise FixtureMissingError(f"No recorded {provider} response for {json.dumps(request, default=str)[:200]}")
+    if REPLAY_LATENCY == "recorded" and entry.get("latency_s"):
+        time.sleep(entry["latency_s"])
+    return entry
+
+
+# --- HTTP providers (Amadeus, SERP) ---
+
+def _to_response(entry: Dict[str, Any], url: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.reason = entry.get("reason") or ""
+    response.headers = CaseInsensitiveDict(entry.get("headers") or {})
+    response._content = entry.get("body", "").encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+def http_request(
+    provider: str,
+    method: str,
+    url: str,
+    *,
+    params: Optional[Dict[str, Any]] = None,
+    data: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> requests.Response:
+    """requests.request() with record/replay; returns a requests.Response either way."""
+    if PROVIDER_MODE == PASSTHROUGH:
+        return requests.request(method, url, params=params, data=data, headers=headers, timeout=timeout)
+
+    request = {"method": method, "url": url, "params": _strip_secrets(params), "data": _strip_secrets(data)}
+    if PROVIDER_MODE == STUB:
+        return _to_response({"status": 200, **_stub_entry(provider, request)}, url)
+    key = request_key(provider, request)
+    if PROVIDER_MODE == REPLAY:
+        return _to_response(_replay_entry(provider, key, request), url)
+
+    started = time.monotonic()
+    response = requests.request(method, url, params=params, data=data, headers=headers, timeout=timeout)
+    _store.put(provider, key, {
+        "request": request,
+        "status": response.status_code,
+        "reason": response.reason,
+        "headers": {h: response.headers[h] for h in _KEPT_HEADERS if h in response.headers},
+        "body": _scrub_body(response.text),
+        "latency_s": round(time.monotonic() - started, 4),
+        "recorded_at": time.time(),
+    })
+    return response
+
+
+# --- Gemini ---
+
+class _RecordedGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def gemini_generate(model: Any, model_name: str, prompt: str, generation_config: Dict[str, Any], grounded: bool) -> Any:
+    """model.generate_content() with record/replay (runs in a worker thread)."""
+    if PROVIDER_MODE == PASSTHROUGH:
+        return model.generate_content(prompt, generation_config=generation_config)
+
+    request = {"model": model_name, "prompt": prompt, "generation_config": generation_config, "grounded": grounded}
+    key = request_key("gemini", request)
+    if PROVIDER_MODE in (REPLAY, STUB):
+        entry = _stub_entry("gemini", request) if PROVIDER_MODE == STUB else _replay_entry("gemini", key, request)
+        if entry.get("error"):
+            raise RecordedProviderError(entry["error"])
+        return _RecordedGeminiResponse(entry["text"])
+
+    started = time.monotonic()
+    try:
+        response = model.generate_content(prompt, generation_config=generation_config)
+        text = response.text
+    except Exception as e:
+        _store.put("gemini", key, {
+            "request": request,
+            "error": f"{type(e).__name__}: {e}",
+            "latency_s": round(time.monotonic() - started, 4),
+            "recorded_at": time.time(),
+        })
+        raise
+    _store.put("gemini", key, {
+        "request": request,
+        "text": text,
+        "latency_s": round(time.monotonic() - started, 4),
+        "recorded_at": time.time(),
+    })
+    return response
@@ -0,0 +1,392 @@
+"""
+Client-side rate limiting and quota accounting for paid providers.
+
+- TokenBucket: per-provider transactions-per-second cap, so bursts queue
+  briefly on our side instead of turning into provider 429s
+- QuotaLedger: persistent per-day and per-month call counters (SQLite), so
+  usage survives restarts and can be planned against the billing quota
+- When a provider's monthly quota runs low, services switch to cache-only
+  serving (see cache_only)
+- RATE_LIMIT_BACKEND=shared keeps token buckets and concurrency slots in a
+  SQLite file instead of process memory, so every uvicorn worker on the host
+  draws from the same limits (`uvicorn --workers N` no longer multiplies
+  provider rates by N). make_bucket / make_semaphore pick the backend.
+  Shared-store transactions can wait on another process's write lock, so
+  the async entry points run them in a worker thread, off the event loop.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from observability.tracing import span
+from paths import data_dir
+from services.provider_replay import is_offline, skips_pacing
+
+logger = logging.getLogger(__name__)
+
+USAGE_DB_PATH = Path(os.getenv("USAGE_DB_PATH", data_dir() / "usage.db"))
+# "local" (per process) or "shared" (per host, across worker processes)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local")
+RATE_LIMIT_DB_PATH = Path(os.getenv("RATE_LIMIT_DB_PATH", data_dir() / "ratelimit.db"))
+# Fraction of the monthly quota below which we stop calling the provider
+QUOTA_LOW_WATERMARK = float(os.getenv("QUOTA_LOW_WATERMARK", "0.05"))
+
+
+class RateLimitedError(RuntimeError):
+    """Raised when a call could not get a rate-limit token in time."""
+
+
+class QuotaExhaustedError(RuntimeError):
+    """Raised when a provider is in cache-only mode and the cache has nothing."""
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, capacity: Optional[float] = None):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_s)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token if available; otherwise return seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate_per_s
+
+    async def try_acquire_async(self) -> float:
+        """try_acquire for callers on the event loop."""
+        return self.try_acquire()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Block (this thread) until a token is available or timeout passes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class _SharedStore:
+    """SQLite state shared by all processes on the host; one write transaction per operation."""
+
+    def __init__(self, path: Path = RATE_LIMIT_DB_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Limiter state is short-lived; losing it in a power cut is harmless
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " name TEXT NOT NULL, lease_id TEXT PRIMARY KEY, pid INTEGER NOT NULL, expires REAL NOT NULL)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connect()
+            # IMMEDIATE takes the write lock up front, serializing read-modify-write across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+
+_shared_store = _SharedStore()
+
+
+class SharedTokenBucket(TokenBucket):
+    """TokenBucket whose tokens live in the shared store, so the rate is per host."""
+
+    def __init__(self, name: str, rate_per_s: float, capacity: Optional[float] = None, store: Optional[_SharedStore] = None):
+        super().__init__(rate_per_s, capacity)
+        self.name = name
+        self._store = store or _shared_store
+
+    def try_acquire(self) -> float:
+        with self._store.transaction() as conn:
+            # Wall clock: monotonic clocks are not comparable across processes everywhere
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens, updated = row if row else (self.capacity, now)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate_per_s)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / self.rate_per_s
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+        return wait
+
+    async def try_acquire_async(self) -> float:
+        return await asyncio.to_thread(self.try_acquire)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _log_release_failure(future: "asyncio.Future[None]") -> None:
+    if not future.cancelled() and future.exception() is not None:
+        # The lease expires on its own after lease_s
+        logger.warning("Could not release a shared slot: %s", future.exception())
+
+
+class SharedSemaphore:
+    """
+    Host-wide concurrency limit with the asyncio.Semaphore acquire/release API.
+
+    Each holder is a lease row; leases of dead processes and leases older than
+    lease_s are reclaimed, so a crashed worker cannot leak slots.
+    """
+
+    def __init__(self, name: str, limit: int, lease_s: float = 300.0, poll_s: float = 0.05, store: Optional[_SharedStore] = None):
+        self.name = name
+        self.limit = limit
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self._store = store or _shared_store
+        self._held: List[str] = []
+        self._held_lock = threading.Lock()
+
+    def _reap(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM leases WHERE name = ? AND expires < ?", (self.name, now))
+        for (pid,) in conn.execute("SELECT DISTINCT pid FROM leases WHERE name = ?", (self.name,)).fetchall():
+            if pid != os.getpid() and not _pid_alive(pid):
+                conn.execute("DELETE FROM leases WHERE name = ? AND pid = ?", (self.name, pid))
+
+    def try_acquire(self) -> bool:
+        lease_id = uuid.uuid4().hex
+        with self._store.transaction() as conn:
+            now = time.time()
+            self._reap(conn, now)
+            (held,) = conn.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (self.name,)).fetchone()
+            if held >= self.limit:
+                return False
+            conn.execute(
+                "INSERT INTO leases (name, lease_id, pid, expires) VALUES (?, ?, ?, ?)",
+                (self.name, lease_id, os.getpid(), now + self.lease_s),
+            )
+        with self._held_lock:
+            self._held.append(lease_id)
+        return True
+
+    async def acquire(self) -> bool:
+        while not await asyncio.to_thread(self.try_acquire):
+            await asyncio.sleep(self.poll_s)
+        return True
+
+    def _delete_lease(self, lease_id: str) -> None:
+        with self._store.transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE lease_id = ?", (lease_id,))
+
+    def release(self) -> None:
+        with self._held_lock:
+            if not self._held:
+                raise ValueError(f"{self.name}: release() without a held slot")
+            lease_id = self._held.pop()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._delete_lease(lease_id)
+            return
+        # release() is synchronous (asyncio.Semaphore's API); don't hold the loop for the write
+        loop.run_in_executor(None, self._delete_lease, lease_id).add_done_callback(_log_release_failure)
+
+    def locked(self) -> bool:
+        with self._store.transaction() as conn:
+            self._reap(conn, time.time())
+            (held,) = conn.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (self.name,)).fetchone()
+        return held >= self.limit
+
+
+def make_bucket(name: str, rate_per_s: float, capacity: Optional[float] = None) -> TokenBucket:
+    """A token bucket on the configured backend (RATE_LIMIT_BACKEND)."""
+    if RATE_LIMIT_BACKEND == "shared":
+        return SharedTokenBucket(name, rate_per_s, capacity)
+    return TokenBucket(rate_per_s, capacity)
+
+
+def make_semaphore(name: str, limit: int) -> Any:
+    """An asyncio-style semaphore on the configured backend (RATE_LIMIT_BACKEND)."""
+    if RATE_LIMIT_BACKEND == "shared":
+        return SharedSemaphore(name, limit)
+    return asyncio.Semaphore(limit)
+
+
+class QuotaLedger:
+    def __init__(self, path: Path = USAGE_DB_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                " provider TEXT NOT NULL, period TEXT NOT NULL, calls INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (provider, period))"
+            )
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _periods(now: Optional[datetime] = None) -> Dict[str, str]:
+        now = now or datetime.now(timezone.utc)
+        return {"day": now.strftime("%Y-%m-%d"), "month": now.strftime("%Y-%m")}
+
+    def record(self, provider: str, calls: int = 1) -> None:
+        periods = self._periods()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for period in periods.values():
+                    conn.execute(
+                        "INSERT INTO usage (provider, period, calls) VALUES (?, ?, ?) "
+                        "ON CONFLICT(provider, period) DO UPDATE SET calls = calls + excluded.calls",
+                        (provider, period, calls),
+                    )
+
+    def usage(self, provider: str) -> Dict[str, int]:
+        periods = self._periods()
+        with self._lock:
+            conn = self._connect()
+            rows = dict(conn.execute(
+                "SELECT period, calls FROM usage WHERE provider = ? AND period IN (?, ?)",
+                (provider, periods["day"], periods["month"]),
+            ).fetchall())
+        return {"today": rows.get(periods["day"], 0), "month": rows.get(periods["month"], 0)}
+
+    def history(self, provider: str, limit: int = 31) -> Dict[str, int]:
+        """Recent daily counts, newest first."""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT period, calls FROM usage WHERE provider = ? AND length(period) = 10 "
+                "ORDER BY period DESC LIMIT ?",
+                (provider, limit),
+            ).fetchall()
+        return dict(rows)
+
+
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+PROVIDER_LIMITS: Dict[str, Dict[str, Any]] = {
+    # Amadeus self-service test environment: 10 transactions/second
+    "amadeus": {
+        "rate_per_s": _env_float("AMADEUS_RATE_PER_S", "10"),
+        "monthly_quota": int(_env_float("AMADEUS_MONTHLY_QUOTA", "2000")),
+    },
+    # SERP API bills searches against a monthly credit quota
+    "serp": {
+        "rate_per_s": _env_float("SERP_RATE_PER_S", "2"),
+        "monthly_quota": int(_env_float("SERP_MONTHLY_QUOTA", "250")),
+    },
+}
+
+LIMITERS: Dict[str, TokenBucket] = {
+    name: make_bucket(name, cfg["rate_per_s"]) for name, cfg in PROVIDER_LIMITS.items()
+}
+ledger = QuotaLedger()
+
+
+def acquire_provider_slot(provider: str, timeout: float) -> None:
+    """Wait for a rate-limit token before calling the provider."""
+    if skips_pacing():
+        return
+    limiter = LIMITERS[provider]
+    if limiter.try_acquire() == 0.0:
+        return
+    with span("ratelimit.wait", provider=provider):
+        acquired = limiter.acquire(timeout=timeout)
+    if not acquired:
+        raise RateLimitedError(f"{provider} client-side rate limit: no token within {timeout:.1f}s")
+
+
+def record_provider_call(provider: str) -> None:
+    """Count a request the provider received against its quota."""
+    if is_offline():
+        return
+    ledger.record(provider)
+
+
+def quota_remaining(provider: str) -> Optional[int]:
+    quota = PROVIDER_LIMITS[provider].get("monthly_quota")
+    if not quota:
+        return None
+    return max(0, quota - ledger.usage(provider)["month"])
+
+
+def cache_only(provider: str) -> bool:
+    """True once the remaining monthly quota drops below the low watermark."""
+    quota = PROVIDER_LIMITS[provider].get("monthly_quota")
+    if not quota:
+        return False
+    return quota_remaining(provider) <= quota * QUOTA_LOW_WATERMARK
+
+
+def usage_report() -> Dict[str, Any]:
+    report = {}
+    for provider, cfg in PROVIDER_LIMITS.items():
+        used = ledger.usage(provider)
+        report[provider] = {
+            "rate_per_s": cfg["rate_per_s"],
+            "monthly_quota": cfg["monthly_quota"],
+            "used_today": used["today"],
+            "used_month": used["month"],
+            "remaining_month": quota_remaining(provider),
+            "cache_only": cache_only(provider),
+            "daily_history": ledger.history(provider),
+        }
+    return report
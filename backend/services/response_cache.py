@@ -0,0 +1,85 @@
+"""
+TTL cache for formatted provider results (flights, hotels).
+
+Fresh entries are served directly; stale entries are kept around so a
+provider in cache-only mode (quota running low) can still answer. An entry
+can be given a shorter TTL than its cache's (e.g. an empty result).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from observability.metrics import CACHE_LOOKUPS
+
+
+def cache_key(provider: str, params: Dict[str, Any]) -> str:
+    """Stable key for a provider request; secrets are never part of params here."""
+    raw = json.dumps([provider, params], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, name: str, ttl_s: float, max_entries: int = 2048):
+        self.name = name
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        for result in ("hits", "stale_hits", "misses"):
+            CACHE_LOOKUPS.set_function(lambda result=result: getattr(self, result), cache=name, result=result)
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at <= self.ttl_s:
+                self.hits += 1
+            elif allow_stale:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def age(self, key: str) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else time.time() - entry[0]
+
+    def put(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        stored_at = time.time()
+        if ttl_s is not None and ttl_s < self.ttl_s:
+            # Stored as already older, so get(), age() and the cache warmer all see the shorter TTL
+            stored_at -= self.ttl_s - ttl_s
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+
+flight_cache = ResponseCache("flights", ttl_s=float(os.getenv("FLIGHT_CACHE_TTL_S", "600")))
+# "No flights" is often a transient gap in the test API's inventory; re-ask sooner
+FLIGHT_EMPTY_CACHE_TTL_S = float(os.getenv("FLIGHT_EMPTY_CACHE_TTL_S", "60"))
+hotel_cache = ResponseCache("hotels", ttl_s=float(os.getenv("HOTEL_CACHE_TTL_S", "1800")))
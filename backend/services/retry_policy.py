@@ -0,0 +1,224 @@
+"""
+Shared retry policy for provider calls.
+
+- Per-provider retryable status codes
+- Decorrelated-jitter backoff (sleep = min(cap, uniform(base, prev * 3)))
+- Retry-After honoured (seconds or HTTP date, plus Gemini's retry_delay hint)
+- A retry budget per provider: every call deposits `ratio` tokens and every
+  retry spends one, so retries stay a bounded share of traffic
+- Idempotency awareness: non-idempotent calls are only retried when the
+  provider certainly did not process them (429, connect failures)
+"""
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional
+
+import requests
+
+from deadline import Deadline
+from services.circuit_breaker import CircuitOpenError
+from services.rate_limits import QuotaExhaustedError, RateLimitedError
+
+logger = logging.getLogger(__name__)
+
+# Pseudo status codes for transport failures
+TIMEOUT = "timeout"
+CONNECT_ERROR = "connect_error"
+
+# The request never reached the provider, so retrying can't duplicate work
+_NOT_PROCESSED = {429, CONNECT_ERROR}
+
+
+def status_of(exc: BaseException) -> Any:
+    """HTTP status (or pseudo status) carried by a provider exception."""
+    if isinstance(exc, (RateLimitedError, QuotaExhaustedError)):
+        # Our own limiters refused the call; the provider never saw it or said 429
+        return None
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code
+    if isinstance(exc, (requests.ConnectTimeout, requests.ConnectionError)) and not isinstance(exc, requests.ReadTimeout):
+        return CONNECT_ERROR
+    if isinstance(exc, (requests.Timeout, asyncio.TimeoutError, TimeoutError)):
+        return TIMEOUT
+    # google.api_core exceptions expose the HTTP status as .code
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    text = str(exc).lower()
+    if "429" in text or "resource exhausted" in text or "rate limit" in text:
+        return 429
+    return None
+
+
+_GEMINI_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)|retry in\s+([\d.]+)\s*s", re.IGNORECASE)
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, if it said so."""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        header = exc.response.headers.get("Retry-After")
+        if header:
+            header = header.strip()
+            if header.isdigit():
+                return float(header)
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+    m = _GEMINI_RETRY_DELAY.search(str(exc))
+    if m:
+        return float(m.group(1) or m.group(2))
+    return None
+
+
+class RetryBudget:
+    """Token bucket that caps retries at `ratio` of calls (plus a small floor)."""
+
+    def __init__(self, ratio: float = 0.1, min_tokens: float = 3.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            self.exhausted += 1
+            return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        name: str,
+        retryable: FrozenSet[Any],
+        max_attempts: int = 3,
+        base_s: float = 0.5,
+        cap_s: float = 8.0,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.name = name
+        self.retryable = retryable
+        self.max_attempts = max_attempts
+        self.base_s = base_s
+        self.cap_s = cap_s
+        self.budget = budget or RetryBudget()
+        self.retries = 0
+
+    def _jitter(self, prev_s: float) -> float:
+        return min(self.cap_s, random.uniform(self.base_s, max(self.base_s, prev_s * 3)))
+
+    def next_delay(
+        self,
+        exc: BaseException,
+        attempt: int,
+        prev_s: float,
+        idempotent: bool = True,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[float]:
+        """
+        Decide whether to retry after a failed attempt.
+
+        Args:
+            exc: The exception from attempt number `attempt` (1-based)
+            prev_s: Previous backoff delay (base_s for the first retry)
+
+        Returns:
+            Seconds to sleep before retrying, or None to give up
+        """
+        if isinstance(exc, CircuitOpenError) or attempt >= self.max_attempts:
+            return None
+        status = status_of(exc)
+        if status not in self.retryable:
+            return None
+        if not idempotent and status not in _NOT_PROCESSED:
+            return None
+
+        delay = self._jitter(prev_s)
+        retry_after = retry_after_of(exc)
+        if retry_after is not None:
+            if retry_after > self.cap_s:
+                # Provider wants a longer pause than we are willing to hold the request for
+                return None
+            delay = max(delay, retry_after)
+        if deadline is not None and not deadline.allows(delay + 0.5):
+            return None
+        if not self.budget.try_spend():
+            logger.warning("%s retry budget exhausted, not retrying", self.name)
+            return None
+        self.retries += 1
+        logger.info("%s attempt %d failed (%s), retrying in %.2fs", self.name, attempt, status, delay)
+        return delay
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        idempotent: bool = True,
+        deadline: Optional[Deadline] = None,
+    ) -> Any:
+        """Run a synchronous call with retries."""
+        self.budget.deposit()
+        delay = self.base_s
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn()
+            except Exception as e:
+                next_delay = self.next_delay(e, attempt, delay, idempotent, deadline)
+                if next_delay is None:
+                    raise
+                delay = next_delay
+                time.sleep(delay)
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        idempotent: bool = True,
+        deadline: Optional[Deadline] = None,
+    ) -> Any:
+        """Run an async call with retries."""
+        self.budget.deposit()
+        delay = self.base_s
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn()
+            except Exception as e:
+                next_delay = self.next_delay(e, attempt, delay, idempotent, deadline)
+                if next_delay is None:
+                    raise
+                delay = next_delay
+                await asyncio.sleep(delay)
+
+
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    # Amadeus test tier throttles aggressively (429) and has flaky 5xx
+    "amadeus": RetryPolicy("amadeus", frozenset({429, 500, 502, 503, 504, CONNECT_ERROR, TIMEOUT})),
+    # SERP bills per search and the call is not idempotent, so only retry when the
+    # search was certainly not run
+    "serp": RetryPolicy("serp", frozenset({429, CONNECT_ERROR}), max_attempts=2),
+    "gemini": RetryPolicy("gemini", frozenset({429, 500, 503, 504, TIMEOUT}), base_s=1.0, cap_s=10.0),
+}
+
+
+def get_retry_policy(provider: str) -> RetryPolicy:
+    return RETRY_POLICIES[provider]
@@ -1,46 +1,138 @@
+import logging
 import os
-from dotenv import load_dotenv
-load_dotenv()
-import requests
+import time
+from datetime import date
+from typing import Optional, Tuple
+from services.circuit_breaker import get_breaker
+from services.retry_policy import get_retry_policy
+from services.rate_limits import (
+    QuotaExhaustedError,
+    acquire_provider_slot,
+    cache_only,
+    record_provider_call,
+)
+from services.provider_replay import http_request, is_offline
+from services.response_cache import cache_key, hotel_cache
+from services.cache_warmer import record_search
+from deadline import Deadline, DeadlineExceeded
+from observability.metrics import CACHE_LATENCY
+from observability.tracing import span
+
+logger = logging.getLogger(__name__)
 
 SERP_API_URL = "https://serpapi.com/search"
+_CURRENCY_SYMBOLS = {"₹": "INR", "$": "USD", "US$": "USD", "€": "EUR", "£": "GBP"}
+# Characters a display price may start with before the number
+_CURRENCY_PREFIX_CHARS = "".join(sorted(set("".join(_CURRENCY_SYMBOLS)))) + " \u00a0"
+
+
+def hotel_params(city: str, check_in_date: str, check_out_date: str) -> dict:
+    """Google Hotels query parameters (without the API key); also the hotel cache key."""
+    return {
+        "engine": "google_hotels",
+        "q": city,
+        "check_in_date": check_in_date,
+        "check_out_date": check_out_date,
+    }
 
 
 def search_hotels(
     city: str,
     check_in_date: str,
     check_out_date: str,
+    timeout: float = 20,
+    refresh: bool = False,
 ):
     """
     Search hotels using SERP API (Google Hotels).
-    Minimal parameter set for reliability.
+    Minimal parameter set for reliability. refresh=True fetches even if a fresh
+    result is cached (the cache warmer) and is not counted as traffic.
     """
+    started = time.perf_counter()
     api_key = os.getenv("SERP_API_KEY")
-    if not api_key:
+    # Replay and stub answer without a key
+    if not api_key and not is_offline():
         raise RuntimeError("SERP_API_KEY not found in environment variables")
 
-    params = {
-        "engine": "google_hotels",
-        "q": city,
-        "check_in_date": check_in_date,
-        "check_out_date": check_out_date,
-        "api_key": api_key,
-    }
+    params = hotel_params(city, check_in_date, check_out_date)
+    if not refresh:
+        record_search("hotels", city=city, check_in_date=check_in_date, check_out_date=check_out_date)
+
+    key = cache_key("serp", params)
+    cached = None if refresh else hotel_cache.get(key)
+    if cached is not None:
+        logger.info("Cache hit: %s %s → %s", city, check_in_date, check_out_date)
+        CACHE_LATENCY.observe(time.perf_counter() - started, cache="hotels", result="hit")
+        return cached
+    if cache_only("serp"):
+        stale = hotel_cache.get(key, allow_stale=True)
+        if stale is not None:
+            logger.warning("Quota low - serving stale cached hotels")
+            CACHE_LATENCY.observe(time.perf_counter() - started, cache="hotels", result="stale")
+            return stale
+        raise QuotaExhaustedError("SERP quota is low; serving from cache only")
+
+    # Each attempt waits for a client-side rate-limit token, then goes through the
+    # breaker (fails fast while SERP is degraded). Searches are billed, so the
+    # policy only retries requests SERP didn't run.
+    budget = Deadline(timeout)
+    request_params = {**params, "api_key": api_key}
+
+    def attempt():
+        acquire_provider_slot("serp", budget.remaining())
+        # A budget spent waiting on our own limiter says nothing about SERP
+        budget.check("SERP request")
+        return get_breaker("serp").call(_fetch_hotels, request_params, budget.remaining())
+
+    raw_data = get_retry_policy("serp").call(attempt, idempotent=False, deadline=budget)
+    hotels = format_hotels(raw_data, nights=_nights(check_in_date, check_out_date))
+    hotel_cache.put(key, hotels)
+    CACHE_LATENCY.observe(time.perf_counter() - started, cache="hotels", result="miss")
+    return hotels
 
-    response = requests.get(SERP_API_URL, params=params, timeout=20)
+
+def _fetch_hotels(params: dict, timeout: float) -> dict:
+    if timeout <= 0:
+        raise DeadlineExceeded("SERP time budget exhausted")
+    with span("http GET serp.search") as s:
+        response = http_request("serp", "GET", SERP_API_URL, params=params, timeout=timeout)
+        if s is not None:
+            s.set_attribute("http.status_code", response.status_code)
+    record_provider_call("serp")
 
     # Helpful debug if it fails again
     if response.status_code != 200:
-        print("SERP API error response:", response.text)
+        logger.warning("SERP API error response (%s): %s", response.status_code, response.text)
 
     response.raise_for_status()
-    raw_data = response.json()
-    return format_hotels(raw_data)
+    return response.json()
+
+
+def _nights(check_in_date: str, check_out_date: str) -> Optional[int]:
+    try:
+        nights = (date.fromisoformat(check_out_date) - date.fromisoformat(check_in_date)).days
+    except ValueError:
+        return None
+    return nights if nights > 0 else None
 
 
-def format_hotels(data: dict, max_results: int = 8):
+def _parse_price(text: str) -> Tuple[Optional[float], Optional[str]]:
+    """(amount, currency code) of a SERP display price such as "₹4,250" or "$120"."""
+    number = text.lstrip(_CURRENCY_PREFIX_CHARS)
+    try:
+        amount = float(number.replace(",", ""))
+    except ValueError:
+        amount = None
+    return amount, _CURRENCY_SYMBOLS.get(text[:len(text) - len(number)].strip())
+
+
+def format_hotels(data: dict, max_results: int = 8, nights: Optional[int] = None):
     """
     Convert SERP API hotel results into clean, UI-ready objects.
+
+    price is SERP's display string; price_per_night (a number, from the total
+    rate over `nights` when no nightly rate is given) and currency are what
+    package pricing uses.
     """
     hotels = []
 
@@ -49,17 +141,28 @@ def format_hotels(data: dict, max_results: int = 8):
     for prop in properties[:max_results]:
         # Extract price using SERP API's actual structure
         price = "Price not available"
+        price_per_night = currency = None
         rate_per_night = prop.get("rate_per_night", {})
         total_rate = prop.get("total_rate", {})
         
         if rate_per_night.get("lowest"):
             price = rate_per_night.get("lowest")
+            price_per_night, currency = _parse_price(price)
+            if rate_per_night.get("extracted_lowest") is not None:
+                price_per_night = float(rate_per_night["extracted_lowest"])
         elif total_rate.get("lowest"):
             price = total_rate.get("lowest")
+            total, currency = _parse_price(price)
+            if total_rate.get("extracted_lowest") is not None:
+                total = float(total_rate["extracted_lowest"])
+            if total is not None and nights:
+                price_per_night = total / nights
         
         hotel = {
             "name": prop.get("name"),
             "price": price,
+            "price_per_night": price_per_night,
+            "currency": currency if price_per_night is not None else None,
             "rating": prop.get("rating"),
             "reviews": prop.get("reviews"),
             "amenities": prop.get("amenities", []),
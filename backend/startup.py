@@ -0,0 +1,194 @@
+"""
+Startup sequencing, lazy initialization and the cold-start profile.
+
+Importing main only does cheap work, so the server can accept traffic
+quickly. Expensive one-time setup (Gemini SDK import and configuration,
+LangGraph compilation) is wrapped in lazy() initializers: each runs on first
+use and is memoized. Once the server is accepting traffic, the lifespan hook
+runs warm_up() in the background, so usually no request pays for them.
+
+Every phase (imports, lazy initializers, lifespan) is timed into one
+profile. The profile is served by GET /ready, exported as
+tripweave_startup_phase_seconds, logged, and appended to STARTUP_PROFILE_FILE
+when warm-up finishes, so cold starts can be compared across deploys.
+GET /ready?warm=true stays 503 while an initializer that failed during
+warm-up has not been built since (first use retries it).
+
+Environment (read when used, so backend/.env applies):
+    WARM_ON_STARTUP        "1" (default) or "0" to leave initializers for first use
+    STARTUP_PROFILE_FILE   JSON-lines profile log (default backend/.data/startup_profile.jsonl)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from observability.metrics import STARTUP_PHASE
+from paths import data_dir
+
+logger = logging.getLogger(__name__)
+
+_ENV_PATH = Path(__file__).resolve().parent / ".env"
+
+# Reference point for the profile: as early as main can import anything
+_T0 = time.perf_counter()
+_last_mark = _T0
+
+_phases: List[Dict[str, Any]] = []
+_phases_lock = threading.Lock()
+_env_loaded = False
+
+_accepting = False
+_warm = False
+# Initializer name -> error, for those that failed during warm-up
+_warm_errors: Dict[str, str] = {}
+
+
+def load_environment() -> None:
+    """Load backend/.env once (existing environment variables win)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    load_dotenv(dotenv_path=_ENV_PATH)
+    _env_loaded = True
+
+
+# main imports this module before it calls load_environment(), so settings
+# are read when needed rather than at import
+def warm_on_startup() -> bool:
+    return os.getenv("WARM_ON_STARTUP", "1") == "1"
+
+
+def _profile_file() -> Path:
+    return Path(os.getenv("STARTUP_PROFILE_FILE", data_dir() / "startup_profile.jsonl"))
+
+
+def _record(name: str, seconds: float) -> None:
+    with _phases_lock:
+        _phases.append({
+            "phase": name,
+            "ms": round(seconds * 1000, 1),
+            "at_ms": round((time.perf_counter() - _T0) * 1000, 1),
+        })
+    STARTUP_PHASE.inc(seconds, phase=name)
+
+
+def mark(name: str) -> None:
+    """Record the time since the previous mark as phase `name` (for import blocks)."""
+    global _last_mark
+    now = time.perf_counter()
+    _record(name, now - _last_mark)
+    _last_mark = now
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - started)
+
+
+class Lazy:
+    """A memoized, thread-safe initializer; the first call builds the value."""
+
+    _UNSET = object()
+
+    def __init__(self, name: str, build: Callable[[], Any]):
+        self.name = name
+        self._build = build
+        self._value: Any = self._UNSET
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not self._UNSET
+
+    def __call__(self) -> Any:
+        if self._value is self._UNSET:
+            with self._lock:
+                if self._value is self._UNSET:
+                    with phase(f"init.{self.name}"):
+                        self._value = self._build()
+        return self._value
+
+    async def aget(self) -> Any:
+        """Like calling it, but a cold build runs off the event loop."""
+        if self.ready:
+            return self._value
+        return await asyncio.to_thread(self)
+
+
+_INITIALIZERS: Dict[str, Lazy] = {}
+
+
+def lazy(name: str, build: Callable[[], Any]) -> Lazy:
+    """Register an initializer; warm_up() runs every registered one."""
+    initializer = Lazy(name, build)
+    _INITIALIZERS[name] = initializer
+    return initializer
+
+
+async def warm_up() -> None:
+    """Run all pending initializers off the event loop, then record the profile."""
+    global _warm
+    started = time.perf_counter()
+    for initializer in list(_INITIALIZERS.values()):
+        if initializer.ready:
+            continue
+        try:
+            await asyncio.to_thread(initializer)
+        except Exception as e:
+            # Left for first use, which will raise to the request instead
+            _warm_errors[initializer.name] = f"{initializer.name}: {type(e).__name__}: {e}"
+            logger.warning("Warm-up of %s failed: %s", initializer.name, e)
+    _record("warm_up", time.perf_counter() - started)
+    _warm = True
+    _write_profile()
+
+
+def set_accepting(accepting: bool) -> None:
+    global _accepting
+    _accepting = accepting
+
+
+def profile() -> List[Dict[str, Any]]:
+    with _phases_lock:
+        return list(_phases)
+
+
+def readiness() -> Dict[str, Any]:
+    # An initializer that failed during warm-up counts once first use has built it
+    failed = [error for name, error in _warm_errors.items() if not _INITIALIZERS[name].ready]
+    return {
+        "accepting": _accepting,
+        "warm": _warm and not failed,
+        "warm_error": "; ".join(failed) or None,
+        "initializers": {name: i.ready for name, i in _INITIALIZERS.items()},
+        "uptime_s": round(time.perf_counter() - _T0, 1),
+        "profile": profile(),
+    }
+
+
+def _write_profile() -> None:
+    phases = profile()
+    logger.info(
+        "Startup profile: %s",
+        ", ".join(f"{p['phase']}={p['ms']:.0f}ms" for p in phases),
+    )
+    path = _profile_file()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps({"recorded_at": time.time(), "pid": os.getpid(), "phases": phases}) + "\n")
+    except OSError as e:
+        logger.warning("Could not write startup profile: %s", e)
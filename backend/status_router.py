@@ -0,0 +1,54 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from observability.metrics import render_metrics
+from observability.tracing import recent_traces
+from services.circuit_breaker import BREAKERS
+from services.retry_policy import RETRY_POLICIES
+from services.rate_limits import usage_report
+from services.response_cache import flight_cache, hotel_cache
+from services.cache_warmer import warmer_status
+
+router = APIRouter()
+
+
+# Provider health as seen by the circuit breakers (closed / open / half_open)
+# and the retry layer
+@router.get("/status/providers")
+async def provider_status():
+    status = {}
+    for name, breaker in BREAKERS.items():
+        status[name] = breaker.snapshot()
+        policy = RETRY_POLICIES.get(name)
+        if policy is not None:
+            status[name]["retry"] = {
+                "retries": policy.retries,
+                "budget_tokens": round(policy.budget.tokens, 2),
+                "budget_exhausted": policy.budget.exhausted,
+            }
+    return status
+
+
+# Provider usage against quotas (persistent per-day / per-month counters), cache
+# state and the cache warmer's last cycle and remaining budget
+@router.get("/status/usage")
+async def provider_usage():
+    return {
+        # The quota ledger is SQLite; keep its reads off the event loop
+        "providers": await asyncio.to_thread(usage_report),
+        "caches": {"flights": flight_cache.stats(), "hotels": hotel_cache.stats()},
+        "warmer": await warmer_status(),
+    }
+
+
+# Recently kept traces (sampled, slow or failed), slowest first, with the
+# critical path of each
+@router.get("/status/traces")
+async def traces(limit: int = 20):
+    return {"traces": recent_traces(limit)}
+
+
+# Prometheus scrape endpoint
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")